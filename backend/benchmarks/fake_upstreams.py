@@ -0,0 +1,110 @@
+"""Local stand-ins for Alpaca, CoinGecko and OpenAI that replay recorded responses"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import json
+import random
+import threading
+import time
+
+class FakeUpstream:
+    """HTTP server replaying recorded JSON responses with injected latency and errors
+
+    Recordings map "METHOD /path" (query string ignored) to a response body, or to
+    {"status": int, "body": ...}. A path segment recorded as "*" matches any value.
+    """
+
+    def __init__(self, name: str, recordings: Dict[str, object], latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.error_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._exact: Dict[str, bytes] = {}
+        self._wildcards = []
+        for key, value in recordings.items():
+            if isinstance(value, dict) and set(value) == {'status', 'body'}:
+                status, body = value['status'], value['body']
+            else:
+                status, body = 200, value
+            payload = (status, json.dumps(body).encode())
+            if '*' in key:
+                self._wildcards.append((key.split('/'), payload))
+            else:
+                self._exact[key] = payload
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeUpstream':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _lookup(self, method: str, path: str):
+        key = f"{method} {path}"
+        if key in self._exact:
+            return self._exact[key]
+        parts = key.split('/')
+        for pattern, payload in self._wildcards:
+            if len(pattern) == len(parts) and all(p == '*' or p == v for p, v in zip(pattern, parts)):
+                return payload
+        return None
+
+    def _respond(self, method: str, path: str):
+        with self._lock:
+            self.request_count += 1
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.error_count += 1
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if fail:
+            return 500, json.dumps({'message': 'injected error'}).encode()
+        payload = self._lookup(method, path)
+        if payload is None:
+            return 404, json.dumps({'message': f'no recording for {method} {path}'}).encode()
+        return payload
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                status, body = upstream._respond(self.command, urlsplit(self.path).path)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
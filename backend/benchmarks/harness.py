@@ -0,0 +1,125 @@
+"""Timing, memory and result-history helpers for the benchmark runner"""
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List, Optional
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+HISTORY_FILE = os.path.join(RESULTS_DIR, 'history.jsonl')
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    operations: int
+    errors: int
+    duration_s: float
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+    extra: Dict = field(default_factory=dict)
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples: List[float] = []
+        self.errors = 0
+        self._started = time.perf_counter()
+
+    def add(self, seconds: float, ok: bool = True) -> None:
+        self.samples.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def result(self, scenario: str, operations: Optional[int] = None, **extra) -> ScenarioResult:
+        duration = time.perf_counter() - self._started
+        operations = len(self.samples) if operations is None else operations
+        return ScenarioResult(
+            scenario=scenario,
+            operations=operations,
+            errors=self.errors,
+            duration_s=round(duration, 4),
+            throughput=round(operations / duration, 2) if duration > 0 else 0.0,
+            p50_ms=round(self.percentile(0.50) * 1000, 4),
+            p99_ms=round(self.percentile(0.99) * 1000, 4),
+            peak_rss_mb=peak_rss_mb(),
+            extra=extra,
+        )
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(usage / divisor, 2)
+
+def current_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return 'unknown'
+
+def load_history() -> List[Dict]:
+    if not os.path.exists(HISTORY_FILE):
+        return []
+    with open(HISTORY_FILE) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def store_results(results: List[ScenarioResult], config: Dict) -> str:
+    """Append results to the history file and write a per-run snapshot; returns the snapshot path"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    commit = current_commit()
+    timestamp = datetime.now().isoformat(timespec='seconds')
+    rows = [dict(asdict(r), commit=commit, timestamp=timestamp, config=config) for r in results]
+    with open(HISTORY_FILE, 'a') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+    snapshot = os.path.join(RESULTS_DIR, f"{commit}-{timestamp.replace(':', '')}.json")
+    with open(snapshot, 'w') as f:
+        json.dump(rows, f, indent=2)
+    return snapshot
+
+def compare_to_previous(results: List[ScenarioResult], history: List[Dict],
+                        threshold: float = 0.10) -> List[str]:
+    """Compare against the latest earlier run of each scenario; returns regression messages"""
+    regressions = []
+    commit = current_commit()
+    for result in results:
+        previous = [row for row in history if row['scenario'] == result.scenario]
+        earlier = [row for row in previous if row['commit'] != commit] or previous
+        if not earlier:
+            continue
+        baseline = earlier[-1]
+        for metric, higher_is_worse in (('p50_ms', True), ('p99_ms', True), ('throughput', False)):
+            old, new = baseline[metric], getattr(result, metric)
+            if not old:
+                continue
+            change = (new - old) / old
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append(
+                    f"{result.scenario}.{metric}: {old} -> {new} ({change:+.1%} vs {baseline['commit']})"
+                )
+    return regressions
+
+def format_table(results: List[ScenarioResult]) -> str:
+    header = f"{'scenario':<22}{'ops':>10}{'errors':>8}{'ops/s':>12}{'p50 ms':>12}{'p99 ms':>12}{'peak MB':>10}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(
+            f"{r.scenario:<22}{r.operations:>10}{r.errors:>8}{r.throughput:>12}"
+            f"{r.p50_ms:>12}{r.p99_ms:>12}{r.peak_rss_mb:>10}"
+        )
+    return '\n'.join(lines)
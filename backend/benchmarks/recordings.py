@@ -0,0 +1,119 @@
+"""Recorded upstream responses used by the benchmark fake servers
+
+The defaults are shaped like real Alpaca, CoinGecko and OpenAI payloads. A JSON file
+captured from the live APIs, in the same {"service": {"METHOD /path": body}} layout,
+can be passed with --recordings to override or extend them.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import json
+import math
+import uuid
+
+def coin_universe(count: int) -> List[Dict]:
+    """A deterministic list of CoinGecko-style coins; the first entries are real tickers"""
+    real = [('bitcoin', 'btc', 'Bitcoin'), ('ethereum', 'eth', 'Ethereum'), ('solana', 'sol', 'Solana')]
+    coins = [{'id': cid, 'symbol': sym, 'name': name} for cid, sym, name in real[:count]]
+    for i in range(len(coins), count):
+        coins.append({'id': f'coin-{i:04d}', 'symbol': f'c{i:04d}', 'name': f'Coin {i}'})
+    return coins
+
+def _price(i: int) -> float:
+    return round(10.0 + (i * 37) % 1000 + 0.5, 2)
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def alpaca_recordings(symbols: int = 200) -> Dict[str, object]:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    account = {
+        'id': str(uuid.UUID(int=1)), 'account_number': 'PA0000000001', 'status': 'ACTIVE',
+        'crypto_status': 'ACTIVE', 'currency': 'USD', 'buying_power': '200000', 'regt_buying_power': '200000',
+        'daytrading_buying_power': '0', 'non_marginable_buying_power': '100000', 'cash': '100000',
+        'accrued_fees': '0', 'portfolio_value': '150000', 'pattern_day_trader': False,
+        'trading_blocked': False, 'transfers_blocked': False, 'account_blocked': False,
+        'created_at': _iso(now - timedelta(days=365)), 'trade_suspended_by_user': False, 'multiplier': '2',
+        'shorting_enabled': True, 'equity': '150000', 'last_equity': '149000', 'long_market_value': '50000',
+        'short_market_value': '0', 'initial_margin': '25000', 'maintenance_margin': '15000',
+        'last_maintenance_margin': '15000', 'sma': '0', 'daytrade_count': 0,
+    }
+    positions = []
+    for i, coin in enumerate(coin_universe(symbols)):
+        price = _price(i)
+        positions.append({
+            'asset_id': str(uuid.UUID(int=i + 100)), 'symbol': f"{coin['symbol'].upper()}USD",
+            'exchange': 'CRYPTO', 'asset_class': 'crypto', 'avg_entry_price': str(price * 0.95),
+            'qty': '2', 'side': 'long', 'market_value': str(price * 2), 'cost_basis': str(price * 1.9),
+            'unrealized_pl': str(price * 0.1), 'unrealized_plpc': '0.0526',
+            'unrealized_intraday_pl': '0', 'unrealized_intraday_plpc': '0', 'current_price': str(price),
+            'lastday_price': str(price), 'change_today': '0', 'qty_available': '2',
+        })
+    order = {
+        'id': str(uuid.UUID(int=7)), 'client_order_id': 'bench-order', 'created_at': _iso(now),
+        'updated_at': _iso(now), 'submitted_at': _iso(now), 'filled_at': _iso(now), 'asset_class': 'crypto',
+        'symbol': 'BTC/USD', 'qty': '0.1', 'filled_qty': '0.1', 'filled_avg_price': '65000',
+        'order_class': 'simple', 'order_type': 'market', 'type': 'market', 'side': 'buy',
+        'time_in_force': 'gtc', 'status': 'filled', 'extended_hours': False,
+    }
+    days = 30
+    history = {
+        'timestamp': [int((now - timedelta(days=days - d)).timestamp()) for d in range(days)],
+        'equity': [150000 + 100 * math.sin(d / 3) for d in range(days)],
+        'profit_loss': [100 * math.sin(d / 3) for d in range(days)],
+        'profit_loss_pct': [0.0007 * math.sin(d / 3) for d in range(days)],
+        'base_value': 150000, 'timeframe': '1D',
+    }
+    minute_bars = [{
+        't': _iso(now - timedelta(minutes=60 - m)), 'o': 65000 + m, 'h': 65010 + m, 'l': 64990 + m,
+        'c': 65005 + m, 'v': 1.5, 'n': 12, 'vw': 65002 + m,
+    } for m in range(60)]
+    return {
+        'GET /v2/account': account,
+        'GET /v2/positions': positions,
+        'GET /v2/orders': [order],
+        'POST /v2/orders': order,
+        'GET /v2/orders/*': order,
+        'GET /v2/account/portfolio/history': history,
+        'GET /v1beta3/crypto/us/bars': {'bars': {'BTC/USD': minute_bars}, 'next_page_token': None},
+    }
+
+def coingecko_recordings(symbols: int = 200, history_days: int = 365) -> Dict[str, object]:
+    coins = coin_universe(symbols)
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    chart = {'prices': [
+        [now_ms - (history_days - d) * 86_400_000, 100.0 + 10 * math.sin(d / 10)]
+        for d in range(history_days)
+    ]}
+    return {
+        'GET /api/v3/coins/list': coins,
+        'GET /api/v3/simple/price': {
+            coin['id']: {'usd': _price(i), 'usd_24h_change': 1.5} for i, coin in enumerate(coins)
+        },
+        'GET /api/v3/coins/*/market_chart': chart,
+    }
+
+def openai_recordings() -> Dict[str, object]:
+    completion = {
+        'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4',
+        'choices': [{
+            'index': 0, 'finish_reason': 'stop',
+            'message': {'role': 'assistant', 'content': 'Trend is up.\n\n- Buy dips\n- Tight stops'},
+        }],
+        'usage': {'prompt_tokens': 50, 'completion_tokens': 20, 'total_tokens': 70},
+    }
+    return {'POST /v1/chat/completions': completion, 'POST /chat/completions': completion}
+
+def default_recordings(symbols: int = 200) -> Dict[str, Dict[str, object]]:
+    return {
+        'alpaca': alpaca_recordings(symbols),
+        'coingecko': coingecko_recordings(symbols),
+        'openai': openai_recordings(),
+    }
+
+def load_recordings(path: str, symbols: int = 200) -> Dict[str, Dict[str, object]]:
+    """Load recordings from a JSON file on top of the defaults"""
+    recordings = default_recordings(symbols)
+    with open(path) as f:
+        for service, entries in json.load(f).items():
+            recordings.setdefault(service, {}).update(entries)
+    return recordings
@@ -0,0 +1,124 @@
+"""Run the backend benchmark suite against local upstream stand-ins
+
+Usage (from backend/):
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario alert_tick_stream --scenario backtest_bars --bars 200000
+    python -m benchmarks.run --latency-ms 40 --jitter-ms 10 --error-rate 0.01 --fail-on-regression
+    python -m benchmarks.run --scenario startup_import --fail-on-budget --no-store   # CI import check
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from benchmarks.fake_upstreams import FakeUpstream
+from benchmarks.harness import (
+    ScenarioResult, compare_to_previous, format_table, load_history, store_results
+)
+from benchmarks.recordings import default_recordings, load_recordings
+from benchmarks.scenarios import SCENARIOS, run_scenario
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (repeatable); defaults to all')
+    parser.add_argument('--recordings', help='JSON file of recorded upstream responses')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Injected upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=5.0, help='Uniform jitter around the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of upstream calls that fail')
+    parser.add_argument('--duration', type=float, default=10.0, help='Dashboard polling duration (s)')
+    parser.add_argument('--clients', type=int, default=20, help='Concurrent dashboard clients')
+    parser.add_argument('--alerts', type=int, default=10_000)
+    parser.add_argument('--ticks', type=int, default=2_000)
+    parser.add_argument('--bars', type=int, default=1_000_000)
+    parser.add_argument('--symbols', type=int, default=200, help='Portfolio symbols')
+    parser.add_argument('--rows', type=int, default=10_000, help='Rows per serialization payload')
+    parser.add_argument('--startup-budget-ms', type=float, default=300.0,
+                        help='Budget for the p50 `import main` time')
+    parser.add_argument('--regression-threshold', type=float, default=0.10)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--fail-on-budget', action='store_true',
+                        help='Exit non-zero if the startup budget is exceeded (or its scenario fails)')
+    parser.add_argument('--no-store', action='store_true', help='Do not record results in history')
+    return parser.parse_args(argv)
+
+def scenario_options(args) -> dict:
+    return {
+        'startup_import': {'budget_ms': args.startup_budget_ms},
+        'dashboard_polling': {'clients': args.clients, 'duration': args.duration},
+        'alert_tick_stream': {'alerts': args.alerts, 'ticks': args.ticks},
+        'backtest_bars': {'bars': args.bars},
+        'portfolio_summary': {'symbols': args.symbols},
+        'serialization': {'rows': args.rows},
+    }
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    names = args.scenario or list(SCENARIOS)
+    if args.recordings:
+        recordings = load_recordings(args.recordings, args.symbols)
+    else:
+        recordings = default_recordings(args.symbols)
+    upstream_options = dict(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            error_rate=args.error_rate, seed=1)
+    upstreams = {
+        service: FakeUpstream(service, entries, **upstream_options).start()
+        for service, entries in recordings.items()
+    }
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ.update({
+        'ALPACA_API_KEY': 'bench-key',
+        'ALPACA_SECRET_KEY': 'bench-secret',
+        'ALPACA_TRADING_URL_OVERRIDE': upstreams['alpaca'].url,
+        'ALPACA_DATA_URL': upstreams['alpaca'].url,
+        'COINGECKO_API_URL': upstreams['coingecko'].url + '/api/v3/',
+        'OPENAI_API_KEY': 'bench-key',
+        'OPENAI_API_BASE': upstreams['openai'].url + '/v1',
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+    })
+
+    options = scenario_options(args)
+    results = []
+    try:
+        for name in names:
+            print(f"running {name}...", file=sys.stderr)
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                try:
+                    results.append(ScenarioResult(**pool.submit(run_scenario, name, options[name]).result()))
+                except Exception as e:
+                    print(f"{name} failed: {e!r}", file=sys.stderr)
+    finally:
+        for upstream in upstreams.values():
+            upstream.stop()
+
+    print(format_table(results))
+    for result in results:
+        if result.extra:
+            print(f"  {result.scenario}: {result.extra}")
+    for upstream in upstreams.values():
+        print(f"  upstream {upstream.name}: {upstream.request_count} requests, {upstream.error_count} injected errors")
+
+    history = load_history()
+    regressions = compare_to_previous(results, history, args.regression_threshold)
+    if not args.no_store:
+        config = {k: v for k, v in vars(args).items() if k != 'scenario'}
+        print(f"results written to {store_results(results, config)}")
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    budget_failures = [r for r in results if r.scenario == 'startup_import' and not r.extra.get('within_budget')]
+    for result in budget_failures:
+        print(f"STARTUP BUDGET EXCEEDED import main {result.extra['import_ms']} ms > {result.extra['budget_ms']} ms "
+              f"(framework {result.extra['framework_ms']} ms, app {result.extra['app_ms']} ms)")
+    if args.fail_on_regression and (regressions or budget_failures):
+        return 1
+    if args.fail_on_budget:
+        measured = any(r.scenario == 'startup_import' for r in results)
+        if budget_failures or ('startup_import' in names and not measured):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""Benchmark scenarios; each runs in a fresh process and returns a ScenarioResult"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, Dict
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import LatencyRecorder, ScenarioResult
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DASHBOARD_ENDPOINTS = (
+    '/api/account',
+    '/api/positions',
+    '/api/orders',
+    '/api/account/history',
+    '/api/portfolio/summary',
+)
+
+def dashboard_polling(clients: int = 20, duration: float = 10.0) -> ScenarioResult:
+    """Concurrent clients cycling through the dashboard's polling endpoints"""
+    import httpx
+    import main
+    from models import User
+    from services.auth_service import get_current_user
+
+    # The polled routes are per user; skip token issuance, which is not what is measured
+    main.app.dependency_overrides[get_current_user] = lambda: User(
+        username='bench', email='bench@example.com', hashed_password=''
+    )
+
+    async def run():
+        recorder = LatencyRecorder()
+        status_counts: Dict[str, int] = {}
+        deadline = time.perf_counter() + duration
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            async def poller(offset: int):
+                n = offset
+                while time.perf_counter() < deadline:
+                    path = DASHBOARD_ENDPOINTS[n % len(DASHBOARD_ENDPOINTS)]
+                    n += 1
+                    start = time.perf_counter()
+                    response = await client.get(path)
+                    recorder.add(time.perf_counter() - start, response.status_code < 400)
+                    key = f"{path} {response.status_code}"
+                    status_counts[key] = status_counts.get(key, 0) + 1
+            await asyncio.gather(*(poller(i) for i in range(clients)))
+        return recorder.result('dashboard_polling', clients=clients, status_counts=status_counts)
+
+    return asyncio.run(run())
+
+def alert_tick_stream(alerts: int = 10_000, symbols: int = 100, ticks: int = 2_000) -> ScenarioResult:
+    """Evaluate many threshold alerts against a stream of price ticks"""
+    from services.alert_system import AlertManager, Alert
+
+    rng = random.Random(42)
+    names = [f'SYM{i:03d}' for i in range(symbols)]
+    manager = AlertManager()
+
+    async def run():
+        created = datetime.now()
+        for i in range(alerts):
+            # ~1% of alerts sit inside the tick range and can fire; the rest only cost evaluation
+            if i % 100 == 0:
+                condition = f"> {rng.uniform(99.0, 101.0):.2f}"
+            elif i % 2:
+                condition = f"> {rng.uniform(150.0, 200.0):.2f}"
+            else:
+                condition = f"< {rng.uniform(0.0, 50.0):.2f}"
+            await manager.add_alert(Alert(
+                id=f'alert-{i}', user_id=f'user-{i % 500}', symbol=names[i % symbols],
+                condition=condition, message='bench', status='active', created_at=created
+            ))
+        recorder = LatencyRecorder()
+        prices = {name: 100.0 for name in names}
+        for _ in range(ticks):
+            symbol = names[rng.randrange(symbols)]
+            prices[symbol] *= 1 + rng.gauss(0, 0.002)
+            start = time.perf_counter()
+            await manager.process_price_update(symbol, {'close': prices[symbol]})
+            recorder.add(time.perf_counter() - start)
+        return recorder.result('alert_tick_stream', alerts=alerts, symbols=symbols, ticks=ticks)
+
+    return asyncio.run(run())
+
+def synthetic_bars(count: int, seed: int = 7):
+    """Random-walk OHLCV frame shaped like yfinance's Ticker.history output"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.001, count)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.0005, count)) * close
+    index = pd.date_range(end=datetime.now(), periods=count, freq='min')
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) + spread,
+        'Low': np.minimum(open_, close) - spread,
+        'Close': close,
+        'Volume': rng.integers(1, 1000, count).astype(float),
+    }, index=index)
+
+def backtest_bars(bars: int = 1_000_000, repeats: int = 1) -> ScenarioResult:
+    """Run the backtester over a large recorded minute-bar series (yfinance stand-in)"""
+    import services.backtester as backtester_module
+
+    frame = synthetic_bars(bars)
+
+    class RecordedTicker:
+        def __init__(self, symbol: str):
+            self.symbol = symbol
+
+        def history(self, start=None, end=None, interval=None):
+            return frame
+
+    backtester_module.yf = SimpleNamespace(Ticker=RecordedTicker)
+    # Keep the recorded bars out of the database
+    backtester_module.yfinance_bars.store = None
+
+    start_date = frame.index[0].to_pydatetime()
+    end_date = frame.index[-1].to_pydatetime() + timedelta(minutes=1)
+
+    async def run():
+        recorder = LatencyRecorder()
+        trades = 0
+        for _ in range(repeats):
+            backtester = backtester_module.Backtester(
+                strategy_script='// bench', symbol='BTC-USD', timeframe='1m'
+            )
+            start = time.perf_counter()
+            try:
+                result = await backtester.run_backtest(start_date, end_date)
+                trades = len(result.trades)
+                recorder.add(time.perf_counter() - start)
+            except Exception:
+                recorder.add(time.perf_counter() - start, ok=False)
+        elapsed = sum(recorder.samples)
+        return recorder.result(
+            'backtest_bars', bars=bars, trades=trades,
+            bars_per_second=round(bars * repeats / elapsed, 1) if elapsed else 0.0
+        )
+
+    return asyncio.run(run())
+
+def portfolio_summary(symbols: int = 200, repeats: int = 20) -> ScenarioResult:
+    """Portfolio summary for a many-symbol portfolio against the CoinGecko stand-in"""
+    from services.portfolio_manager import PortfolioManager
+    from benchmarks.recordings import coin_universe
+
+    async def run():
+        manager = PortfolioManager(initial_capital=1e12)
+        await manager.initialize()
+        for coin in coin_universe(symbols):
+            await manager.add_position(coin['symbol'], 1.0, 10.0)
+        # Backdate trades so the performance calculation covers a realistic window
+        for trade in manager.trades_history:
+            trade['timestamp'] -= timedelta(days=90)
+        recorder = LatencyRecorder()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            summary = await manager.get_portfolio_summary()
+            recorder.add(time.perf_counter() - start, len(summary.positions) == symbols)
+        return recorder.result('portfolio_summary', symbols=symbols)
+
+    return asyncio.run(run())
+
+def serialization(rows: int = 10_000, repeats: int = 20) -> ScenarioResult:
+    """FastAPI's default jsonable_encoder + JSONResponse against the orjson response path"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from services.serialization import FastJSONResponse
+    from benchmarks.recordings import coin_universe
+
+    frame = synthetic_bars(rows).tz_localize('UTC')
+    # Shaped like TradingService.get_historical_data: datetimes and floats per bar
+    fields = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+    columns = [frame.index.to_pydatetime().tolist()] + [frame[c].tolist() for c in frame.columns]
+    history = [dict(zip(fields, row)) for row in zip(*columns)]
+    history_columnar = dict(zip(fields, columns))
+    coins = [{'symbol': c['symbol'].upper(), 'name': c['name'], 'id': c['id']} for c in coin_universe(rows)]
+    trades = [{
+        'type': 'buy', 'order_type': 'market', 'entry_price': 100.0 + i, 'entry_time': '2024-01-01T00:00:00',
+        'size': 1.5, 'fees': 0.0, 'exit_price': 101.0 + i, 'exit_time': '2024-01-02T00:00:00',
+        'exit_reason': 'signal', 'profit': 1.5,
+    } for i in range(rows)]
+    backtest = {'strategy_id': 'bench', 'trades': trades, 'metrics': {'total_trades': rows},
+                'equity_curve': [10000.0 + i for i in range(rows * 5)], 'drawdowns': [], 'symbol_metrics': {}}
+    payloads = {'history': history, 'history_columnar': history_columnar,
+                'crypto_list': coins, 'backtest_result': backtest}
+
+    recorder = LatencyRecorder()
+    timings = {}
+    for name, payload in payloads.items():
+        default_s = fast_s = 0.0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            JSONResponse(jsonable_encoder(payload))
+            default_s += time.perf_counter() - start
+            start = time.perf_counter()
+            FastJSONResponse(payload)
+            elapsed = time.perf_counter() - start
+            fast_s += elapsed
+            recorder.add(elapsed)
+        timings[name] = {
+            'default_ms': round(default_s / repeats * 1000, 3),
+            'orjson_ms': round(fast_s / repeats * 1000, 3),
+            'speedup': round(default_s / fast_s, 1) if fast_s else None,
+        }
+    return recorder.result('serialization', rows=rows, payloads=timings)
+
+# What `import main` costs before any app code runs; reported so a miss can be attributed
+FRAMEWORK_IMPORTS = (
+    'fastapi', 'fastapi.security', 'fastapi.middleware.cors', 'fastapi.middleware.gzip',
+    'pydantic', 'sqlalchemy.orm', 'sqlalchemy.ext.asyncio',
+)
+
+def _import_seconds(modules: str) -> float:
+    code = f'import time; t = time.perf_counter(); import {modules}; print(time.perf_counter() - t)'
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+def startup_import(runs: int = 5, budget_ms: float = 300.0) -> ScenarioResult:
+    """Cold `import main` time in a fresh interpreter, checked against a budget
+
+    The budget applies to the p50 of the full import time. The time to import
+    FRAMEWORK_IMPORTS alone, and what the app adds on top, are reported alongside.
+    """
+    recorder = LatencyRecorder()
+    framework = []
+    for _ in range(runs):
+        framework.append(_import_seconds(', '.join(FRAMEWORK_IMPORTS)))
+        seconds = _import_seconds('main')
+        recorder.add(seconds, seconds * 1000 <= budget_ms)
+    import_ms = recorder.percentile(0.5) * 1000
+    framework_ms = sorted(framework)[len(framework) // 2] * 1000
+    return recorder.result(
+        'startup_import', budget_ms=budget_ms, import_ms=round(import_ms, 1),
+        framework_ms=round(framework_ms, 1), app_ms=round(import_ms - framework_ms, 1),
+        within_budget=import_ms <= budget_ms
+    )
+
+SCENARIOS: Dict[str, Callable[..., ScenarioResult]] = {
+    'startup_import': startup_import,
+    'dashboard_polling': dashboard_polling,
+    'alert_tick_stream': alert_tick_stream,
+    'backtest_bars': backtest_bars,
+    'portfolio_summary': portfolio_summary,
+    'serialization': serialization,
+}
+
+def run_scenario(name: str, options: Dict) -> Dict:
+    """Process entry point: run one scenario from the backend directory"""
+    from dataclasses import asdict
+
+    os.chdir(BACKEND_DIR)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    return asdict(SCENARIOS[name](**options))
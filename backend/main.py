@@ -1,18 +1,74 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer
-from models import User
-from routers import backtest, alerts, portfolio, crypto, trading
-import uvicorn
-from datetime import datetime, timedelta
-import jwt
-from typing import Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+from routers import backtest, alerts, portfolio, crypto, trading, strategies, market_data, bots
+from database import async_engine
+from services.auth_service import create_access_token, ensure_user
+from services.metrics import MetricsMiddleware, monitor_event_loop_lag, registry
+from services.backplane import create_backplane
+from datetime import timedelta
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+async def warm_up():
+    """Load heavy libraries and upstream reference data after the server is accepting requests"""
+    try:
+        await asyncio.to_thread(trading.get_trading_service)
+        manager = await asyncio.to_thread(portfolio.get_portfolio_manager)
+        await manager.initialize()
+    except Exception as e:
+        logger.error(f"Error during warm-up: {str(e)}")
+
+async def position_symbols():
+    service = await asyncio.to_thread(trading.get_trading_service)
+    return [position['symbol'] for position in await service.get_positions()]
+
+async def all_orders():
+    service = await asyncio.to_thread(trading.get_trading_service)
+    return await service.get_orders('all')
+
+def last_price(symbol: str):
+    quote = market_data.market_data.get_quote(symbol)
+    return quote.price if quote else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Alerts, bots, paper trades, order owners and the quote feed are shared with the other uvicorn workers, if any
+    backplane = create_backplane()
+    await alerts.alert_manager.attach(backplane)
+    await bots.attach_backplane(backplane)
+    await portfolio.attach_backplane(backplane)
+    await trading.order_tracker.attach(backplane)
+    await market_data.market_data.attach(backplane)
+    await backplane.start()
+    await bots.load_bots()
+    await alerts.alert_manager.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    market_data_task = asyncio.create_task(market_data.market_data.start(position_symbols))
+    order_tracker_task = asyncio.create_task(trading.order_tracker.start(all_orders, last_price))
+    yield
+    warm_up_task.cancel()
+    loop_lag_task.cancel()
+    market_data_task.cancel()
+    order_tracker_task.cancel()
+    await market_data.market_data.stop()
+    await trading.order_tracker.stop()
+    await alerts.alert_manager.stop()
+    await alerts.alert_manager.callback_pool.stop()
+    await backplane.stop()
+    await backtest.backtest_jobs.shutdown()
+    await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -22,6 +78,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Compress responses for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "1024")))
 
 # Include routers
 app.include_router(backtest.router, prefix="/api")
@@ -29,62 +88,30 @@ app.include_router(alerts.router, prefix="/api")
 app.include_router(portfolio.router, prefix="/api")
 app.include_router(crypto.router, prefix="/api")
 app.include_router(trading.router, prefix="/api")
-
-# Authentication
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
-ALGORITHM = "HS256"
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        # Here you would typically query your database to get the user
-        # For now, we'll return a mock user
-        return User(username=username, email=f"{username}@example.com", hashed_password="")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+app.include_router(strategies.router, prefix="/api")
+app.include_router(market_data.router, prefix="/api")
+app.include_router(bots.router, prefix="/api")
 
 @app.get("/")
 async def root():
     return {"message": "Welcome"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/token")
 async def login(username: str, password: str):
     # Here you would typically verify the username and password against your database
-    # For now, we'll accept any username/password
+    # For now, we'll accept any username/password and register the user on first sign-in
+    await ensure_user(username)
     access_token = create_access_token(
         data={"sub": username},
         expires_delta=timedelta(minutes=30)
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/strategies")
-async def get_strategies(current_user: User = Depends(get_current_user)):
-    # Here you would typically query your database for the user's strategies
-    # For now, we'll return a mock strategy
-    return [
-        {
-            "id": "1",
-            "user_id": current_user.username,
-            "name": "Example Strategy",
-            "description": "Buy when RSI is oversold",
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
-    ]
-
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
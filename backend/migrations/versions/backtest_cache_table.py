@@ -0,0 +1,32 @@
+"""Add backtest_cache table for memoized backtest results
+
+Revision ID: backtest_cache_table
+Revises: backtest_jobs_table
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'backtest_cache_table'
+down_revision = 'backtest_jobs_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('backtest_cache',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('result', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_backtest_cache_last_used_at', 'backtest_cache', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_backtest_cache_last_used_at', table_name='backtest_cache')
+    op.drop_table('backtest_cache')
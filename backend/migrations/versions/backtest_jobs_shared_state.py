@@ -0,0 +1,33 @@
+"""Add progress, cache and cancellation columns to backtest_jobs so any worker can serve a job
+
+Revision ID: backtest_jobs_shared_state
+Revises: bar_coverage_table
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'backtest_jobs_shared_state'
+down_revision = 'bar_coverage_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('backtest_jobs', sa.Column('cached', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('backtest_jobs', sa.Column('bars_processed', sa.BigInteger(), nullable=False, server_default='0'))
+    op.add_column('backtest_jobs', sa.Column('total_bars', sa.BigInteger(), nullable=False, server_default='0'))
+    op.add_column('backtest_jobs', sa.Column('trades', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('backtest_jobs', sa.Column('cancel_requested', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('backtest_jobs', sa.Column('started_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('backtest_jobs', 'started_at')
+    op.drop_column('backtest_jobs', 'cancel_requested')
+    op.drop_column('backtest_jobs', 'trades')
+    op.drop_column('backtest_jobs', 'total_bars')
+    op.drop_column('backtest_jobs', 'bars_processed')
+    op.drop_column('backtest_jobs', 'cached')
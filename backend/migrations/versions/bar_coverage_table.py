@@ -0,0 +1,29 @@
+"""Add bar_coverage table recording which ranges of a bar series are stored
+
+Revision ID: bar_coverage_table
+Revises: backtest_cache_table
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'bar_coverage_table'
+down_revision = 'backtest_cache_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('bar_coverage',
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('timeframe', sa.String(), nullable=False),
+        sa.Column('start_ms', sa.BigInteger(), nullable=False),
+        sa.Column('end_ms', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('symbol', 'timeframe', 'start_ms')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('bar_coverage')
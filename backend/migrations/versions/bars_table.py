@@ -0,0 +1,34 @@
+"""Add bars table for historical OHLCV data
+
+Revision ID: bars_table
+Revises: strategies_user_updated
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'bars_table'
+down_revision = 'strategies_user_updated'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('bars',
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('timeframe', sa.String(), nullable=False),
+        sa.Column('ts', sa.BigInteger(), nullable=False),
+        sa.Column('open', sa.Float(), nullable=False),
+        sa.Column('high', sa.Float(), nullable=False),
+        sa.Column('low', sa.Float(), nullable=False),
+        sa.Column('close', sa.Float(), nullable=False),
+        sa.Column('volume', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('symbol', 'timeframe', 'ts'),
+        sqlite_with_rowid=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('bars')
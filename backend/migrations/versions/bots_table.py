@@ -0,0 +1,37 @@
+"""Add bots table so strategy bots survive restarts
+
+Revision ID: bots_table
+Revises: backtest_jobs_shared_state
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'bots_table'
+down_revision = 'backtest_jobs_shared_state'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('bots',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('timeframe', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Float(), nullable=False),
+        sa.Column('source', sa.Text(), nullable=False),
+        sa.Column('account', sa.String(), nullable=False),
+        sa.Column('position', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_bots_user_id'), 'bots', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_bots_user_id'), table_name='bots')
+    op.drop_table('bots')
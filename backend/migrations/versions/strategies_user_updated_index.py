@@ -0,0 +1,28 @@
+"""Add composite (user_id, updated_at) index on strategies
+
+Revision ID: strategies_user_updated
+Revises: initial
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'strategies_user_updated'
+down_revision = 'initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_strategies_user_id_updated_at',
+        'strategies',
+        ['user_id', 'updated_at'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_strategies_user_id_updated_at', table_name='strategies')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Boolean, Float, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -16,6 +16,10 @@ class User(Base):
 
 class Strategy(Base):
     __tablename__ = "strategies"
+    __table_args__ = (
+        # Serves "a user's strategies, most recently updated first" with keyset pagination
+        Index("ix_strategies_user_id_updated_at", "user_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -27,3 +31,76 @@ class Strategy(Base):
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     
     user = relationship("User", back_populates="strategies")
+
+class Bar(Base):
+    __tablename__ = "bars"
+    # Rows are clustered on the primary key so range reads for a series are sequential
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    symbol = Column(String, primary_key=True)
+    timeframe = Column(String, primary_key=True)
+    ts = Column(BigInteger, primary_key=True)  # bar open time, epoch milliseconds UTC
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Float, nullable=False)
+
+class BarCoverage(Base):
+    __tablename__ = "bar_coverage"
+
+    # [start_ms, end_ms) ranges whose bars are all in `bars`, so empty stretches aren't refetched either
+    symbol = Column(String, primary_key=True)
+    timeframe = Column(String, primary_key=True)
+    start_ms = Column(BigInteger, primary_key=True)
+    end_ms = Column(BigInteger, nullable=False)
+
+class BacktestJob(Base):
+    __tablename__ = "backtest_jobs"
+    __table_args__ = (
+        Index("ix_backtest_jobs_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    params = Column(Text, nullable=False)  # JSON-encoded BacktestRequest
+    result = Column(Text)  # JSON-encoded result, set once the job completes
+    error = Column(String)
+    cached = Column(Boolean, nullable=False, default=False)
+    # Progress as last saved by the worker running the job, for readers on other workers
+    bars_processed = Column(BigInteger, nullable=False, default=0)
+    total_bars = Column(BigInteger, nullable=False, default=0)
+    trades = Column(Integer, nullable=False, default=0)
+    # Set by any worker; the worker running the job polls for it
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class TradingBot(Base):
+    __tablename__ = "bots"
+
+    # A strategy bot's spec as BotRuntime replicates it; reloaded into the runtime on startup
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    name = Column(String, nullable=False)
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False)
+    quantity = Column(Float, nullable=False)
+    source = Column(Text, nullable=False)
+    account = Column(String, nullable=False)
+    position = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class BacktestCacheEntry(Base):
+    __tablename__ = "backtest_cache"
+    __table_args__ = (
+        Index("ix_backtest_cache_last_used_at", "last_used_at"),
+    )
+
+    key = Column(String, primary_key=True)  # sha256 of the normalized request, see services/backtest_cache.py
+    result = Column(Text, nullable=False)  # JSON-encoded backtest result
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime)  # null for ranges that end in the past
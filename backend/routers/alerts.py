@@ -1,20 +1,36 @@
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from services.alert_system import AlertManager, Alert
 from models import User
-from main import get_current_user
+from services.auth_service import get_current_user, get_websocket_user
+from routers.market_data import market_data
 import uuid
 
 router = APIRouter()
 alert_manager = AlertManager()
 
+async def evaluate_quote(quote) -> None:
+    """Market data listener: run the alerts for a streamed quote"""
+    await alert_manager.process_price_update(quote.symbol, quote.to_price_data())
+
+async def sync_alert_symbols() -> None:
+    """Stream quotes for the alert symbols this worker evaluates"""
+    await market_data.set_symbols("alerts", alert_manager.owned_subscriptions())
+
+market_data.add_listener(evaluate_quote)
+alert_manager.add_listener(sync_alert_symbols)
+
 class CreateAlertRequest(BaseModel):
     symbol: str
+    # "> 100", "<= 95.5" or "no new high in 4h"
     condition: str
     message: str
     status: str = "active"
+    expires_at: Optional[datetime] = None
+    cooldown_seconds: Optional[float] = Field(None, gt=0)
+    delivery: Literal["immediate", "digest"] = "immediate"
 
 class AlertResponse(BaseModel):
     id: str
@@ -25,6 +41,10 @@ class AlertResponse(BaseModel):
     status: str
     created_at: datetime
     triggered_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    cooldown_seconds: Optional[float] = None
+    rearm_at: Optional[datetime] = None
+    delivery: str = "immediate"
 
 @router.post("/alerts", response_model=AlertResponse)
 async def create_alert(
@@ -39,7 +59,10 @@ async def create_alert(
             condition=request.condition,
             message=request.message,
             status=request.status,
-            created_at=datetime.now()
+            created_at=datetime.now(),
+            expires_at=request.expires_at,
+            cooldown_seconds=request.cooldown_seconds,
+            delivery=request.delivery
         )
         
         await alert_manager.add_alert(alert)
@@ -60,6 +83,18 @@ async def get_alerts(current_user: User = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/alerts/callbacks")
+async def get_alert_callbacks(current_user: User = Depends(get_current_user)):
+    """Callback queue depth on this worker and the user's failed callbacks"""
+    pool = alert_manager.callback_pool
+    return {
+        "pending": pool.pending(),
+        "dead_letters": [
+            entry for entry in pool.dead_letters
+            if entry['context'].get('user_id') == current_user.username
+        ]
+    }
+
 @router.delete("/alerts/{alert_id}")
 async def delete_alert(
     alert_id: str,
@@ -81,10 +116,16 @@ async def delete_alert(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.websocket("/ws/alerts/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
+@router.websocket("/ws/alerts")
+async def websocket_endpoint(websocket: WebSocket):
+    """Push the signed-in user's alert notifications; clients connect with ?token="""
     await websocket.accept()
-    
+    user = await get_websocket_user(websocket)
+    if user is None:
+        await websocket.close(code=1008, reason="Invalid authentication credentials")
+        return
+    user_id = user.username
+
     try:
         # Register the WebSocket connection
         await alert_manager.register_websocket(user_id, websocket)
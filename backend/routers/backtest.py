@@ -1,13 +1,43 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, Query, Response
+from typing import Optional, List, Dict, Literal, Union
 from datetime import datetime
-from pydantic import BaseModel
-from services.backtester import Backtester
+from pydantic import BaseModel, Field, model_validator
 from models import User
-from main import get_current_user
+from services.auth_service import get_current_user, get_websocket_user
+from services.backtest_jobs import BacktestJobManager, COMPLETED, FINISHED_STATUSES, to_jsonable
+from services.serialization import FastJSONResponse
+import json
 
 router = APIRouter()
 
+backtest_jobs = BacktestJobManager()
+
+class FeeSettings(BaseModel):
+    per_share: float = Field(0.0, ge=0)
+    percent: float = Field(0.0, ge=0)
+    minimum: float = Field(0.0, ge=0)
+
+class SlippageSettings(BaseModel):
+    spread_bps: float = Field(0.0, ge=0)
+    slippage_bps: float = Field(0.0, ge=0)
+
+class ExecutionSettings(BaseModel):
+    fees: FeeSettings = FeeSettings()
+    slippage: SlippageSettings = SlippageSettings()
+    entry_order: Literal["market", "limit", "stop"] = "market"
+    entry_offset: float = Field(0.0, ge=0)
+    order_expiry_bars: int = Field(1, ge=1)
+    stop_loss: Optional[float] = Field(None, gt=0, lt=1)
+    take_profit: Optional[float] = Field(None, gt=0)
+    sizing: Literal["percent_equity", "fixed_notional", "fixed_units", "risk"] = "percent_equity"
+    sizing_value: Optional[float] = Field(None, gt=0)
+
+    @model_validator(mode="after")
+    def check_combination(self):
+        from services.execution import ExecutionModel
+        ExecutionModel.from_dict(self.model_dump())
+        return self
+
 class BacktestRequest(BaseModel):
     strategy_id: str
     symbol: str
@@ -16,46 +46,318 @@ class BacktestRequest(BaseModel):
     end_date: Optional[datetime] = None
     initial_capital: float = 10000.0
     position_size: float = 0.1
+    execution: Optional[ExecutionSettings] = None
+
+class PortfolioBacktestRequest(BaseModel):
+    strategy_id: str
+    symbols: List[str] = Field(..., min_length=1, max_length=500)
+    timeframe: str = "1d"
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    initial_capital: float = 10000.0
+    position_size: float = 0.1
+    max_positions: Optional[int] = Field(None, ge=1)
+    max_gross_exposure: float = Field(1.0, gt=0)
+    # Fees and slippage only; pending orders, brackets and other sizing modes are single-symbol
+    execution: Optional[ExecutionSettings] = None
+
+    @model_validator(mode="after")
+    def check_execution(self):
+        execution = self.execution
+        if execution and (execution.entry_order != "market" or execution.stop_loss or execution.take_profit
+                          or execution.sizing != "percent_equity"):
+            raise ValueError("Portfolio backtests support fees, slippage and percent_equity sizing only")
+        return self
+
+class WalkForwardRequest(BaseModel):
+    strategy_id: str
+    symbol: str
+    timeframe: str = "1d"
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    initial_capital: float = 10000.0
+    position_size: float = 0.1
+    param_grid: Dict[Literal["lookback", "position_size"], List[float]] = {"lookback": [1, 2, 3, 5, 10]}
+    in_sample_bars: int = Field(252, ge=10)
+    out_of_sample_bars: int = Field(63, ge=1)
+    step_bars: Optional[int] = Field(None, ge=1)
+    objective: Literal["sharpe_ratio", "sortino_ratio", "calmar_ratio", "total_profit", "profit_factor", "win_rate"] = "sharpe_ratio"
+
+class MonteCarloRequest(BaseModel):
+    paths: int = Field(10000, ge=100, le=100000)
+    method: Literal["bootstrap", "shuffle"] = "bootstrap"
+    confidence: float = Field(0.95, gt=0, lt=1)
+    seed: Optional[int] = None
 
 class BacktestResponse(BaseModel):
     strategy_id: str
-    trades: list
+    # A list of trade dicts, or parallel arrays keyed by field with trades=columnar
+    trades: Union[list, dict]
     metrics: dict
     equity_curve: list
     drawdowns: list
+    symbol_metrics: Optional[dict] = None
+    # Positions of the kept points in the full curves when downsampled
+    curve_index: Optional[List[int]] = None
 
-@router.post("/backtest", response_model=BacktestResponse)
+class WalkForwardResponse(BaseModel):
+    strategy_id: str
+    objective: str
+    windows: list
+    out_of_sample_metrics: dict
+    efficiency: Optional[float] = None
+
+class MonteCarloResponse(BaseModel):
+    job_id: str
+    method: str
+    paths: int
+    trades: int
+    confidence: float
+    probability_of_loss: float
+    metrics: dict
+
+class BacktestJobStatus(BaseModel):
+    job_id: str
+    status: str
+    strategy_id: Optional[str] = None
+    symbol: Optional[str] = None
+    symbols: Optional[List[str]] = None
+    bars_processed: int
+    total_bars: int
+    progress: float
+    trades: int
+    error: Optional[str] = None
+    cached: bool = False
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class ResultOptions:
+    """Query options shaping how a backtest result is sent; the stored result stays complete"""
+    def __init__(
+        self,
+        points: Optional[int] = Query(None, ge=3, le=100000, description="Downsample curves to this many points"),
+        trades: Literal["records", "columnar"] = Query("records", description="Trades as dicts or parallel arrays"),
+        format: Literal["json", "msgpack", "arrow"] = Query("json", description="Response encoding")
+    ):
+        self.points = points
+        self.columnar = trades == "columnar"
+        self.format = format
+
+def job_params(request: BaseModel) -> dict:
+    # Here you would typically load the strategy from the database
+    # For now, we'll use a placeholder strategy
+    params = request.model_dump(mode="json")
+    params["strategy_script"] = "// Example strategy\n"
+    if isinstance(request, WalkForwardRequest):
+        params["analysis"] = "walk_forward"
+    return params
+
+def job_response(job, result: dict, options: Optional[ResultOptions] = None):
+    strategy_id = job.params.get("strategy_id")
+    walk_forward = job.params.get("analysis") == "walk_forward"
+    if options and not walk_forward:
+        from services.backtest_payload import shape_result
+        result = shape_result(result, options.points, options.columnar)
+    payload = {"strategy_id": strategy_id, **result}
+    if options and options.format != "json":
+        from services.backtest_payload import MEDIA_TYPES, encode_payload
+        try:
+            content = encode_payload(payload, options.format)
+        except ImportError:
+            raise HTTPException(status_code=406, detail=f"{options.format} encoding is not available")
+        return Response(content=content, media_type=MEDIA_TYPES[options.format])
+    # Stored results are already JSON-safe; send them without re-validating every trade
+    return FastJSONResponse(payload)
+
+async def submitted_response(job, wait: bool, options: Optional[ResultOptions] = None):
+    """The result once the job finishes when `wait` is set, else 202 with the job's status"""
+    if not wait:
+        return FastJSONResponse(job.to_dict(), status_code=202)
+    job = await backtest_jobs.wait(job.id)
+    if job.status != COMPLETED:
+        raise Exception(job.error or f"Backtest {job.status}")
+    result = await backtest_jobs.get_result(job.id)
+    return job_response(job, result, options)
+
+async def get_user_job(job_id: str, current_user: User):
+    job = await backtest_jobs.get_job(job_id)
+    if job is None or job.user_id != current_user.username:
+        raise HTTPException(status_code=404, detail="Backtest job not found")
+    return job
+
+@router.post("/backtest", response_model=BacktestResponse, responses={202: {"model": BacktestJobStatus}})
 async def run_backtest(
     request: BacktestRequest,
+    wait: bool = Query(False, description="Hold the request open until the result is ready"),
+    options: ResultOptions = Depends(),
     current_user: User = Depends(get_current_user)
 ):
+    """Run a backtest in the worker pool; 202 with its job status, or its result with ?wait=true"""
     try:
-        # Here you would typically load the strategy from the database
-        # For now, we'll use a placeholder strategy
-        strategy_script = "// Example strategy\n"
-        
-        # Initialize backtester
-        backtester = Backtester(
-            strategy_script=strategy_script,
-            symbol=request.symbol,
-            timeframe=request.timeframe,
-            initial_capital=request.initial_capital,
-            position_size=request.position_size
-        )
-        
-        # Run backtest
-        result = await backtester.run_backtest(
-            start_date=request.start_date,
-            end_date=request.end_date
-        )
-        
-        return BacktestResponse(
-            strategy_id=request.strategy_id,
-            trades=result.trades,
-            metrics=result.metrics,
-            equity_curve=result.equity_curve,
-            drawdowns=result.drawdowns
+        job = await backtest_jobs.submit(current_user.username, job_params(request))
+        return await submitted_response(job, wait, options)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backtest/jobs", response_model=BacktestJobStatus, status_code=202)
+async def submit_backtest_job(
+    request: BacktestRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Queue a backtest and return its job id immediately"""
+    try:
+        job = await backtest_jobs.submit(current_user.username, job_params(request))
+        return job.to_dict()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backtest/portfolio", response_model=BacktestResponse, responses={202: {"model": BacktestJobStatus}})
+async def run_portfolio_backtest(
+    request: PortfolioBacktestRequest,
+    wait: bool = Query(False, description="Hold the request open until the result is ready"),
+    options: ResultOptions = Depends(),
+    current_user: User = Depends(get_current_user)
+):
+    """Backtest a basket of symbols with shared capital; 202 with its job status, or its result with ?wait=true"""
+    try:
+        job = await backtest_jobs.submit(current_user.username, job_params(request))
+        return await submitted_response(job, wait, options)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backtest/portfolio/jobs", response_model=BacktestJobStatus, status_code=202)
+async def submit_portfolio_backtest_job(
+    request: PortfolioBacktestRequest,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        job = await backtest_jobs.submit(current_user.username, job_params(request))
+        return job.to_dict()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backtest/walk-forward", response_model=WalkForwardResponse, responses={202: {"model": BacktestJobStatus}})
+async def run_walk_forward(
+    request: WalkForwardRequest,
+    wait: bool = Query(False, description="Hold the request open until the result is ready"),
+    current_user: User = Depends(get_current_user)
+):
+    """Walk-forward optimization over rolling in-sample/out-of-sample windows; 202 with its job status, or its result with ?wait=true"""
+    try:
+        job = await backtest_jobs.submit(current_user.username, job_params(request))
+        return await submitted_response(job, wait)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backtest/walk-forward/jobs", response_model=BacktestJobStatus, status_code=202)
+async def submit_walk_forward_job(
+    request: WalkForwardRequest,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        job = await backtest_jobs.submit(current_user.username, job_params(request))
+        return job.to_dict()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backtest/jobs", response_model=List[BacktestJobStatus])
+async def list_backtest_jobs(
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        jobs = await backtest_jobs.list_jobs(current_user.username, limit)
+        return [job.to_dict() for job in jobs]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backtest/jobs/{job_id}", response_model=BacktestJobStatus)
+async def get_backtest_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    job = await get_user_job(job_id, current_user)
+    return job.to_dict()
+
+@router.get("/backtest/jobs/{job_id}/result", response_model=Union[BacktestResponse, WalkForwardResponse])
+async def get_backtest_job_result(
+    job_id: str,
+    options: ResultOptions = Depends(),
+    current_user: User = Depends(get_current_user)
+):
+    """Stored result of a completed job; never recomputed"""
+    job = await get_user_job(job_id, current_user)
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Backtest job is {job.status}")
+    result = await backtest_jobs.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Backtest result not found")
+    return job_response(job, result, options)
+
+@router.post("/backtest/jobs/{job_id}/monte-carlo", response_model=MonteCarloResponse)
+async def run_monte_carlo(
+    job_id: str,
+    request: MonteCarloRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Confidence intervals for a completed backtest's metrics by resampling its trades"""
+    job = await get_user_job(job_id, current_user)
+    result = await backtest_jobs.get_result(job_id) if job.status == COMPLETED else None
+    profits = [t["profit"] for t in (result or {}).get("trades", []) if t.get("profit") is not None]
+    if not profits:
+        raise HTTPException(status_code=409, detail="Backtest job has no closed trades to resample")
+    try:
+        from services.backtest_analysis import monte_carlo
+        analysis = await backtest_jobs.run_analysis(
+            monte_carlo, profits, job.params["initial_capital"],
+            paths=request.paths, method=request.method, confidence=request.confidence, seed=request.seed
         )
-        
+        return MonteCarloResponse(job_id=job_id, **to_jsonable(analysis))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backtest/jobs/{job_id}/cancel", response_model=BacktestJobStatus)
+async def cancel_backtest_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    job = await get_user_job(job_id, current_user)
+    if not await backtest_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Backtest job is {job.status}")
+    # A running job stops at its next progress report, so it may still be running here
+    job = await get_user_job(job_id, current_user)
+    return job.to_dict()
+
+@router.websocket("/ws/backtest/{job_id}")
+async def backtest_job_websocket(websocket: WebSocket, job_id: str):
+    """Progress of one of the user's jobs; clients connect with ?token="""
+    await websocket.accept()
+    current_user = await get_websocket_user(websocket)
+    if current_user is None:
+        await websocket.close(code=1008, reason="Invalid authentication credentials")
+        return
+    try:
+        job = await get_user_job(job_id, current_user)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    await backtest_jobs.subscribe(job_id, websocket)
+    try:
+        # Send the current state, then progress updates as the worker reports them
+        await websocket.send_text(json.dumps({"type": "backtest_progress", **job.to_dict()}))
+        if job.status in FINISHED_STATUSES:
+            await websocket.close()
+            return
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await backtest_jobs.unsubscribe(job_id, websocket)
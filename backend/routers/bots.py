@@ -0,0 +1,168 @@
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Dict, List, Optional
+from datetime import datetime
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.basket_orders import BasketLeg
+from services.broker_clients import DEFAULT_ACCOUNT, broker_clients
+from database import get_async_db
+from models import User
+from services.auth_service import get_current_user
+from routers.market_data import market_data
+from routers.strategies import strategy_service
+import asyncio
+import uuid
+
+router = APIRouter()
+
+async def load_history(symbol: str, timeframe: str, start_ms: int, end_ms: int):
+    """Warm-up bars for a new bot group, from the shared crypto bar cache"""
+    from services.trading_service import crypto_bars
+    return await asyncio.to_thread(crypto_bars.get_bars, symbol, timeframe, start_ms, end_ms)
+
+async def route_orders(account: str, legs: List[BasketLeg], basket_id: str, owners: List[str]) -> Dict:
+    """Send the orders of one bar close as a basket through the account's TradingService
+
+    `owners` names the user whose bot sent each leg.
+    """
+    from routers.trading import get_trading_service, order_tracker
+    result = await get_trading_service(account).place_basket_order(legs, basket_id=basket_id)
+    if account == DEFAULT_ACCOUNT:
+        for leg, owner in zip(result['legs'], owners):
+            if leg['order'] is not None:
+                await order_tracker.record(leg['order'], owner)
+    return result
+
+_bot_runtime = None
+
+def get_bot_runtime():
+    """Create the BotRuntime on first use so numpy and the strategy compiler load lazily"""
+    global _bot_runtime
+    if _bot_runtime is None:
+        from services.bot_runtime import BotRuntime
+        from services.bot_store import BotStore
+        _bot_runtime = BotRuntime(history=load_history, route_orders=route_orders, store=BotStore())
+        _bot_runtime.add_listener(sync_bot_symbols)
+    return _bot_runtime
+
+async def attach_backplane(backplane) -> None:
+    """Replicate bots between workers; call before backplane.start()"""
+    runtime = await asyncio.to_thread(get_bot_runtime)
+    await runtime.attach(backplane)
+
+async def load_bots() -> None:
+    """Restore the saved bots; call after backplane.start()"""
+    await get_bot_runtime().load()
+
+async def sync_bot_symbols() -> None:
+    """Stream quotes for the bot symbols this worker evaluates"""
+    await market_data.set_symbols("bots", get_bot_runtime().owned_symbols())
+
+async def evaluate_quote(quote) -> None:
+    """Market data listener: extend the bot bars, once there is a runtime"""
+    if _bot_runtime is not None:
+        await _bot_runtime.on_quote(quote)
+
+market_data.add_listener(evaluate_quote)
+
+class CreateBotRequest(BaseModel):
+    name: str
+    symbol: str
+    quantity: float
+    # A saved strategy's Pine Script, or rules given inline
+    strategy_id: Optional[int] = None
+    script: Optional[str] = None
+    timeframe: Optional[str] = None
+    account: Optional[str] = None
+
+class BotStatsResponse(BaseModel):
+    evaluations: int
+    cpu_ms: float
+    avg_cpu_us: float
+    max_cpu_us: float
+    signals: int
+    orders: int
+    failed_orders: int
+
+class BotResponse(BaseModel):
+    id: str
+    user_id: str
+    name: str
+    symbol: str
+    timeframe: str
+    quantity: float
+    account: str
+    source: str
+    position: float
+    created_at: datetime
+    last_signal: Optional[str] = None
+    last_signal_at: Optional[datetime] = None
+    error: Optional[str] = None
+    stats: BotStatsResponse
+
+def _user_bot(bot_id: str, current_user: User):
+    bot = get_bot_runtime().bots.get(bot_id)
+    if bot is None or bot.user_id != current_user.username:
+        raise HTTPException(status_code=404, detail="Bot not found")
+    return bot
+
+@router.post("/bots", response_model=BotResponse)
+async def create_bot(
+    request: CreateBotRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Start a bot trading a saved strategy or inline rules on every bar close"""
+    if (request.strategy_id is None) == (request.script is None):
+        raise HTTPException(status_code=400, detail="Give either strategy_id or script")
+    script, timeframe = request.script, request.timeframe
+    if request.strategy_id is not None:
+        strategy = await strategy_service.get_strategy(db, current_user.username, request.strategy_id)
+        if strategy is None:
+            raise HTTPException(status_code=404, detail="Strategy not found")
+        script, timeframe = strategy.pine_script or "", timeframe or strategy.timeframe
+    try:
+        account = broker_clients.resolve(request.account, current_user.username)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    from services.bot_runtime import Bot
+    try:
+        bot = Bot(
+            id=str(uuid.uuid4()),
+            user_id=current_user.username,
+            name=request.name,
+            symbol=request.symbol,
+            timeframe=timeframe or "1h",
+            quantity=request.quantity,
+            source=script,
+            account=account.name
+        )
+        await get_bot_runtime().add_bot(bot)
+        return bot.to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/bots", response_model=List[BotResponse])
+async def list_bots(current_user: User = Depends(get_current_user)):
+    """The user's bots with their signal and CPU statistics"""
+    return [bot.to_dict() for bot in get_bot_runtime().user_bots(current_user.username)]
+
+@router.get("/bots/runtime")
+async def runtime_stats(current_user: User = Depends(get_current_user)):
+    """Groups of the user's bots on this worker: shared bars, distinct indicators and their CPU time"""
+    return get_bot_runtime().stats(current_user.username)
+
+@router.get("/bots/{bot_id}", response_model=BotResponse)
+async def get_bot(bot_id: str, current_user: User = Depends(get_current_user)):
+    return _user_bot(bot_id, current_user).to_dict()
+
+@router.delete("/bots/{bot_id}")
+async def delete_bot(bot_id: str, current_user: User = Depends(get_current_user)):
+    """Stop a bot; an open position is left as is"""
+    bot = _user_bot(bot_id, current_user)
+    await get_bot_runtime().remove_bot(bot.id)
+    return {"message": "Bot stopped"}
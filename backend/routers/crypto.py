@@ -1,18 +1,30 @@
 from fastapi import APIRouter, HTTPException
-from pycoingecko import CoinGeckoAPI
 import os
 from dotenv import load_dotenv
+from services.metrics import upstream_timer
+from services.serialization import FastJSONResponse
 
 load_dotenv()
 
 router = APIRouter()
-cg = CoinGeckoAPI(api_key=os.getenv('COINGECKO_API_KEY'))
+_cg = None
+
+def get_coingecko():
+    """Create the CoinGecko client on first use"""
+    global _cg
+    if _cg is None:
+        from pycoingecko import CoinGeckoAPI
+        _cg = CoinGeckoAPI(api_key=os.getenv('COINGECKO_API_KEY'))
+        if os.getenv('COINGECKO_API_URL'):
+            _cg.api_base_url = os.getenv('COINGECKO_API_URL')
+    return _cg
 
 @router.get("/crypto/price/{symbol}")
 async def get_crypto_price(symbol: str):
     try:
         # Get coin ID from symbol
-        coins_list = cg.get_coins_list()
+        with upstream_timer("coingecko", "get_coins_list"):
+            coins_list = get_coingecko().get_coins_list()
         coin_id = next(
             (coin['id'] for coin in coins_list if coin['symbol'].upper() == symbol.upper()),
             None
@@ -22,7 +34,8 @@ async def get_crypto_price(symbol: str):
             raise HTTPException(status_code=404, detail=f"Cryptocurrency {symbol} not found")
             
         # Get current price
-        price_data = cg.get_price(ids=coin_id, vs_currencies='usd')
+        with upstream_timer("coingecko", "get_price"):
+            price_data = get_coingecko().get_price(ids=coin_id, vs_currencies='usd')
         if not price_data or coin_id not in price_data:
             raise HTTPException(status_code=404, detail="Price data not available")
             
@@ -36,14 +49,15 @@ async def get_crypto_price(symbol: str):
 @router.get("/crypto/list")
 async def get_crypto_list():
     try:
-        coins_list = cg.get_coins_list()
-        return [
+        with upstream_timer("coingecko", "get_coins_list"):
+            coins_list = get_coingecko().get_coins_list()
+        return FastJSONResponse([
             {
                 "symbol": coin['symbol'].upper(),
                 "name": coin['name'],
                 "id": coin['id']
             }
             for coin in coins_list
-        ]
+        ])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
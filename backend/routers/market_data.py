@@ -0,0 +1,50 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from typing import Optional
+from services.market_data import MarketDataService
+from services.serialization import FastJSONResponse
+from services.auth_service import get_websocket_user
+import asyncio
+import json
+
+router = APIRouter()
+market_data = MarketDataService()
+
+@router.get("/quotes")
+async def get_quotes(symbols: Optional[str] = Query(None, description="Comma-separated symbols; all if omitted")):
+    """Last streamed quote per symbol"""
+    wanted = {s.strip() for s in symbols.split(",") if s.strip()} if symbols else None
+    return FastJSONResponse({
+        symbol: quote.to_dict() for symbol, quote in market_data.quotes.items()
+        if wanted is None or symbol in wanted
+    })
+
+@router.websocket("/ws/quotes")
+async def quotes_websocket(websocket: WebSocket):
+    """Stream quotes; clients connect with ?token= and send {"symbols": [...]} to set what they are watching"""
+    await websocket.accept()
+    if await get_websocket_user(websocket) is None:
+        await websocket.close(code=1008, reason="Invalid authentication credentials")
+        return
+    viewer = await market_data.add_viewer(websocket)
+    sender = asyncio.create_task(viewer.send_forever())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                symbols = message["symbols"]
+                if not isinstance(symbols, list):
+                    raise ValueError
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                await websocket.send_text(json.dumps({"type": "error", "message": "Expected {\"symbols\": [...]}"}))
+                continue
+            try:
+                await market_data.set_viewer_symbols(viewer, [str(s) for s in symbols])
+            except ValueError as e:
+                await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+                continue
+            await websocket.send_text(json.dumps({"type": "subscription", "symbols": sorted(viewer.symbols)}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        await market_data.remove_viewer(viewer)
@@ -2,10 +2,97 @@ from fastapi import APIRouter, HTTPException
 from typing import Dict, List
 from pydantic import BaseModel
 from datetime import datetime
-from ..services.portfolio_manager import PortfolioManager
+import asyncio
+import os
+import uuid
 
 router = APIRouter()
-portfolio_manager = PortfolioManager()
+_portfolio_manager = None
+_backplane = None
+# Trades published by this worker, resolved with None or the rejection once the broker echoes them
+_pending: Dict[str, asyncio.Future] = {}
+PORTFOLIO_TRADE_TIMEOUT = float(os.getenv("PORTFOLIO_TRADE_TIMEOUT", "10"))
+
+def get_portfolio_manager():
+    """Create the PortfolioManager on first use so pandas and CoinGecko load lazily"""
+    global _portfolio_manager
+    if _portfolio_manager is None:
+        from services.portfolio_manager import PortfolioManager
+        _portfolio_manager = PortfolioManager()
+    return _portfolio_manager
+
+async def apply_trade(trade: Dict) -> None:
+    manager = await asyncio.to_thread(get_portfolio_manager)
+    if trade['type'] == 'buy':
+        await manager.add_position(trade['symbol'], trade['quantity'], trade['price'], coin_id=trade.get('coin_id'))
+    else:
+        await manager.remove_position(trade['symbol'], trade['quantity'], trade['price'])
+
+async def attach_backplane(backplane) -> None:
+    """Apply paper trades in the order the broker delivers them, on every worker alike
+
+    The worker taking a trade applies it on the echo too, so all workers see the
+    same sequence and accept or reject each trade the same way.
+    """
+    global _backplane
+    _backplane = backplane
+    members: List[str] = []
+
+    async def on_trade(event: Dict) -> None:
+        if event['op'] == 'snapshot':
+            # Only a worker that has not traded yet can rebuild from the history
+            manager = await asyncio.to_thread(get_portfolio_manager)
+            if event['origin'] == backplane.worker_id or manager.trades_history:
+                return
+            for trade in event['trades']:
+                await apply_trade(trade)
+            return
+        error = None
+        try:
+            await apply_trade(event)
+        except ValueError as e:
+            error = str(e)
+        future = _pending.pop(event.get('id'), None) if event['origin'] == backplane.worker_id else None
+        if future is not None and not future.done():
+            future.set_result(error)
+
+    async def on_members(current: List[str]) -> None:
+        nonlocal members
+        previous, members = members, current
+        survivors = [m for m in previous if m in current] or [backplane.worker_id]
+        if set(current) - set(previous) and min(survivors) == backplane.worker_id and _portfolio_manager is not None \
+                and _portfolio_manager.trades_history:
+            await backplane.publish("portfolio", {
+                'op': 'snapshot', 'origin': backplane.worker_id,
+                'trades': [{k: t[k] for k in ('type', 'symbol', 'quantity', 'price', 'coin_id') if k in t}
+                           for t in _portfolio_manager.trades_history]
+            })
+
+    await backplane.subscribe("portfolio", on_trade)
+    backplane.on_members(on_members)
+
+async def execute_trade(side: str, trade: "TradeRequest") -> None:
+    """Apply a trade through the backplane; raises ValueError if it is rejected"""
+    event = {'type': side, 'symbol': trade.symbol, 'quantity': trade.quantity, 'price': trade.price}
+    if side == 'buy':
+        # Resolved here so workers applying the trade never look it up themselves
+        manager = await asyncio.to_thread(get_portfolio_manager)
+        event['coin_id'] = await manager.get_coin_id(trade.symbol)
+    if _backplane is None:
+        await apply_trade(event)
+        return
+    trade_id = str(uuid.uuid4())
+    future = asyncio.get_running_loop().create_future()
+    _pending[trade_id] = future
+    try:
+        await _backplane.publish("portfolio", {'op': 'trade', 'origin': _backplane.worker_id, 'id': trade_id, **event})
+        error = await asyncio.wait_for(future, timeout=PORTFOLIO_TRADE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Trade not confirmed by the backplane")
+    finally:
+        _pending.pop(trade_id, None)
+    if error is not None:
+        raise ValueError(error)
 
 class TradeRequest(BaseModel):
     symbol: str
@@ -22,11 +109,7 @@ class PortfolioResponse(BaseModel):
 @router.post("/trade/buy")
 async def buy_position(trade: TradeRequest):
     try:
-        await portfolio_manager.add_position(
-            symbol=trade.symbol,
-            quantity=trade.quantity,
-            price=trade.price
-        )
+        await execute_trade('buy', trade)
         return {"message": "Position added successfully"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -34,11 +117,7 @@ async def buy_position(trade: TradeRequest):
 @router.post("/trade/sell")
 async def sell_position(trade: TradeRequest):
     try:
-        await portfolio_manager.remove_position(
-            symbol=trade.symbol,
-            quantity=trade.quantity,
-            price=trade.price
-        )
+        await execute_trade('sell', trade)
         return {"message": "Position sold successfully"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -46,7 +125,7 @@ async def sell_position(trade: TradeRequest):
 @router.get("/portfolio/summary", response_model=PortfolioResponse)
 async def get_portfolio_summary():
     try:
-        portfolio = await portfolio_manager.get_portfolio_summary()
+        portfolio = await get_portfolio_manager().get_portfolio_summary()
         return {
             "total_value": portfolio.total_value,
             "cash": portfolio.cash,
@@ -59,4 +138,4 @@ async def get_portfolio_summary():
         
 @router.get("/portfolio/trades")
 async def get_trades_history():
-    return portfolio_manager.trades_history
+    return get_portfolio_manager().trades_history
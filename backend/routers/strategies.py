@@ -0,0 +1,106 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.strategy_service import StrategyService, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from database import get_async_db
+from models import User
+from services.auth_service import get_current_user
+
+router = APIRouter()
+strategy_service = StrategyService()
+
+class StrategyCreateRequest(BaseModel):
+    name: str
+    description: str = ""
+    pine_script: str = ""
+    timeframe: str = "D"
+
+class StrategyUpdateRequest(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    pine_script: Optional[str] = None
+    timeframe: Optional[str] = None
+
+class StrategySummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    description: Optional[str] = None
+    timeframe: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class StrategyDetail(StrategySummary):
+    pine_script: Optional[str] = None
+
+class StrategyPage(BaseModel):
+    items: List[StrategySummary]
+    next_cursor: Optional[str] = None
+
+@router.get("/strategies", response_model=StrategyPage)
+async def list_strategies(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List the user's strategies, most recently updated first"""
+    try:
+        return await strategy_service.list_strategies(db, current_user.username, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/strategies/{strategy_id}", response_model=StrategyDetail)
+async def get_strategy(
+    strategy_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Get a strategy including its Pine Script"""
+    strategy = await strategy_service.get_strategy(db, current_user.username, strategy_id)
+    if strategy is None:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    return strategy
+
+@router.post("/strategies", response_model=StrategyDetail)
+async def create_strategy(
+    request: StrategyCreateRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create a new strategy"""
+    try:
+        return await strategy_service.create_strategy(db, current_user.username, request.model_dump())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/strategies/{strategy_id}", response_model=StrategyDetail)
+async def update_strategy(
+    strategy_id: int,
+    request: StrategyUpdateRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Update an existing strategy"""
+    strategy = await strategy_service.update_strategy(
+        db, current_user.username, strategy_id, request.model_dump(exclude_unset=True)
+    )
+    if strategy is None:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    return strategy
+
+@router.delete("/strategies/{strategy_id}")
+async def delete_strategy(
+    strategy_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Delete a strategy"""
+    if not await strategy_service.delete_strategy(db, current_user.username, strategy_id):
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    return {"message": "Strategy deleted successfully"}
@@ -1,88 +1,232 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
-from pydantic import BaseModel
-from ..services.trading_service import TradingService
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from typing import List, Optional, Literal
+from datetime import datetime
+from pydantic import BaseModel, Field
+from services.serialization import dumps
+from routers.market_data import market_data
+from services.order_tracker import OrderTracker
+from services.broker_clients import DEFAULT_ACCOUNT, broker_clients
+from services.auth_service import get_current_user, get_websocket_user
+from models import User
 
 router = APIRouter()
-trading_service = TradingService()
+# Tracks the default account, whose trade-update stream the server subscribes to
+order_tracker = OrderTracker(lambda: broker_clients.accounts[DEFAULT_ACCOUNT].users)
+
+def get_trading_service(account: str = DEFAULT_ACCOUNT):
+    """TradingService for a broker account; the Alpaca SDK loads on first use"""
+    from services.trading_service import TradingService
+    return TradingService(broker_clients.clients(broker_clients.accounts[account]))
+
+def broker_account(
+    x_broker_account: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+) -> str:
+    """Account named by the X-Broker-Account header, else the user's account or the default"""
+    try:
+        return broker_clients.resolve(x_broker_account, current_user.username).name
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
 
 class OrderRequest(BaseModel):
     symbol: str
     quantity: float
     side: str
 
+class BasketLegRequest(BaseModel):
+    symbol: str = Field(..., min_length=1)
+    quantity: float = Field(..., gt=0)
+    side: Literal['buy', 'sell']
+    client_order_id: Optional[str] = Field(None, max_length=128)
+
+class BasketOrderRequest(BaseModel):
+    legs: List[BasketLegRequest] = Field(..., min_length=1)
+    # Reuse a basket_id to retry a basket without duplicating legs that went through
+    basket_id: Optional[str] = Field(None, max_length=64)
+    concurrency: Optional[int] = Field(None, ge=1, le=50)
+
 @router.get("/account")
-async def get_account():
+async def get_account(account: str = Depends(broker_account)):
     """Get account information"""
     try:
-        return await trading_service.get_account()
+        return await get_trading_service(account).get_account()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/positions")
-async def get_positions():
+async def get_positions(account: str = Depends(broker_account)):
     """Get current positions"""
     try:
-        return await trading_service.get_positions()
+        return await get_trading_service(account).get_positions()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/order")
-async def place_order(order: OrderRequest):
+async def place_order(
+    order: OrderRequest,
+    account: str = Depends(broker_account),
+    current_user: User = Depends(get_current_user)
+):
     """Place a market order"""
     try:
-        return await trading_service.place_market_order(
+        placed = await get_trading_service(account).place_market_order(
             symbol=order.symbol,
             quantity=order.quantity,
             side=order.side
         )
+        if account == DEFAULT_ACCOUNT:
+            await order_tracker.record(placed, current_user.username)
+        return placed
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/orders/basket")
+async def place_basket_order(
+    basket: BasketOrderRequest,
+    account: str = Depends(broker_account),
+    current_user: User = Depends(get_current_user)
+):
+    """Place market orders for a whole basket concurrently; returns a result per leg"""
+    from services.basket_orders import BasketLeg
+    try:
+        legs = [BasketLeg(**leg.model_dump()) for leg in basket.legs]
+        result = await get_trading_service(account).place_basket_order(legs, basket.basket_id, basket.concurrency)
+        for leg in result['legs']:
+            if leg['order'] is not None and account == DEFAULT_ACCOUNT:
+                await order_tracker.record(leg['order'], current_user.username)
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/order/{order_id}")
-async def get_order_status(order_id: str):
-    """Get status of an order"""
+async def get_order_status(order_id: str, account: str = Depends(broker_account)):
+    """Get status of an order, from the order tracker when it knows the order"""
     try:
-        return await trading_service.get_order_status(order_id)
+        if account != DEFAULT_ACCOUNT:
+            return await get_trading_service(account).get_order_status(order_id)
+        tracked = order_tracker.get(order_id)
+        if tracked is not None:
+            return tracked
+        order = await get_trading_service(account).get_order_status(order_id)
+        order_tracker.refresh(order)
+        return order
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/orders")
-async def get_orders(status: Optional[str] = None):
+async def get_orders(status: Optional[str] = None, account: str = Depends(broker_account)):
     """Get all orders with optional status filter"""
     try:
-        return await trading_service.get_orders(status)
+        if order_tracker.synced and account == DEFAULT_ACCOUNT:
+            return order_tracker.list(status)
+        return await get_trading_service(account).get_orders(status)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
 @router.get("/history/{symbol}")
 async def get_historical_data(
+    request: Request,
     symbol: str,
     timeframe: str = '1Day',
-    limit: int = 100
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, description="Bars per page; capped at HISTORY_MAX_LIMIT"),
+    cursor: Optional[str] = None,
+    format: Literal['records', 'columnar'] = 'records'
 ):
-    """Get historical price data"""
+    """Get one page of historical bars in [start, end), as a list of bars or parallel arrays per field
+
+    Any timeframe of whole minutes, hours, days or weeks works (e.g. 1Min, 3Hour, 2Day,
+    1Week); ones Alpaca does not serve are resampled from finer bars. Without `start`
+    the page ends at `end` (default now) and `next_cursor` pages back in time. Pages
+    carry an ETag; pages of closed bars are also marked cacheable forever.
+    """
+    import hashlib
+    from services.trading_service import immutable_history_key
+    options = {'limit': limit} if limit else {}
+    try:
+        # A page whose window is closed never changes: revalidate it without fetching anything
+        key = immutable_history_key(symbol, timeframe, start, end, cursor=cursor,
+                                    columnar=format == 'columnar', **options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if key is not None:
+        headers = {
+            'ETag': f'"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"',
+            'Cache-Control': 'public, max-age=31536000, immutable',
+        }
+        if _etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+            return Response(status_code=304, headers=headers)
     try:
-        return await trading_service.get_historical_data(
+        page = await get_trading_service().get_historical_data(
             symbol=symbol,
             timeframe=timeframe,
-            limit=limit
+            start=start,
+            end=end,
+            cursor=cursor,
+            columnar=format == 'columnar',
+            **options
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    body = dumps(page)
+    if key is None:
+        headers = {
+            'ETag': f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            'Cache-Control': 'public, max-age=31536000, immutable' if page['immutable'] else 'no-cache',
+        }
+        if _etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
 
 @router.get("/quote/{symbol}")
-async def get_latest_quote(symbol: str):
-    """Get latest quote for a symbol"""
+async def get_latest_quote(symbol: str, current_user: User = Depends(get_current_user)):
+    """Get latest quote for a symbol, from the stream when it has a fresh one"""
     try:
-        return await trading_service.get_latest_quote(symbol)
+        quote = market_data.get_quote(symbol)
+        if quote is not None:
+            await market_data.touch(symbol)
+            return quote.to_dict()
+        # Not streamed yet (or no feed configured): one REST lookup, which also vets the symbol
+        result = await get_trading_service().get_latest_quote(symbol)
+        await market_data.touch(symbol)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/account/history")
-async def get_account_history(period: str = '1M'):
+async def get_account_history(period: str = '1M', account: str = Depends(broker_account)):
     """Get account value history"""
     try:
-        return await trading_service.get_account_history(period)
+        return await get_trading_service(account).get_account_history(period)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.websocket("/ws/orders")
+async def orders_websocket(websocket: WebSocket):
+    """Push fills of the user's orders as the broker reports them"""
+    await websocket.accept()
+    user = await get_websocket_user(websocket)
+    if user is None:
+        await websocket.close(code=1008, reason="Invalid authentication credentials")
+        return
+    await order_tracker.add_websocket(websocket, user.username)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await order_tracker.remove_websocket(websocket, user.username)
@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, List
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Dict, List, Optional
 from services.alpaca_service import AlpacaService
+from services.broker_clients import broker_clients
+from services.basket_orders import BasketLeg
 from services.auth_service import get_current_user
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-alpaca_service = AlpacaService()
+
+def get_alpaca_service(
+    x_broker_account: Optional[str] = Header(None),
+    current_user: Dict = Depends(get_current_user)
+) -> AlpacaService:
+    """AlpacaService for the requested account, else the account assigned to the user"""
+    try:
+        account = broker_clients.resolve(x_broker_account, current_user.username)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return AlpacaService(broker_clients.clients(account))
 
 @router.get("/account")
-async def get_account_info(current_user: Dict = Depends(get_current_user)) -> Dict:
+async def get_account_info(alpaca_service: AlpacaService = Depends(get_alpaca_service)) -> Dict:
     """Get account information and portfolio value"""
     try:
         return await alpaca_service.get_account()
@@ -18,7 +32,7 @@ async def get_account_info(current_user: Dict = Depends(get_current_user)) -> Di
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/positions")
-async def get_positions(current_user: Dict = Depends(get_current_user)) -> List[Dict]:
+async def get_positions(alpaca_service: AlpacaService = Depends(get_alpaca_service)) -> List[Dict]:
     """Get current positions with P/L data"""
     try:
         return await alpaca_service.get_positions()
@@ -29,7 +43,7 @@ async def get_positions(current_user: Dict = Depends(get_current_user)) -> List[
 @router.post("/orders")
 async def place_order(
     order: Dict,
-    current_user: Dict = Depends(get_current_user)
+    alpaca_service: AlpacaService = Depends(get_alpaca_service)
 ) -> Dict:
     """Place a new market order"""
     try:
@@ -42,10 +56,29 @@ async def place_order(
         logger.error(f"Error in place_order: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/orders/basket")
+async def place_basket_order(
+    basket: Dict,
+    alpaca_service: AlpacaService = Depends(get_alpaca_service)
+) -> Dict:
+    """Place a basket of market orders concurrently; returns a result per leg"""
+    try:
+        legs = [
+            BasketLeg(symbol=leg["symbol"], quantity=float(leg["qty"]), side=leg["side"],
+                      client_order_id=leg.get("client_order_id"))
+            for leg in basket["legs"]
+        ]
+        return await alpaca_service.place_basket_order(legs, basket.get("basket_id"))
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in place_basket_order: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/orders")
 async def get_orders(
     status: str = "all",
-    current_user: Dict = Depends(get_current_user)
+    alpaca_service: AlpacaService = Depends(get_alpaca_service)
 ) -> List[Dict]:
     """Get order history"""
     try:
@@ -57,7 +90,7 @@ async def get_orders(
 @router.get("/portfolio/history")
 async def get_portfolio_history(
     timeframe: str = "1D",
-    current_user: Dict = Depends(get_current_user)
+    alpaca_service: AlpacaService = Depends(get_alpaca_service)
 ) -> Dict:
     """Get portfolio history and performance metrics"""
     try:
@@ -6,6 +6,7 @@ from pydantic import BaseModel
 import json
 import logging
 from datetime import datetime
+from services.metrics import upstream_timer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +25,8 @@ class AIResponse(BaseModel):
 class AIService:
     def __init__(self):
         openai.api_key = os.getenv("OPENAI_API_KEY")
+        if os.getenv("OPENAI_API_BASE"):
+            openai.api_base = os.getenv("OPENAI_API_BASE")
         if not openai.api_key:
             logger.error("OpenAI API key not found in environment variables")
             raise ValueError("OpenAI API key not configured")
@@ -49,15 +52,16 @@ class AIService:
             {market_context}
             """
 
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": request.prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
+            with upstream_timer("openai", "get_trading_analysis"):
+                response = await openai.ChatCompletion.acreate(
+                    model="gpt-4",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": request.prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=1000
+                )
 
             # Extract and structure the response
             content = response.choices[0].message.content
@@ -107,15 +111,16 @@ class AIService:
             3. Risk factors
             """
 
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an expert market analyst."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
+            with upstream_timer("openai", "get_market_insights"):
+                response = await openai.ChatCompletion.acreate(
+                    model="gpt-4",
+                    messages=[
+                        {"role": "system", "content": "You are an expert market analyst."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=500
+                )
 
             return response.choices[0].message.content
 
@@ -130,15 +135,16 @@ class AIService:
             system_prompt = """You are a cryptocurrency trading expert. Create a detailed trading strategy based on the given parameters.
             Include specific entry/exit rules and risk management guidelines."""
 
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": json.dumps(parameters)}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
+            with upstream_timer("openai", "generate_trading_strategy"):
+                response = await openai.ChatCompletion.acreate(
+                    model="gpt-4",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": json.dumps(parameters)}
+                    ],
+                    temperature=0.7,
+                    max_tokens=1500
+                )
 
             content = response.choices[0].message.content
             
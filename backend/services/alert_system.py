@@ -1,10 +1,113 @@
 import asyncio
-from typing import Dict, List, Optional, Callable
-import websockets
+from typing import Any, Awaitable, Dict, List, Optional, Callable, Set, Tuple
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging
+import os
+import re
+import time
 from pydantic import BaseModel
+from services.metrics import ALERT_EVALUATION_SECONDS, WEBSOCKET_CONNECTIONS
+from services.backplane import LocalBackplane
+from services.callback_pool import CallbackPool
+
+ALERT_TIMER_RESOLUTION = float(os.getenv("ALERT_TIMER_RESOLUTION", "1"))
+ALERT_DIGEST_SECONDS = float(os.getenv("ALERT_DIGEST_SECONDS", "3600"))
+
+# Statuses whose condition is evaluated; one_time alerts are removed once triggered
+ARMED_STATUSES = ('active', 'one_time')
+
+_STALE_CONDITION = re.compile(r'^\s*no new high (?:in )?(\d+(?:\.\d+)?)\s*(s|m|h|d)[a-z]*\s*$', re.IGNORECASE)
+_STALE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def stale_window(condition: str) -> Optional[float]:
+    """Seconds for "no new high in N{s,m,h,d}" conditions, else None"""
+    match = _STALE_CONDITION.match(condition)
+    if not match:
+        return None
+    return float(match.group(1)) * _STALE_UNITS[match.group(2).lower()]
+
+def _seconds_until(when: datetime) -> float:
+    now = datetime.now(timezone.utc) if when.tzinfo else datetime.now()
+    return (when - now).total_seconds()
+
+class Timer:
+    __slots__ = ('deadline', 'handler', 'args', 'slot')
+
+    def __init__(self, deadline: int, handler: Callable, args: Tuple):
+        self.deadline = deadline
+        self.handler = handler
+        self.args = args
+        self.slot: Optional[Set["Timer"]] = None
+
+    def cancel(self) -> None:
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+
+class TimingWheel:
+    """Hierarchical timing wheel: O(1) schedule and cancel for any number of timers
+
+    Time advances in ticks of `resolution` seconds. Level 0 has one slot per
+    tick; each higher level's slot spans a full rotation of the level below and
+    is redistributed downwards when that rotation completes. A timer goes to the
+    lowest level on which its deadline shares every higher digit with the
+    current tick, so it is cascaded exactly when its slot comes round.
+    """
+    def __init__(self, resolution: float = ALERT_TIMER_RESOLUTION, bits: int = 8, levels: int = 4,
+                 clock: Callable[[], float] = time.monotonic):
+        self.resolution = resolution
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.clock = clock
+        self.tick = self._now()
+        self.levels: List[List[Set[Timer]]] = [[set() for _ in range(1 << bits)] for _ in range(levels)]
+
+    def _now(self) -> int:
+        return int(self.clock() / self.resolution)
+
+    def __len__(self) -> int:
+        return sum(len(slot) for level in self.levels for slot in level)
+
+    def schedule(self, delay: float, handler: Callable, *args) -> Timer:
+        """Run `handler(*args)` once `delay` seconds have passed (rounded up to a tick)"""
+        deadline = self._now() + max(1, -int(-delay // self.resolution))
+        timer = Timer(deadline, handler, args)
+        self._place(timer)
+        return timer
+
+    def _place(self, timer: Timer) -> None:
+        deadline = max(timer.deadline, self.tick + 1)
+        level = min(((deadline ^ self.tick).bit_length() - 1) // self.bits, len(self.levels) - 1)
+        slot = self.levels[level][(deadline >> (level * self.bits)) & self.mask]
+        slot.add(timer)
+        timer.slot = slot
+
+    def advance(self) -> List[Timer]:
+        """Move to the current time and return the timers that expired on the way"""
+        expired: List[Timer] = []
+        target = self._now()
+        while self.tick < target:
+            self.tick += 1
+            # Cascade from the highest level whose lower digits just wrapped to zero
+            level = 0
+            while level + 1 < len(self.levels) and self.tick & ((1 << ((level + 1) * self.bits)) - 1) == 0:
+                level += 1
+            for upper in range(level, 0, -1):
+                index = (self.tick >> (upper * self.bits)) & self.mask
+                timers, self.levels[upper][index] = self.levels[upper][index], set()
+                for timer in timers:
+                    if timer.deadline > self.tick:
+                        self._place(timer)
+                    else:
+                        timer.slot = None
+                        expired.append(timer)
+            slot = self.levels[0][self.tick & self.mask]
+            for timer in slot:
+                timer.slot = None
+            expired.extend(slot)
+            slot.clear()
+        return expired
 
 class Alert(BaseModel):
     id: str
@@ -15,23 +118,120 @@ class Alert(BaseModel):
     status: str
     created_at: datetime
     triggered_at: Optional[datetime] = None
+    # Removed at this time if still pending
+    expires_at: Optional[datetime] = None
+    # After triggering, wait this long and re-arm instead of staying triggered
+    cooldown_seconds: Optional[float] = None
+    rearm_at: Optional[datetime] = None
+    # "immediate", or "digest" to batch notifications every ALERT_DIGEST_SECONDS
+    delivery: str = "immediate"
 
 class AlertManager:
-    def __init__(self):
+    """Alerts shared by every worker through a backplane
+
+    Each worker keeps the full alert table (changes are replicated on the
+    "alerts" channel) but only evaluates the symbols the backplane assigns to
+    it. Notifications are published on the user's channel and delivered by
+    whichever worker holds that user's websocket.
+
+    Time-driven behaviour (expiry, cooldown re-arm, "no new high in N" and
+    digests) runs on a TimingWheel. Every worker schedules the timers of every
+    alert; only the worker owning the alert's symbol acts when one fires.
+    """
+    def __init__(self, backplane=None):
         self.alerts: Dict[str, Alert] = {}
-        self.websocket_connections: Dict[str, websockets.WebSocketServerProtocol] = {}
+        # FastAPI websockets, or websockets-library ones from AlertWebSocketHandler
+        self.websocket_connections: Dict[str, Any] = {}
         self.price_subscriptions: Dict[str, set] = {}
         self.callbacks: Dict[str, List[Callable]] = {}
+        self.callback_pool = CallbackPool("alerts")
+        self.backplane = backplane or LocalBackplane()
+        self._listeners: List[Callable[[], Awaitable[None]]] = []
+        self._user_handlers: Dict[str, Callable] = {}
+        self._members: List[str] = []
+        self.timers = TimingWheel()
+        self._timers: Dict[Tuple[str, str], Timer] = {}
+        self._timer_task: Optional[asyncio.Task] = None
+        self._stale_windows: Dict[str, float] = {}
+        self._highs: Dict[str, Tuple[float, Dict]] = {}
+        self._digests: Dict[str, List[Dict]] = {}
+        
+    async def start(self) -> None:
+        """Start firing timers"""
+        self._timer_task = asyncio.create_task(self._run_timers())
+        
+    async def stop(self) -> None:
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            
+    async def _run_timers(self) -> None:
+        while True:
+            await asyncio.sleep(self.timers.resolution)
+            for timer in self.timers.advance():
+                try:
+                    await timer.handler(*timer.args)
+                except Exception as e:
+                    logging.error(f"Error running alert timer: {str(e)}")
+                    
+    def _set_timer(self, key: Tuple[str, str], delay: Optional[float], handler: Callable, *args) -> None:
+        """Replace the timer under `key`; a delay of None just cancels it"""
+        previous = self._timers.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+        if delay is not None:
+            self._timers[key] = self.timers.schedule(delay, handler, *args)
+            
+    def _schedule(self, alert: Alert) -> None:
+        """(Re)schedule the expiry and re-arm timers from the alert's state"""
+        expires = _seconds_until(alert.expires_at) if alert.expires_at else None
+        self._set_timer((alert.id, 'expire'), expires, self._expire, alert.id)
+        rearm = _seconds_until(alert.rearm_at) if alert.status == 'cooldown' and alert.rearm_at else None
+        self._set_timer((alert.id, 'rearm'), rearm, self._rearm, alert.id)
+        
+    async def attach(self, backplane) -> None:
+        """Share alerts and notifications with other workers; call before backplane.start()"""
+        for user_id, handler in self._user_handlers.items():
+            await self.backplane.unsubscribe(f"user:{user_id}", handler)
+            await backplane.subscribe(f"user:{user_id}", handler)
+        self.backplane = backplane
+        await backplane.subscribe("alerts", self._on_alert_event)
+        backplane.on_members(self._on_members)
+        
+    def add_listener(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Call `callback` whenever the symbols this worker evaluates may have changed"""
+        self._listeners.append(callback)
+        
+    async def _subscriptions_changed(self) -> None:
+        for callback in list(self._listeners):
+            try:
+                await callback()
+            except Exception as e:
+                logging.error(f"Error in alert subscription listener: {str(e)}")
+        
+    def owned_subscriptions(self) -> Dict[str, set]:
+        """Price subscriptions for the symbols this worker evaluates"""
+        return {
+            symbol: alert_ids for symbol, alert_ids in self.price_subscriptions.items()
+            if self.backplane.owns(symbol)
+        }
         
-    async def add_alert(self, alert: Alert) -> None:
+    async def add_alert(self, alert: Alert, publish: bool = True) -> None:
         """Add a new alert to the system"""
         self.alerts[alert.id] = alert
         # Subscribe to price updates if needed
         if alert.symbol not in self.price_subscriptions:
             self.price_subscriptions[alert.symbol] = set()
         self.price_subscriptions[alert.symbol].add(alert.id)
+        self._schedule(alert)
+        window = stale_window(alert.condition)
+        if window is not None:
+            self._stale_windows[alert.id] = window
+            self._set_timer((alert.id, 'stale'), window, self._stale, alert.id)
+        if publish:
+            await self._publish('add', alert)
+        await self._subscriptions_changed()
         
-    async def remove_alert(self, alert_id: str) -> None:
+    async def remove_alert(self, alert_id: str, publish: bool = True) -> None:
         """Remove an alert from the system"""
         if alert_id in self.alerts:
             alert = self.alerts[alert_id]
@@ -39,15 +239,87 @@ class AlertManager:
             if not self.price_subscriptions[alert.symbol]:
                 del self.price_subscriptions[alert.symbol]
             del self.alerts[alert_id]
+            self.callbacks.pop(alert_id, None)
+            for kind in ('expire', 'rearm', 'stale'):
+                self._set_timer((alert_id, kind), None, None)
+            self._stale_windows.pop(alert_id, None)
+            self._highs.pop(alert_id, None)
+            if publish:
+                await self._publish('remove', alert)
+            await self._subscriptions_changed()
+            
+    async def _publish(self, op: str, alert: Alert) -> None:
+        await self.backplane.publish("alerts", {
+            'op': op, 'origin': self.backplane.worker_id, 'alert': alert.model_dump(mode='json')
+        })
+        
+    async def _on_alert_event(self, event: Dict) -> None:
+        """Apply an alert change made by another worker"""
+        if event.get('origin') == self.backplane.worker_id:
+            return
+        if event['op'] == 'snapshot':
+            for data in event['alerts']:
+                if data['id'] not in self.alerts:
+                    await self.add_alert(Alert(**data), publish=False)
+            return
+        alert = Alert(**event['alert'])
+        if event['op'] == 'add':
+            await self.add_alert(alert, publish=False)
+        elif event['op'] == 'update' and alert.id in self.alerts:
+            self.alerts[alert.id] = alert
+            self._schedule(alert)
+        elif event['op'] == 'remove':
+            await self.remove_alert(alert.id, publish=False)
+            
+    async def _on_members(self, members: List[str]) -> None:
+        previous, self._members = self._members, members
+        joined = set(members) - set(previous)
+        survivors = [m for m in previous if m in members] or [self.backplane.worker_id]
+        # One worker from the existing group brings newcomers up to date
+        if joined and min(survivors) == self.backplane.worker_id and self.alerts:
+            await self.backplane.publish("alerts", {
+                'op': 'snapshot', 'origin': self.backplane.worker_id,
+                'alerts': [alert.model_dump(mode='json') for alert in self.alerts.values()]
+            })
+        await self._subscriptions_changed()
             
-    async def register_websocket(self, user_id: str, websocket: websockets.WebSocketServerProtocol) -> None:
+    async def register_websocket(self, user_id: str, websocket) -> None:
         """Register a new WebSocket connection for a user"""
         self.websocket_connections[user_id] = websocket
+        WEBSOCKET_CONNECTIONS.labels("alerts").set(len(self.websocket_connections))
+        if user_id not in self._user_handlers:
+            async def deliver(notification: Dict) -> None:
+                await self._send_to_user(user_id, notification)
+            self._user_handlers[user_id] = deliver
+            await self.backplane.subscribe(f"user:{user_id}", deliver)
         
     async def unregister_websocket(self, user_id: str) -> None:
         """Unregister a WebSocket connection"""
         if user_id in self.websocket_connections:
             del self.websocket_connections[user_id]
+        WEBSOCKET_CONNECTIONS.labels("alerts").set(len(self.websocket_connections))
+        handler = self._user_handlers.pop(user_id, None)
+        if handler is not None:
+            await self.backplane.unsubscribe(f"user:{user_id}", handler)
+            
+    async def _send_to_user(self, user_id: str, notification: Dict) -> None:
+        """Send to the user's websocket if it is connected to this worker"""
+        websocket = self.websocket_connections.get(user_id)
+        if websocket is None:
+            return
+        # FastAPI websockets send text with send_text, websockets-library ones with send
+        if hasattr(websocket, 'send_text'):
+            try:
+                await websocket.send_text(json.dumps(notification))
+            except RuntimeError:
+                await self.unregister_websocket(user_id)
+            return
+        # Only the standalone handler uses the websockets library; keep it out of `import main`
+        import websockets
+        try:
+            await websocket.send(json.dumps(notification))
+        except (websockets.exceptions.ConnectionClosed, RuntimeError):
+            await self.unregister_websocket(user_id)
             
     async def add_callback(self, alert_id: str, callback: Callable) -> None:
         """Add a callback function for an alert"""
@@ -57,13 +329,75 @@ class AlertManager:
         
     async def process_price_update(self, symbol: str, price_data: Dict) -> None:
         """Process a price update and check for triggered alerts"""
-        if symbol not in self.price_subscriptions:
+        if symbol not in self.price_subscriptions or not self.backplane.owns(symbol):
             return
             
-        for alert_id in self.price_subscriptions[symbol]:
-            alert = self.alerts[alert_id]
-            if await self._check_alert_condition(alert, price_data):
-                await self._trigger_alert(alert, price_data)
+        with ALERT_EVALUATION_SECONDS.time():
+            for alert_id in list(self.price_subscriptions.get(symbol, ())):
+                alert = self.alerts.get(alert_id)
+                if alert is None or alert.status not in ARMED_STATUSES:
+                    continue
+                if alert_id in self._stale_windows:
+                    self._track_high(alert, price_data)
+                elif await self._check_alert_condition(alert, price_data):
+                    await self._trigger_alert(alert, price_data)
+                    
+    def _track_high(self, alert: Alert, price_data: Dict) -> None:
+        """Restart the "no new high" countdown whenever the price makes a new high"""
+        price = price_data.get('close', 0)
+        high = self._highs.get(alert.id)
+        if high is None or price > high[0]:
+            self._set_timer((alert.id, 'stale'), self._stale_windows[alert.id], self._stale, alert.id)
+            high = (price, price_data)
+        self._highs[alert.id] = (high[0], price_data)
+        
+    async def _stale(self, alert_id: str) -> None:
+        alert = self.alerts.get(alert_id)
+        if alert is None:
+            return
+        if not self.backplane.owns(alert.symbol) or alert.status not in ARMED_STATUSES:
+            # Keep counting so a worker taking over the symbol still fires
+            self._set_timer((alert_id, 'stale'), self._stale_windows[alert_id], self._stale, alert_id)
+            return
+        high = self._highs.get(alert_id)
+        await self._trigger_alert(alert, high[1] if high else {'close': 0})
+        
+    async def _expire(self, alert_id: str) -> None:
+        alert = self.alerts.get(alert_id)
+        if alert is None or not self.backplane.owns(alert.symbol):
+            return
+        await self.remove_alert(alert_id)
+        await self.backplane.publish(f"user:{alert.user_id}", {
+            'type': 'alert_expired',
+            'alert_id': alert.id,
+            'symbol': alert.symbol,
+            'message': alert.message
+        })
+        
+    async def _rearm(self, alert_id: str) -> None:
+        alert = self.alerts.get(alert_id)
+        if alert is None or alert.status != 'cooldown' or not self.backplane.owns(alert.symbol):
+            return
+        alert.status = 'active'
+        alert.rearm_at = None
+        self._highs.pop(alert_id, None)
+        if alert_id in self._stale_windows:
+            self._set_timer((alert_id, 'stale'), self._stale_windows[alert_id], self._stale, alert_id)
+        await self._publish('update', alert)
+        
+    async def _queue_digest(self, user_id: str, notification: Dict) -> None:
+        pending = self._digests.setdefault(user_id, [])
+        pending.append(notification)
+        if len(pending) == 1:
+            self._set_timer((user_id, 'digest'), ALERT_DIGEST_SECONDS, self._send_digest, user_id)
+            
+    async def _send_digest(self, user_id: str) -> None:
+        self._timers.pop((user_id, 'digest'), None)
+        alerts = self._digests.pop(user_id, [])
+        if alerts:
+            await self.backplane.publish(f"user:{user_id}", {
+                'type': 'digest', 'alerts': alerts, 'sent_at': datetime.now().isoformat()
+            })
                 
     async def _check_alert_condition(self, alert: Alert, price_data: Dict) -> bool:
         """Check if an alert condition is met"""
@@ -95,9 +429,14 @@ class AlertManager:
     async def _trigger_alert(self, alert: Alert, price_data: Dict) -> None:
         """Handle a triggered alert"""
         try:
-            # Update alert status
-            alert.status = "triggered"
+            one_time = alert.status == "one_time"
             alert.triggered_at = datetime.now()
+            if alert.cooldown_seconds and not one_time:
+                alert.status = "cooldown"
+                alert.rearm_at = alert.triggered_at + timedelta(seconds=alert.cooldown_seconds)
+                self._schedule(alert)
+            else:
+                alert.status = "triggered"
             
             # Prepare notification message
             notification = {
@@ -109,25 +448,20 @@ class AlertManager:
                 'triggered_at': alert.triggered_at.isoformat()
             }
             
-            # Send notification to user's WebSocket if connected
-            if alert.user_id in self.websocket_connections:
-                try:
-                    await self.websocket_connections[alert.user_id].send(
-                        json.dumps(notification)
-                    )
-                except websockets.exceptions.ConnectionClosed:
-                    await self.unregister_websocket(alert.user_id)
-            
-            # Execute callbacks
-            if alert.id in self.callbacks:
-                for callback in self.callbacks[alert.id]:
-                    try:
-                        await callback(alert, price_data)
-                    except Exception as e:
-                        logging.error(f"Error executing alert callback: {str(e)}")
+            if alert.delivery == "digest":
+                await self._queue_digest(alert.user_id, notification)
+            else:
+                # Routed to whichever worker holds the user's websocket
+                await self.backplane.publish(f"user:{alert.user_id}", notification)
+            await self._publish('update', alert)
+            
+            # Callbacks run on the pool so a slow one cannot hold up evaluation
+            context = {'alert_id': alert.id, 'user_id': alert.user_id, 'symbol': alert.symbol}
+            for callback in self.callbacks.get(alert.id, ()):
+                self.callback_pool.submit(callback, alert, price_data, context=context)
             
             # Remove one-time alerts
-            if alert.status == "one_time":
+            if one_time:
                 await self.remove_alert(alert.id)
                 
         except Exception as e:
@@ -137,8 +471,9 @@ class AlertWebSocketHandler:
     def __init__(self, alert_manager: AlertManager):
         self.alert_manager = alert_manager
         
-    async def handle_websocket(self, websocket: websockets.WebSocketServerProtocol, path: str):
+    async def handle_websocket(self, websocket: "websockets.WebSocketServerProtocol", path: str):
         """Handle WebSocket connections for real-time alerts"""
+        import websockets
         try:
             # Authenticate user (you should implement proper authentication)
             auth_message = await websocket.recv()
@@ -1,27 +1,37 @@
-from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import MarketOrderRequest, GetOrdersRequest
 from alpaca.trading.enums import OrderSide, TimeInForce, OrderStatus
-from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
-import os
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
+from services.metrics import upstream_timer
+from services.basket_orders import BasketLeg, dispatch_basket
+from services.broker_clients import BrokerClients, broker_clients
 
 logger = logging.getLogger(__name__)
 
 class AlpacaService:
-    def __init__(self):
-        self.api_key = os.getenv("ALPACA_API_KEY")
-        self.api_secret = os.getenv("ALPACA_API_SECRET")
-        self.trading_client = TradingClient(self.api_key, self.api_secret, paper=True)
-        self.data_client = StockHistoricalDataClient(self.api_key, self.api_secret)
+    def __init__(self, clients: Optional[BrokerClients] = None):
+        self.clients = clients or broker_clients.clients()
+
+    @property
+    def trading_client(self):
+        return self.clients.trading
+
+    @property
+    def data_client(self):
+        return self.clients.stock_data
+
+    @property
+    def order_budget(self):
+        return self.clients.order_budget
 
     async def get_account(self) -> Dict:
         """Get account information including cash balance and portfolio value"""
         try:
-            account = self.trading_client.get_account()
+            with upstream_timer("alpaca", "get_account"):
+                account = self.trading_client.get_account()
             return {
                 "cash": float(account.cash),
                 "portfolio_value": float(account.portfolio_value),
@@ -32,7 +42,7 @@ class AlpacaService:
                 "initial_margin": float(account.initial_margin),
                 "maintenance_margin": float(account.maintenance_margin),
                 "last_equity": float(account.last_equity),
-                "day_trade_count": account.day_trade_count
+                "day_trade_count": account.daytrade_count
             }
         except Exception as e:
             logger.error(f"Error getting account info: {str(e)}")
@@ -41,7 +51,8 @@ class AlpacaService:
     async def get_positions(self) -> List[Dict]:
         """Get current positions with P/L calculations"""
         try:
-            positions = self.trading_client.get_all_positions()
+            with upstream_timer("alpaca", "get_all_positions"):
+                positions = self.trading_client.get_all_positions()
             return [{
                 "symbol": pos.symbol,
                 "qty": float(pos.qty),
@@ -70,28 +81,54 @@ class AlpacaService:
                 side=order_side,
                 time_in_force=TimeInForce.DAY
             )
-            order = self.trading_client.submit_order(market_order)
-            return {
-                "order_id": order.id,
-                "client_order_id": order.client_order_id,
-                "symbol": order.symbol,
-                "qty": float(order.qty),
-                "side": order.side.value,
-                "status": order.status.value,
-                "created_at": order.created_at.isoformat(),
-                "filled_at": order.filled_at.isoformat() if order.filled_at else None,
-                "filled_qty": float(order.filled_qty) if order.filled_qty else 0,
-                "filled_avg_price": float(order.filled_avg_price) if order.filled_avg_price else 0
-            }
+            with upstream_timer("alpaca", "submit_order"):
+                order = self.trading_client.submit_order(market_order)
+            return self._order_to_dict(order)
         except Exception as e:
             logger.error(f"Error placing market order: {str(e)}")
             raise
 
+    @staticmethod
+    def _order_to_dict(order) -> Dict:
+        return {
+            "order_id": order.id,
+            "client_order_id": order.client_order_id,
+            "symbol": order.symbol,
+            "qty": float(order.qty),
+            "side": order.side.value,
+            "status": order.status.value,
+            "created_at": order.created_at.isoformat(),
+            "filled_at": order.filled_at.isoformat() if order.filled_at else None,
+            "filled_qty": float(order.filled_qty) if order.filled_qty else 0,
+            "filled_avg_price": float(order.filled_avg_price) if order.filled_avg_price else 0
+        }
+
+    def _submit_leg(self, leg: BasketLeg) -> Dict:
+        market_order = MarketOrderRequest(
+            symbol=leg.symbol,
+            qty=leg.quantity,
+            side=OrderSide.BUY if leg.side.upper() == "BUY" else OrderSide.SELL,
+            time_in_force=TimeInForce.DAY,
+            client_order_id=leg.client_order_id
+        )
+        with upstream_timer("alpaca", "submit_order"):
+            return self._order_to_dict(self.trading_client.submit_order(market_order))
+
+    def _order_by_client_id(self, client_order_id: str) -> Dict:
+        with upstream_timer("alpaca", "get_order_by_client_id"):
+            return self._order_to_dict(self.trading_client.get_order_by_client_id(client_order_id))
+
+    async def place_basket_order(self, legs: List[BasketLeg], basket_id: Optional[str] = None) -> Dict:
+        """Place market orders for a basket concurrently under the account's rate budget"""
+        return await dispatch_basket(legs, self._submit_leg, self._order_by_client_id,
+                                     self.order_budget, basket_id)
+
     async def get_order_history(self, status: str = "all") -> List[Dict]:
         """Get order history with optional status filter"""
         try:
             request = GetOrdersRequest(status=status)
-            orders = self.trading_client.get_orders(request)
+            with upstream_timer("alpaca", "get_orders"):
+                orders = self.trading_client.get_orders(request)
             return [{
                 "order_id": order.id,
                 "symbol": order.symbol,
@@ -123,11 +160,12 @@ class AlpacaService:
             end = datetime.now()
             start = end - period
             
-            history = self.trading_client.get_portfolio_history(
-                start=start,
-                end=end,
-                timeframe=TimeFrame.Hour if timeframe == "1D" else TimeFrame.Day
-            )
+            with upstream_timer("alpaca", "get_portfolio_history"):
+                history = self.trading_client.get_portfolio_history(
+                    start=start,
+                    end=end,
+                    timeframe=TimeFrame.Hour if timeframe == "1D" else TimeFrame.Day
+                )
             
             return {
                 "timestamp": history.timestamp,
@@ -0,0 +1,153 @@
+from fastapi import HTTPException, Depends, WebSocket
+from fastapi.security import OAuth2PasswordBearer
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models import User
+from models.database_models import User as UserModel
+from database import AsyncSessionLocal
+from datetime import datetime, timedelta
+import hashlib
+import jwt
+from typing import Optional
+import logging
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Authentication
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
+ALGORITHM = "HS256"
+# Verified tokens kept until they expire, and how long a users-table lookup is reused
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_SECONDS = float(os.getenv("AUTH_USER_CACHE_SECONDS", "60"))
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+class TokenCache:
+    """Usernames of verified tokens, keyed by token digest and dropped at the token's exp
+
+    Only tokens that passed signature verification are stored, so a hit is as
+    good as decoding again until the token expires.
+    """
+    def __init__(self, max_size: int = AUTH_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, tuple[str, float]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[str]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        username, expires = entry
+        if time.time() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return username
+
+    def put(self, token: str, username: str, expires: float) -> None:
+        key = self._key(token)
+        self._entries[key] = (username, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+class UserCache:
+    """users-table rows by username for a short TTL; misses are cached too"""
+    def __init__(self, max_size: int = AUTH_USER_CACHE_SIZE, ttl: float = AUTH_USER_CACHE_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[Optional[User], float]]" = OrderedDict()
+
+    async def _load(self, username: str) -> Optional[User]:
+        async with AsyncSessionLocal() as db:
+            row = await db.scalar(select(UserModel).where(UserModel.username == username))
+        if row is None:
+            return None
+        return User(username=row.username, email=row.email or "", hashed_password=row.hashed_password or "")
+
+    async def get(self, username: str) -> Optional[User]:
+        entry = self._entries.get(username)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        user = await self._load(username)
+        self._entries[username] = (user, time.monotonic() + self.ttl)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, username: str) -> None:
+        self._entries.pop(username, None)
+
+token_cache = TokenCache()
+user_cache = UserCache()
+
+async def ensure_user(username: str) -> None:
+    """Create the users row for a username signing in for the first time"""
+    async with AsyncSessionLocal() as db:
+        exists = await db.scalar(select(UserModel.id).where(UserModel.username == username))
+        if exists is None:
+            db.add(UserModel(username=username, email=f"{username}@example.com", hashed_password=""))
+            try:
+                await db.commit()
+            except IntegrityError:
+                # A concurrent first login inserted the row first
+                await db.rollback()
+    user_cache.invalidate(username)
+
+def _verify(token: str) -> str:
+    """Username of a validly signed, unexpired token; cached until its exp"""
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]})
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    username = payload["sub"]
+    token_cache.put(token, username, float(payload["exp"]))
+    return username
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    username = _verify(token)
+    try:
+        user = await user_cache.get(username)
+    except Exception as e:
+        logger.error(f"Error looking up user {username}: {str(e)}")
+        raise HTTPException(status_code=503, detail="User lookup unavailable")
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    return user
+
+async def get_websocket_user(websocket: WebSocket) -> Optional[User]:
+    """User for a websocket's ?token= (browsers cannot set headers on websockets); None if invalid"""
+    token = websocket.query_params.get("token")
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
@@ -0,0 +1,261 @@
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+import os
+import socket
+import zlib
+
+logger = logging.getLogger(__name__)
+
+BACKPLANE = os.getenv("BACKPLANE", "local")  # local (one worker) or unix (workers on one host)
+BACKPLANE_SOCKET = os.getenv("BACKPLANE_SOCKET", "/tmp/alpacatraders-backplane.sock")
+BACKPLANE_RECONNECT_SECONDS = float(os.getenv("BACKPLANE_RECONNECT_SECONDS", "0.5"))
+# A subscriber this far behind is disconnected rather than buffered without bound
+BACKPLANE_MAX_BUFFER = int(os.getenv("BACKPLANE_MAX_BUFFER", str(8 * 1024 * 1024)))
+
+Handler = Callable[[Dict], Awaitable[None]]
+MembersHandler = Callable[[List[str]], Awaitable[None]]
+
+def owner_of(key: str, members: List[str]) -> Optional[str]:
+    """Worker responsible for `key`; stable for a given membership"""
+    if not members:
+        return None
+    ordered = sorted(members)
+    return ordered[zlib.crc32(key.encode()) % len(ordered)]
+
+class LocalBackplane:
+    """In-process pub/sub for a single worker
+
+    Same interface as UnixBackplane, so code written against the backplane
+    runs unchanged with one worker or many.
+    """
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.members: List[str] = [self.worker_id]
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._members_handlers: List[MembersHandler] = []
+
+    async def start(self) -> None:
+        await self._members_changed(self.members)
+
+    async def stop(self) -> None:
+        pass
+
+    def owns(self, key: str) -> bool:
+        return owner_of(key, self.members) == self.worker_id
+
+    def on_members(self, handler: MembersHandler) -> None:
+        self._members_handlers.append(handler)
+
+    async def _members_changed(self, members: List[str]) -> None:
+        self.members = sorted(members)
+        for handler in list(self._members_handlers):
+            try:
+                await handler(self.members)
+            except Exception as e:
+                logger.error(f"Error in backplane membership handler: {str(e)}")
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers[channel].append(handler)
+
+    async def unsubscribe(self, channel: str, handler: Handler) -> None:
+        handlers = self._handlers.get(channel)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._handlers.pop(channel, None)
+
+    async def publish(self, channel: str, data: Dict) -> None:
+        await self._deliver(channel, data)
+
+    async def _deliver(self, channel: str, data: Dict) -> None:
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                await handler(data)
+            except Exception as e:
+                logger.error(f"Error handling backplane message on {channel}: {str(e)}")
+
+class BackplaneBroker:
+    """Routes newline-delimited JSON frames between workers over a Unix socket
+
+    Clients send {"op": "hello" | "sub" | "unsub" | "pub", ...}; the broker
+    forwards each published message to the connections subscribed to its
+    channel and announces the list of connected workers on every change.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._workers: Dict[asyncio.StreamWriter, Optional[str]] = {}
+        self._channels: Dict[str, Set[asyncio.StreamWriter]] = defaultdict(set)
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            # Left behind by a broker that died; we hold the lock, so it is stale
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._workers):
+                writer.close()
+            await self._server.wait_closed()
+
+    def _send(self, writer: asyncio.StreamWriter, frame: bytes) -> None:
+        if writer.transport.get_write_buffer_size() > BACKPLANE_MAX_BUFFER:
+            logger.error(f"Backplane subscriber {self._workers.get(writer)} too slow; disconnecting")
+            writer.close()
+            return
+        writer.write(frame)
+
+    def _announce(self) -> None:
+        workers = sorted(w for w in self._workers.values() if w)
+        frame = json.dumps({'op': 'members', 'workers': workers}).encode() + b"\n"
+        for writer in list(self._workers):
+            self._send(writer, frame)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._workers[writer] = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                op = frame.get('op')
+                if op == 'pub':
+                    message = json.dumps({
+                        'op': 'msg', 'channel': frame['channel'], 'data': frame['data']
+                    }).encode() + b"\n"
+                    for subscriber in list(self._channels.get(frame['channel'], ())):
+                        self._send(subscriber, message)
+                elif op == 'sub':
+                    self._channels[frame['channel']].add(writer)
+                elif op == 'unsub':
+                    self._unsubscribe(writer, frame['channel'])
+                elif op == 'hello':
+                    self._workers[writer] = frame['worker']
+                    self._announce()
+        except (ConnectionError, json.JSONDecodeError, KeyError) as e:
+            logger.error(f"Backplane connection from {self._workers.get(writer)} dropped: {str(e)}")
+        finally:
+            for channel in list(self._channels):
+                self._unsubscribe(writer, channel)
+            self._workers.pop(writer, None)
+            writer.close()
+            self._announce()
+
+    def _unsubscribe(self, writer: asyncio.StreamWriter, channel: str) -> None:
+        subscribers = self._channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self._channels[channel]
+
+class UnixBackplane(LocalBackplane):
+    """Pub/sub between the uvicorn workers of one host through a Unix socket broker
+
+    Whichever worker holds the lock file runs the broker; if it exits, another
+    worker takes the lock on its next reconnect. While the broker is unreachable
+    the worker acts alone: it owns every key and publishes only to itself.
+    """
+    def __init__(self, path: str = BACKPLANE_SOCKET, worker_id: Optional[str] = None):
+        super().__init__(worker_id)
+        self.path = path
+        self.broker: Optional[BackplaneBroker] = None
+        self._lock_file = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.error(f"Backplane broker at {self.path} not reachable yet; retrying in the background")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        if self.broker is not None:
+            await self.broker.stop()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+    def _try_become_broker(self) -> bool:
+        import fcntl
+        if self._lock_file is None:
+            self._lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.broker is None and self._try_become_broker():
+                    self.broker = BackplaneBroker(self.path)
+                    await self.broker.start()
+                    logger.info(f"Backplane broker running at {self.path}")
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._write({'op': 'hello', 'worker': self.worker_id})
+                for channel in self._handlers:
+                    self._write({'op': 'sub', 'channel': channel})
+                self._connected.set()
+                await self._read(reader)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Backplane connection error: {str(e)}")
+            self._connected.clear()
+            self._writer = None
+            await self._members_changed([self.worker_id])
+            await asyncio.sleep(BACKPLANE_RECONNECT_SECONDS)
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            frame = json.loads(line)
+            if frame['op'] == 'msg':
+                await self._deliver(frame['channel'], frame['data'])
+            elif frame['op'] == 'members':
+                await self._members_changed(frame['workers'])
+
+    def _write(self, frame: Dict) -> None:
+        if self._writer is None:
+            logger.warning(f"Backplane disconnected; dropping {frame.get('op')} {frame.get('channel', '')}")
+            return
+        self._writer.write(json.dumps(frame).encode() + b"\n")
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        first = channel not in self._handlers
+        await super().subscribe(channel, handler)
+        if first and self._writer is not None:
+            self._write({'op': 'sub', 'channel': channel})
+
+    async def unsubscribe(self, channel: str, handler: Handler) -> None:
+        await super().unsubscribe(channel, handler)
+        if channel not in self._handlers and self._writer is not None:
+            self._write({'op': 'unsub', 'channel': channel})
+
+    async def publish(self, channel: str, data: Dict) -> None:
+        if self._writer is None:
+            # Cut off from the other workers: behave like a single worker
+            await self._deliver(channel, data)
+            return
+        # The broker echoes the message back if this worker subscribes too
+        self._write({'op': 'pub', 'channel': channel, 'data': data})
+
+def create_backplane():
+    if BACKPLANE == 'unix':
+        return UnixBackplane()
+    return LocalBackplane()
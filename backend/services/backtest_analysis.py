@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import product
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+import multiprocessing
+import os
+from services.performance_metrics import trade_metrics, trade_metrics_batch
+
+# 0 sizes analysis pools from the cores the backtest job pool leaves spare
+ANALYSIS_WORKERS = int(os.getenv("BACKTEST_ANALYSIS_WORKERS") or 0)
+# Resampled trades (paths x trades) generated per Monte Carlo chunk, to bound its memory
+MONTE_CARLO_CHUNK_ELEMENTS = int(os.getenv("MONTE_CARLO_CHUNK_ELEMENTS", "2000000"))
+
+OPTIMIZABLE_PARAMS = {'lookback', 'position_size'}
+OBJECTIVES = ('sharpe_ratio', 'sortino_ratio', 'calmar_ratio', 'total_profit', 'profit_factor', 'win_rate')
+RESAMPLING_METHODS = ('bootstrap', 'shuffle')
+
+def analysis_workers() -> int:
+    """Workers for an analysis running inside a backtest job
+
+    The job's own process waits on them, so its core counts as spare along with
+    those the other BACKTEST_WORKERS do not use.
+    """
+    if ANALYSIS_WORKERS > 0:
+        return ANALYSIS_WORKERS
+    from services.backtest_jobs import BACKTEST_WORKERS
+    return max(1, (os.cpu_count() or 2) - BACKTEST_WORKERS + 1)
+
+def expand_grid(param_grid: Dict[str, List]) -> List[Dict]:
+    """Every combination of the grid's values, as parameter dicts"""
+    unknown = set(param_grid) - OPTIMIZABLE_PARAMS
+    if unknown:
+        raise ValueError(f"Unsupported parameters: {', '.join(sorted(unknown))}")
+    if not param_grid:
+        return [{}]
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in product(*(param_grid[name] for name in names))]
+
+class SharedArrays:
+    """Copies arrays into shared memory once so pool workers can map them read-only"""
+    def __init__(self, **arrays: np.ndarray):
+        self._blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+
+# Per-worker state set up by _attach_shared
+_worker: Dict = {}
+
+def _attach_shared(spec: Dict) -> None:
+    """Pool initializer: map the parent's price arrays without copying them"""
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        _worker[name] = array
+        _worker.setdefault('blocks', []).append(block)
+    _worker['times'] = pd.DatetimeIndex(_worker['times_ns'])
+    _worker['signals'] = {}
+
+def _detach_shared() -> None:
+    for block in _worker.get('blocks', ()):
+        block.close()
+    _worker.clear()
+
+def _evaluate(config: Dict, params: Dict, lo: int, hi: int) -> Tuple[Dict, List[float]]:
+    """Backtest bars [lo, hi) with one parameter set; returns (metrics, closed-trade profits)"""
+    from services.backtester import Backtester
+
+    strategy_params = {k: v for k, v in params.items() if k != 'position_size'}
+    backtester = Backtester(
+        strategy_script=config['strategy_script'],
+        symbol=config['symbol'],
+        timeframe=config['timeframe'],
+        initial_capital=config['initial_capital'],
+        position_size=params.get('position_size', config['position_size']),
+        strategy_params=strategy_params
+    )
+    # Signals depend only on the strategy parameters, so compute them once per worker over all bars
+    key = tuple(sorted(strategy_params.items()))
+    if key not in _worker['signals']:
+        _worker['signals'][key] = backtester.generate_signals(_worker['closes'])
+    buy, sell = _worker['signals'][key]
+    result = backtester.simulate(_worker['closes'][lo:hi], _worker['times'][lo:hi], buy[lo:hi], sell[lo:hi])
+    return result.metrics, [t['profit'] for t in result.trades if 'profit' in t]
+
+def _score(metrics: Dict, objective: str) -> float:
+    value = metrics.get(objective)
+    if value is None or not np.isfinite(value):
+        return -np.inf
+    return float(value)
+
+def walk_forward(config: Dict, closes: np.ndarray, times_ns: np.ndarray, param_grid: Dict[str, List],
+                 in_sample_bars: int, out_of_sample_bars: int, step_bars: Optional[int] = None,
+                 objective: str = 'sharpe_ratio', max_workers: Optional[int] = None,
+                 progress_callback: Optional[Callable[[int, int, int], None]] = None) -> Dict:
+    """Rolling walk-forward optimization over one symbol's bars
+
+    Each window optimizes `objective` over the parameter grid on its in-sample bars and
+    then tests the winning parameters on the following out-of-sample bars. `config`
+    holds the Backtester arguments (strategy_script, symbol, timeframe, initial_capital,
+    position_size). Evaluations run in a process pool of `max_workers` (default
+    analysis_workers()) that maps the price data from shared memory, or in this
+    process when only one worker is available.
+    """
+    from services.backtester import Backtester
+
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unsupported objective: {objective}")
+    grid = expand_grid(param_grid)
+    step = step_bars or out_of_sample_bars
+    windows = []
+    start = 0
+    while start + in_sample_bars + out_of_sample_bars <= len(closes):
+        windows.append((start, start + in_sample_bars, start + in_sample_bars + out_of_sample_bars))
+        start += step
+    if not windows:
+        raise ValueError("Not enough bars for one in-sample and out-of-sample window")
+
+    total = len(windows) * (len(grid) + 1)
+    done = 0
+    oos_trades = 0
+    max_workers = max_workers or analysis_workers()
+    with SharedArrays(closes=closes.astype(np.float64), times_ns=times_ns.astype(np.int64)) as shared:
+        if max_workers > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_attach_shared, initargs=(shared.spec,)
+            )
+        else:
+            # No spare core to spawn onto: evaluate on one thread of this process
+            pool = ThreadPoolExecutor(max_workers=1, initializer=_attach_shared, initargs=(shared.spec,))
+        try:
+            futures = {
+                pool.submit(_evaluate, config, params, lo, mid): (w, g)
+                for w, (lo, mid, _) in enumerate(windows)
+                for g, params in enumerate(grid)
+            }
+            scores = np.full((len(windows), len(grid)), -np.inf)
+            in_sample = {}
+            for future in as_completed(futures):
+                w, g = futures[future]
+                metrics, _ = future.result()
+                in_sample[w, g] = metrics
+                scores[w, g] = _score(metrics, objective)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, oos_trades)
+            best = scores.argmax(axis=1)
+            out_of_sample = [
+                pool.submit(_evaluate, config, grid[best[w]], mid, hi)
+                for w, (_, mid, hi) in enumerate(windows)
+            ]
+            results = []
+            for future in out_of_sample:
+                results.append(future.result())
+                oos_trades += len(results[-1][1])
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, oos_trades)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if max_workers <= 1:
+                _detach_shared()
+
+    def at(index: int) -> str:
+        return pd.Timestamp(int(times_ns[min(index, len(times_ns) - 1)])).isoformat()
+
+    report = []
+    profits = []
+    is_rates = []
+    oos_rates = []
+    for w, (lo, mid, hi) in enumerate(windows):
+        is_metrics = in_sample[w, best[w]]
+        oos_metrics, oos_profits = results[w]
+        profits.extend(oos_profits)
+        is_rates.append(is_metrics.get('total_profit', 0) / (mid - lo))
+        oos_rates.append(oos_metrics.get('total_profit', 0) / (hi - mid))
+        report.append({
+            'in_sample': {'start': at(lo), 'end': at(mid - 1), 'bars': mid - lo},
+            'out_of_sample': {'start': at(mid), 'end': at(hi - 1), 'bars': hi - mid},
+            'best_params': grid[best[w]],
+            'in_sample_metrics': is_metrics,
+            'out_of_sample_metrics': oos_metrics,
+        })
+    summary = Backtester(config['strategy_script'], config['symbol'], config['timeframe'],
+                         config['initial_capital'], config['position_size'])
+    mean_is = float(np.mean(is_rates))
+    return {
+        'objective': objective,
+        'windows': report,
+        'out_of_sample_metrics': summary.calculate_metrics([{'profit': p} for p in profits]),
+        # Out-of-sample profit per bar relative to in-sample; well below 1 suggests overfitting
+        'efficiency': float(np.mean(oos_rates)) / mean_is if mean_is > 0 else None,
+    }
+
+def _resample(profits: np.ndarray, initial_capital: float, paths: int, method: str,
+              seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    if method == 'bootstrap':
+        sample = profits[rng.integers(0, len(profits), size=(paths, len(profits)))]
+    else:
+        sample = rng.permuted(np.broadcast_to(profits, (paths, len(profits))), axis=1)
+    metrics = trade_metrics_batch(sample, initial_capital)
+    # Every path has the same number of trades
+    metrics.pop('total_trades')
+    return metrics
+
+def monte_carlo(profits: List[float], initial_capital: float, paths: int = 10000,
+                method: str = 'bootstrap', confidence: float = 0.95, seed: Optional[int] = None,
+                max_workers: Optional[int] = None) -> Dict:
+    """Confidence intervals for trade metrics by resampling closed-trade profits
+
+    'bootstrap' draws trades with replacement; 'shuffle' permutes their order, which
+    only changes path-dependent metrics such as max_drawdown. Paths are generated in
+    chunks of at most MONTE_CARLO_CHUNK_ELEMENTS resampled trades on a thread pool;
+    the NumPy kernels release the GIL.
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f"Unsupported resampling method: {method}")
+    profits = np.ascontiguousarray(profits, dtype=np.float64)
+    if not len(profits):
+        raise ValueError("No closed trades to resample")
+    chunk = max(1, MONTE_CARLO_CHUNK_ELEMENTS // len(profits))
+    sizes = [min(chunk, paths - start) for start in range(0, paths, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    with ThreadPoolExecutor(max_workers=max_workers or analysis_workers()) as pool:
+        chunks = list(pool.map(
+            lambda args: _resample(profits, initial_capital, args[0], method, args[1]), zip(sizes, seeds)
+        ))
+    observed = trade_metrics(profits, initial_capital)
+    observed.pop('total_trades')
+    alpha = (1 - confidence) / 2
+    metrics = {}
+    for name in observed:
+        values = np.concatenate([chunk[name] for chunk in chunks])
+        finite = values[np.isfinite(values)]
+        lower, median, upper = np.quantile(finite, [alpha, 0.5, 1 - alpha]) if len(finite) else (np.nan,) * 3
+        metrics[name] = {
+            'observed': observed[name],
+            'mean': float(finite.mean()) if len(finite) else None,
+            'median': float(median),
+            'lower': float(lower),
+            'upper': float(upper),
+        }
+    totals = np.concatenate([chunk['total_profit'] for chunk in chunks])
+    return {
+        'method': method,
+        'paths': paths,
+        'trades': len(profits),
+        'confidence': confidence,
+        'probability_of_loss': float((totals < 0).mean()),
+        'metrics': metrics,
+    }
@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, select
+from database import AsyncSessionLocal
+from models.database_models import BacktestCacheEntry
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change to services/backtester.py alters results for the same inputs
+ENGINE_VERSION = "3"
+
+BACKTEST_CACHE_SIZE = int(os.getenv("BACKTEST_CACHE_SIZE", "256"))
+BACKTEST_CACHE_MAX_ROWS = int(os.getenv("BACKTEST_CACHE_MAX_ROWS", "5000"))
+# Ranges that run up to "now" keep changing as new bars arrive
+BACKTEST_CACHE_OPEN_TTL = int(os.getenv("BACKTEST_CACHE_OPEN_TTL", "300"))
+
+def script_hash(strategy_script: str) -> str:
+    return hashlib.sha256(strategy_script.encode()).hexdigest()
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def cache_key(params: Dict) -> Tuple[str, Optional[datetime]]:
+    """Cache key for a backtest job's params, and when the entry expires (None for never)"""
+    start_date = _parse_date(params.get('start_date'))
+    end_date = _parse_date(params.get('end_date'))
+    now = datetime.utcnow()
+    expires_at = None
+    if end_date is None or end_date > now:
+        expires_at = now + timedelta(seconds=BACKTEST_CACHE_OPEN_TTL)
+    # Everything that affects the result except the raw script, dates normalized
+    parts = {k: v for k, v in params.items() if k not in ('strategy_id', 'strategy_script')}
+    parts.update({
+        'script': script_hash(params['strategy_script']),
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+        'initial_capital': float(params['initial_capital']),
+        'position_size': float(params['position_size']),
+        'engine_version': ENGINE_VERSION,
+    })
+    key = hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+    return key, expires_at
+
+class BacktestResultCache:
+    """LRU of backtest results in memory, persisted to the backtest_cache table"""
+
+    def __init__(self, max_entries: int = BACKTEST_CACHE_SIZE, max_rows: int = BACKTEST_CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, result: Dict, expires_at: Optional[datetime]) -> None:
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, params: Dict) -> Optional[Dict]:
+        key, _ = cache_key(params)
+        now = datetime.utcnow()
+        entry = self._entries.get(key)
+        if entry is not None:
+            result, expires_at = entry
+            if expires_at is None or expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+        try:
+            async with AsyncSessionLocal() as db:
+                record = await db.get(BacktestCacheEntry, key)
+                if record is None or (record.expires_at is not None and record.expires_at <= now):
+                    self.misses += 1
+                    return None
+                record.last_used_at = now
+                await db.commit()
+                result = json.loads(record.result)
+                self._remember(key, result, record.expires_at)
+        except Exception as e:
+            logger.error(f"Error reading backtest cache: {str(e)}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    async def put(self, params: Dict, result: Dict) -> None:
+        key, expires_at = cache_key(params)
+        self._remember(key, result, expires_at)
+        now = datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(BacktestCacheEntry(
+                    key=key,
+                    result=json.dumps(result),
+                    created_at=now,
+                    last_used_at=now,
+                    expires_at=expires_at
+                ))
+                await db.commit()
+                await self._prune(db, now)
+        except Exception as e:
+            logger.error(f"Error writing backtest cache: {str(e)}")
+
+    async def _prune(self, db, now: datetime) -> None:
+        """Drop expired rows and the least recently used rows beyond max_rows"""
+        await db.execute(delete(BacktestCacheEntry).where(BacktestCacheEntry.expires_at <= now))
+        cutoff = await db.scalar(
+            select(BacktestCacheEntry.last_used_at)
+            .order_by(BacktestCacheEntry.last_used_at.desc())
+            .offset(self.max_rows)
+            .limit(1)
+        )
+        if cutoff is not None:
+            await db.execute(delete(BacktestCacheEntry).where(BacktestCacheEntry.last_used_at <= cutoff))
+        await db.commit()
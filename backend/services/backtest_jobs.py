@@ -0,0 +1,456 @@
+from concurrent.futures import ProcessPoolExecutor, Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+from sqlalchemy import select, update
+from database import AsyncSessionLocal
+from models.database_models import BacktestJob as BacktestJobModel
+from services.backtest_cache import BacktestResultCache
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+BACKTEST_PROGRESS_EVERY = int(os.getenv("BACKTEST_PROGRESS_EVERY", "10000"))
+# Jobs run on the worker that took them; others follow them through their rows at these intervals
+BACKTEST_PROGRESS_SAVE_SECONDS = float(os.getenv("BACKTEST_PROGRESS_SAVE_SECONDS", "1"))
+BACKTEST_POLL_SECONDS = float(os.getenv("BACKTEST_POLL_SECONDS", "1"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = {COMPLETED, FAILED, CANCELLED}
+
+class BacktestCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled"""
+
+def to_jsonable(value):
+    """Convert pandas/numpy values in backtest output into JSON-safe types"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+def run_backtest_job(job_id: str, params: Dict, progress_queue, cancel_flags, progress_every: int) -> Dict:
+    """Worker-process entry point: run one backtest and return its JSON-safe result"""
+    from services.backtester import Backtester
+    from services.execution import ExecutionModel
+
+    def report(bars_processed: int, total_bars: int, trades: int) -> None:
+        if cancel_flags.get(job_id):
+            raise BacktestCancelled(job_id)
+        progress_queue.put((job_id, bars_processed, total_bars, trades))
+
+    report(0, 0, 0)
+    if params.get('analysis') == 'walk_forward':
+        return run_walk_forward(params, report)
+    if params.get('symbols'):
+        from services.portfolio_backtester import PortfolioBacktester
+        backtester = PortfolioBacktester(
+            strategy_script=params['strategy_script'],
+            symbols=params['symbols'],
+            timeframe=params['timeframe'],
+            initial_capital=params['initial_capital'],
+            position_size=params['position_size'],
+            max_positions=params.get('max_positions'),
+            max_gross_exposure=params.get('max_gross_exposure', 1.0),
+            execution=ExecutionModel.from_dict(params.get('execution'))
+        )
+    else:
+        backtester = Backtester(
+            strategy_script=params['strategy_script'],
+            symbol=params['symbol'],
+            timeframe=params['timeframe'],
+            initial_capital=params['initial_capital'],
+            position_size=params['position_size'],
+            execution=ExecutionModel.from_dict(params.get('execution'))
+        )
+    result = asyncio.run(backtester.run_backtest(
+        start_date=_parse_date(params.get('start_date')),
+        end_date=_parse_date(params.get('end_date')),
+        progress_callback=report,
+        progress_every=progress_every
+    ))
+    return to_jsonable({
+        'trades': result.trades,
+        'metrics': result.metrics,
+        'equity_curve': result.equity_curve,
+        'drawdowns': result.drawdowns,
+        'symbol_metrics': result.symbol_metrics,
+    })
+
+def run_walk_forward(params: Dict, report: Callable[[int, int, int], None]) -> Dict:
+    """Fetch one symbol's bars and run walk-forward optimization over them"""
+    from services.backtester import Backtester
+    from services.backtest_analysis import walk_forward
+
+    config = {key: params[key] for key in
+              ('strategy_script', 'symbol', 'timeframe', 'initial_capital', 'position_size')}
+    backtester = Backtester(**config)
+    signals = asyncio.run(backtester.load_signals(
+        _parse_date(params.get('start_date')), _parse_date(params.get('end_date'))
+    ))
+    return to_jsonable(walk_forward(
+        config,
+        backtester.closes(signals.data),
+        signals.data.index.asi8,
+        param_grid=params['param_grid'],
+        in_sample_bars=params['in_sample_bars'],
+        out_of_sample_bars=params['out_of_sample_bars'],
+        step_bars=params.get('step_bars'),
+        objective=params['objective'],
+        progress_callback=report
+    ))
+
+@dataclass
+class BacktestJob:
+    id: str
+    user_id: str
+    params: Dict
+    status: str = QUEUED
+    bars_processed: int = 0
+    total_bars: int = 0
+    trades: int = 0
+    error: Optional[str] = None
+    cached: bool = False
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'strategy_id': self.params.get('strategy_id'),
+            'symbol': self.params.get('symbol'),
+            'symbols': self.params.get('symbols'),
+            'bars_processed': self.bars_processed,
+            'total_bars': self.total_bars,
+            'progress': round(self.bars_processed / self.total_bars, 4) if self.total_bars else 0.0,
+            'trades': self.trades,
+            'error': self.error,
+            'cached': self.cached,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    @classmethod
+    def from_record(cls, record: BacktestJobModel) -> 'BacktestJob':
+        return cls(
+            id=record.id,
+            user_id=record.user_id,
+            params=json.loads(record.params),
+            status=record.status,
+            bars_processed=record.bars_processed or 0,
+            total_bars=record.total_bars or 0,
+            trades=record.trades or 0,
+            error=record.error,
+            cached=bool(record.cached),
+            created_at=record.created_at,
+            started_at=record.started_at,
+            finished_at=record.finished_at
+        )
+
+class BacktestJobManager:
+    """Runs backtests in a process pool, tracks progress and persists results
+
+    A job runs on the worker that took it. Its row carries progress (saved every
+    BACKTEST_PROGRESS_SAVE_SECONDS) and cancel requests, so the other workers can
+    report on it, stream it and cancel it.
+    """
+
+    def __init__(self, max_workers: int = BACKTEST_WORKERS, progress_every: int = BACKTEST_PROGRESS_EVERY,
+                 cache: Optional[BacktestResultCache] = None):
+        self.max_workers = max_workers
+        self.progress_every = progress_every
+        self.cache = cache or BacktestResultCache()
+        self.jobs: Dict[str, BacktestJob] = {}
+        self.futures: Dict[str, Future] = {}
+        self.watchers: Dict[str, asyncio.Task] = {}
+        self.subscribers: Dict[str, Set] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._saved_at: Dict[str, float] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._mp_manager = None
+        self._progress_queue = None
+        self._cancel_flags = None
+        self._pump_task: Optional[asyncio.Task] = None
+        self._cancel_task: Optional[asyncio.Task] = None
+
+    async def _ensure_started(self) -> None:
+        """Start the worker pool and progress pump on first use"""
+        if self._executor is not None:
+            return
+        context = multiprocessing.get_context('spawn')
+        # Starting the manager spawns a server process; keep that off the event loop
+        self._mp_manager = await asyncio.to_thread(context.Manager)
+        self._progress_queue = self._mp_manager.Queue()
+        self._cancel_flags = self._mp_manager.dict()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        self._pump_task = asyncio.create_task(self._pump_progress())
+        self._cancel_task = asyncio.create_task(self._poll_cancel_requests())
+
+    async def submit(self, user_id: str, params: Dict) -> BacktestJob:
+        """Queue a backtest; returns immediately with the job's initial state"""
+        cached = await self.cache.get(params)
+        if cached is not None:
+            # Identical request already computed: record a finished job without running anything
+            now = datetime.utcnow()
+            job = BacktestJob(id=str(uuid.uuid4()), user_id=user_id, params=params, status=COMPLETED,
+                              cached=True, created_at=now, finished_at=now)
+            await self._save(job, cached)
+            return job
+        await self._ensure_started()
+        job = BacktestJob(id=str(uuid.uuid4()), user_id=user_id, params=params)
+        self.jobs[job.id] = job
+        await self._save(job)
+        future = self._executor.submit(
+            run_backtest_job, job.id, params, self._progress_queue, self._cancel_flags, self.progress_every
+        )
+        self.futures[job.id] = future
+        self.watchers[job.id] = asyncio.create_task(self._watch(job, future))
+        return job
+
+    async def _watch(self, job: BacktestJob, future: Future) -> None:
+        result = None
+        try:
+            result = await asyncio.wrap_future(future)
+            job.status = COMPLETED
+            job.bars_processed = job.total_bars
+        except BacktestCancelled:
+            job.status = CANCELLED
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            job.status = CANCELLED
+        except Exception as e:
+            logger.error(f"Backtest job {job.id} failed: {str(e)}")
+            job.status = FAILED
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        self.futures.pop(job.id, None)
+        self._cancel_flags.pop(job.id, None)
+        self._saved_at.pop(job.id, None)
+        await self._save(job, result)
+        if result is not None:
+            await self.cache.put(job.params, result)
+        await self._publish(job)
+        # Finished jobs are served from the database from here on
+        self.jobs.pop(job.id, None)
+        self.watchers.pop(job.id, None)
+
+    async def _pump_progress(self) -> None:
+        """Move progress messages from worker processes onto jobs and subscribers"""
+        while True:
+            try:
+                job_id, bars_processed, total_bars, trades = await asyncio.to_thread(
+                    self._progress_queue.get, True, 0.5
+                )
+            except queue.Empty:
+                continue
+            except Exception as e:
+                logger.error(f"Error reading backtest progress: {str(e)}")
+                await asyncio.sleep(0.5)
+                continue
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                continue
+            started = job.status == QUEUED
+            if started:
+                job.status = RUNNING
+                job.started_at = datetime.utcnow()
+            job.bars_processed = bars_processed
+            job.total_bars = total_bars
+            job.trades = trades
+            now = time.monotonic()
+            if started or now - self._saved_at.get(job_id, 0.0) >= BACKTEST_PROGRESS_SAVE_SECONDS:
+                self._saved_at[job_id] = now
+                await self._save(job)
+            await self._publish(job)
+
+    async def _poll_cancel_requests(self) -> None:
+        """Cancel this worker's jobs whose rows another worker marked for cancellation"""
+        while True:
+            await asyncio.sleep(BACKTEST_POLL_SECONDS)
+            if not self.jobs:
+                continue
+            try:
+                async with AsyncSessionLocal() as db:
+                    requested = (await db.scalars(
+                        select(BacktestJobModel.id)
+                        .where(BacktestJobModel.id.in_(list(self.jobs)), BacktestJobModel.cancel_requested.is_(True))
+                    )).all()
+            except Exception as e:
+                logger.error(f"Error reading backtest cancel requests: {str(e)}")
+                continue
+            for job_id in requested:
+                await self.cancel(job_id)
+
+    async def run_analysis(self, fn: Callable, *args, **kwargs):
+        """Run a picklable function on the job pool rather than in the API process"""
+        await self._ensure_started()
+        return await asyncio.wrap_future(self._executor.submit(fn, *args, **kwargs))
+
+    async def wait(self, job_id: str) -> BacktestJob:
+        """Wait for a job to finish and return its final state"""
+        watcher = self.watchers.get(job_id)
+        if watcher is not None:
+            await asyncio.shield(watcher)
+        return await self.get_job(job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it already finished"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return await self._request_cancel(job_id)
+        if job.status in FINISHED_STATUSES:
+            return False
+        future = self.futures.get(job_id)
+        if future is not None and future.cancel():
+            # Never started; the watcher records the finish
+            job.status = CANCELLED
+            return True
+        self._cancel_flags[job_id] = True
+        return True
+
+    async def _request_cancel(self, job_id: str) -> bool:
+        """Mark another worker's unfinished job for cancellation"""
+        async with AsyncSessionLocal() as db:
+            marked = await db.execute(
+                update(BacktestJobModel)
+                .where(BacktestJobModel.id == job_id, BacktestJobModel.status.not_in(FINISHED_STATUSES))
+                .values(cancel_requested=True)
+            )
+            await db.commit()
+        return marked.rowcount > 0
+
+    async def get_job(self, job_id: str) -> Optional[BacktestJob]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        async with AsyncSessionLocal() as db:
+            record = await db.get(BacktestJobModel, job_id)
+        return BacktestJob.from_record(record) if record else None
+
+    async def get_result(self, job_id: str) -> Optional[Dict]:
+        """Load a finished job's stored result"""
+        async with AsyncSessionLocal() as db:
+            result = await db.scalar(select(BacktestJobModel.result).where(BacktestJobModel.id == job_id))
+        return json.loads(result) if result else None
+
+    async def list_jobs(self, user_id: str, limit: int = 50) -> List[BacktestJob]:
+        async with AsyncSessionLocal() as db:
+            records = (await db.scalars(
+                select(BacktestJobModel)
+                .where(BacktestJobModel.user_id == user_id)
+                .order_by(BacktestJobModel.created_at.desc())
+                .limit(limit)
+            )).all()
+        return [self.jobs.get(record.id) or BacktestJob.from_record(record) for record in records]
+
+    async def _save(self, job: BacktestJob, result: Optional[Dict] = None) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(BacktestJobModel(
+                    id=job.id,
+                    user_id=job.user_id,
+                    status=job.status,
+                    params=json.dumps(job.params),
+                    result=json.dumps(result) if result is not None else None,
+                    error=job.error,
+                    cached=job.cached,
+                    bars_processed=job.bars_processed,
+                    total_bars=job.total_bars,
+                    trades=job.trades,
+                    created_at=job.created_at,
+                    started_at=job.started_at,
+                    finished_at=job.finished_at
+                ))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error saving backtest job {job.id}: {str(e)}")
+
+    async def subscribe(self, job_id: str, websocket) -> None:
+        self.subscribers.setdefault(job_id, set()).add(websocket)
+        if job_id not in self.jobs and job_id not in self._pollers:
+            # Run elsewhere (or already finished): follow its row instead
+            self._pollers[job_id] = asyncio.create_task(self._poll_job(job_id))
+
+    async def unsubscribe(self, job_id: str, websocket) -> None:
+        sockets = self.subscribers.get(job_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.subscribers[job_id]
+                poller = self._pollers.pop(job_id, None)
+                if poller is not None:
+                    poller.cancel()
+
+    async def _poll_job(self, job_id: str) -> None:
+        """Publish another worker's job whenever its saved state changes, until it finishes"""
+        last = None
+        try:
+            while job_id in self.subscribers:
+                job = await self.get_job(job_id)
+                if job is None:
+                    return
+                state = job.to_dict()
+                if last is not None and state != last:
+                    await self._publish(job)
+                if job.status in FINISHED_STATUSES:
+                    return
+                last = state
+                await asyncio.sleep(BACKTEST_POLL_SECONDS)
+        except Exception as e:
+            logger.error(f"Error following backtest job {job_id}: {str(e)}")
+        finally:
+            if self._pollers.get(job_id) is asyncio.current_task():
+                del self._pollers[job_id]
+
+    async def _publish(self, job: BacktestJob) -> None:
+        sockets = self.subscribers.get(job.id)
+        if not sockets:
+            return
+        message = json.dumps({'type': 'backtest_progress', **job.to_dict()})
+        for websocket in list(sockets):
+            try:
+                await websocket.send_text(message)
+            except Exception:
+                await self.unsubscribe(job.id, websocket)
+
+    async def shutdown(self) -> None:
+        """Cancel outstanding jobs and stop the worker pool"""
+        for poller in list(self._pollers.values()):
+            poller.cancel()
+        if self._executor is None:
+            return
+        for job_id in list(self.futures):
+            await self.cancel(job_id)
+        # Workers still need the manager to see their cancel flags, so stop them first
+        await asyncio.to_thread(self._executor.shutdown, True, cancel_futures=True)
+        await asyncio.gather(*self.watchers.values(), return_exceptions=True)
+        self._pump_task.cancel()
+        self._cancel_task.cancel()
+        self._mp_manager.shutdown()
+        self._executor = None
@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional
+import numpy as np
+import json
+
+PAYLOAD_FORMATS = ('json', 'msgpack', 'arrow')
+MEDIA_TYPES = {
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+def lttb(values: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of `threshold` points chosen by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept; each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and the
+    next bucket's average, which preserves peaks and troughs of the curve.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.asarray(values, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    # Average of every bucket up front; the last "next bucket" is the final point
+    sums = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_y = np.append(sums / counts, y[-1])
+    avg_x = np.append((edges[:-1] + edges[1:] - 1) / 2, n - 1)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs((x[a] - avg_x[b + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[b + 1] - y[a]))
+        a = lo + int(area.argmax())
+        selected[b + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+def columnar_trades(trades: List[Dict]) -> Dict[str, list]:
+    """Trades as parallel arrays keyed by field, None where a trade lacks the field"""
+    columns = list(dict.fromkeys(key for trade in trades for key in trade))
+    return {column: [trade.get(column) for trade in trades] for column in columns}
+
+def shape_result(result: Dict, points: Optional[int] = None, columnar: bool = False) -> Dict:
+    """Downsample a stored backtest result's curves and/or make its trades columnar
+
+    Curves are downsampled together on the equity curve's LTTB points and
+    `curve_index` holds each kept point's position in the full curve.
+    """
+    shaped = dict(result)
+    equity = result.get('equity_curve') or []
+    if points and len(equity) > points:
+        index = lttb(np.array([np.nan if v is None else v for v in equity], dtype=np.float64), points)
+        shaped['curve_index'] = index.tolist()
+        shaped['equity_curve'] = [equity[i] for i in index]
+        drawdowns = result.get('drawdowns') or []
+        if len(drawdowns) == len(equity):
+            shaped['drawdowns'] = [drawdowns[i] for i in index]
+    if columnar and 'trades' in result:
+        shaped['trades'] = columnar_trades(result['trades'])
+    return shaped
+
+def encode_msgpack(payload: Dict) -> bytes:
+    import msgpack
+    return msgpack.packb(payload, use_bin_type=True)
+
+def encode_arrow(payload: Dict) -> bytes:
+    """Arrow IPC stream of the trades table; every other field travels as JSON schema metadata"""
+    import pyarrow as pa
+    trades = payload.get('trades') or []
+    columns = trades if isinstance(trades, dict) else columnar_trades(trades)
+    rest = {key: value for key, value in payload.items() if key != 'trades'}
+    table = pa.table(columns).replace_schema_metadata({'backtest': json.dumps(rest)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def encode_payload(payload: Dict, fmt: str) -> bytes:
+    if fmt == 'msgpack':
+        return encode_msgpack(payload)
+    if fmt == 'arrow':
+        return encode_arrow(payload)
+    raise ValueError(f"Unsupported payload format: {fmt}")
@@ -1,8 +1,104 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import yfinance as yf
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from services.metrics import upstream_timer
+from services.backtest_cache import script_hash
+from services.execution import ExecutionModel
+from services.performance_metrics import max_drawdown, sharpe_ratio, trade_metrics
+from services.bar_resampler import BarResampler, MINUTE_MS, HOUR_MS, DAY_MS
+from services.bar_store import BarStore, to_epoch_ms
+import asyncio
+import os
+
+SIGNAL_CACHE_SIZE = int(os.getenv("BACKTEST_SIGNAL_CACHE_SIZE", "32"))
+
+# Intervals fetched from yfinance as-is; any other timeframe (4h, 2d, 1wk, ...) is
+# resampled locally from the finest of these already held
+YFINANCE_BASES = [
+    ('1m', MINUTE_MS), ('5m', 5 * MINUTE_MS), ('15m', 15 * MINUTE_MS), ('1h', HOUR_MS), ('1d', DAY_MS)
+]
+OHLCV_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+def fetch_yfinance_bars(symbol: str, interval: str, start_ms: int, end_ms: int) -> Dict[str, np.ndarray]:
+    """OHLCV arrays for [start_ms, end_ms) at a native yfinance interval"""
+    ticker = yf.Ticker(symbol)
+    with upstream_timer("yfinance", "history"):
+        df = ticker.history(start=pd.Timestamp(start_ms, unit='ms', tz='UTC'),
+                            end=pd.Timestamp(end_ms, unit='ms', tz='UTC'), interval=interval)
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize(timezone.utc)
+    bars = {'ts': index.as_unit('ms').asi8}
+    for name, column in OHLCV_COLUMNS.items():
+        bars[name] = df[column].to_numpy(dtype=np.float64) if column in df else np.zeros(len(df))
+    return bars
+
+def bars_to_frame(bars: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """yfinance-style frame (Open, High, Low, Close, Volume) with a UTC index"""
+    index = pd.to_datetime(bars['ts'], unit='ms', utc=True)
+    return pd.DataFrame({column: bars[name] for name, column in OHLCV_COLUMNS.items()}, index=index)
+
+yfinance_bars = BarResampler(fetch_yfinance_bars, 'yfinance', YFINANCE_BASES, store=BarStore())
+
+def _naive(value: datetime) -> datetime:
+    """Drop timezone info (as UTC) so cached ranges compare consistently"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _next_true(mask: np.ndarray) -> np.ndarray:
+    """For each index i, the first index j >= i where mask is set (len(mask) if none)"""
+    n = len(mask)
+    indices = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(indices[::-1])[::-1]
+
+class SignalSet:
+    """Bars and signal arrays covering [start, end)"""
+    def __init__(self, data: pd.DataFrame, buy: np.ndarray, sell: np.ndarray,
+                 start: datetime, end: datetime):
+        self.data = data
+        self.buy = buy
+        self.sell = sell
+        self.start = start
+        self.end = end
+    
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        return start <= self.end and end >= self.start
+    
+    def _position(self, value: datetime) -> int:
+        bound = pd.Timestamp(value)
+        if self.data.index.tz is not None:
+            bound = bound.tz_localize('UTC').tz_convert(self.data.index.tz)
+        return int(self.data.index.searchsorted(bound))
+    
+    def slice(self, start: datetime, end: datetime) -> 'SignalSet':
+        if start <= self.start and end >= self.end:
+            return self
+        lo, hi = self._position(start), self._position(end)
+        return SignalSet(self.data.iloc[lo:hi], self.buy[lo:hi], self.sell[lo:hi], start, end)
+
+class SignalCache:
+    """Per-process LRU of SignalSets keyed by (script hash, symbol, timeframe)"""
+    def __init__(self, max_entries: int = SIGNAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+    
+    def get(self, key) -> Optional[SignalSet]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+    
+    def put(self, key, entry: SignalSet) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+signal_cache = SignalCache()
 
 class BacktestResult:
     def __init__(self):
@@ -10,11 +106,15 @@ class BacktestResult:
         self.metrics: Dict = {}
         self.equity_curve: List[float] = []
         self.drawdowns: List[float] = []
+        self.symbol_metrics: Dict[str, Dict] = {}
 
 class Backtester:
     def __init__(self, strategy_script: str, symbol: str, timeframe: str = "1d", 
-                 initial_capital: float = 10000.0, position_size: float = 0.1):
+                 initial_capital: float = 10000.0, position_size: float = 0.1,
+                 strategy_params: Optional[Dict] = None, execution: Optional[ExecutionModel] = None):
         self.strategy_script = strategy_script
+        self.execution = execution or ExecutionModel()
+        self.strategy_params = strategy_params or {}
         self.symbol = symbol
         self.timeframe = timeframe
         self.initial_capital = initial_capital
@@ -25,56 +125,79 @@ class Backtester:
         
     async def fetch_data(self, start_date: Optional[datetime] = None, 
                         end_date: Optional[datetime] = None) -> pd.DataFrame:
-        """Fetch historical data using yfinance"""
+        """Fetch historical data from yfinance, resampled locally for non-native timeframes"""
         if not start_date:
             start_date = datetime.now() - timedelta(days=365)
         if not end_date:
             end_date = datetime.now()
             
-        ticker = yf.Ticker(self.symbol)
-        df = ticker.history(start=start_date, end=end_date, interval=self.timeframe)
-        return df
+        bars = await asyncio.to_thread(yfinance_bars.get_bars, self.symbol, self.timeframe,
+                                       to_epoch_ms(start_date), to_epoch_ms(end_date))
+        return bars_to_frame(bars)
+    
+    async def load_signals(self, start_date: Optional[datetime] = None,
+                           end_date: Optional[datetime] = None):
+        """Bars and buy/sell signal arrays for the range, reusing cached overlapping ranges"""
+        end_date = _naive(end_date) if end_date else datetime.utcnow()
+        start_date = _naive(start_date) if start_date else end_date - timedelta(days=365)
+        key = (script_hash(self.strategy_script), tuple(sorted(self.strategy_params.items())),
+               self.symbol, self.timeframe)
+        cached = signal_cache.get(key)
+        if cached is None or not cached.overlaps(start_date, end_date):
+            data = await self.fetch_data(start_date, end_date)
+            cached = SignalSet(data, *self.generate_signals(self.closes(data)), start_date, end_date)
+        else:
+            # Only fetch the parts of the range the cache does not cover
+            parts = [cached.data]
+            if start_date < cached.start:
+                parts.insert(0, await self.fetch_data(start_date, cached.start))
+            if end_date > cached.end:
+                parts.append(await self.fetch_data(cached.end, end_date))
+            if len(parts) > 1:
+                data = pd.concat(parts)
+                data = data[~data.index.duplicated(keep='last')].sort_index()
+                cached = SignalSet(data, *self.generate_signals(self.closes(data)),
+                                   min(start_date, cached.start), max(end_date, cached.end))
+        signal_cache.put(key, cached)
+        return cached.slice(start_date, end_date)
+    
+    @staticmethod
+    def closes(data: pd.DataFrame) -> np.ndarray:
+        return data['Close'].to_numpy(dtype=np.float64)
+    
+    def generate_signals(self, close: np.ndarray):
+        """
+        Placeholder signal logic as (buy, sell) boolean arrays over the bars:
+        momentum against the close `lookback` bars earlier (strategy_params, default 1).
+        This should be replaced with actual strategy logic parsed from Pine Script.
+        """
+        lookback = max(1, int(self.strategy_params.get('lookback', 1)))
+        buy = np.zeros(len(close), dtype=bool)
+        sell = np.zeros(len(close), dtype=bool)
+        buy[lookback:] = close[lookback:] > close[:-lookback]
+        sell[lookback:] = close[lookback:] < close[:-lookback]
+        return buy, sell
     
-    def calculate_metrics(self, trades: List[Dict]) -> Dict:
-        """Calculate trading metrics"""
+    def calculate_metrics(self, trades: List[Dict], exposure: Optional[float] = None) -> Dict:
+        """Calculate trading metrics; `exposure` is the fraction of bars spent in a position"""
         if not trades:
             return {}
             
-        profits = [t['profit'] for t in trades]
-        win_trades = [p for p in profits if p > 0]
-        loss_trades = [p for p in profits if p < 0]
-        
-        metrics = {
-            'total_trades': len(trades),
-            'winning_trades': len(win_trades),
-            'losing_trades': len(loss_trades),
-            'win_rate': len(win_trades) / len(trades) if trades else 0,
-            'average_win': np.mean(win_trades) if win_trades else 0,
-            'average_loss': np.mean(loss_trades) if loss_trades else 0,
-            'profit_factor': abs(sum(win_trades) / sum(loss_trades)) if loss_trades else float('inf'),
-            'total_profit': sum(profits),
-            'max_drawdown': self.calculate_max_drawdown(trades),
-            'sharpe_ratio': self.calculate_sharpe_ratio(profits),
-        }
-        
+        # A trade still open at the end of the data has no profit yet
+        profits = [t['profit'] for t in trades if 'profit' in t]
+        metrics = trade_metrics(profits, self.initial_capital)
+        metrics['total_trades'] = len(trades)
+        if exposure is not None:
+            metrics['exposure'] = exposure
         return metrics
     
     def calculate_max_drawdown(self, trades: List[Dict]) -> float:
         """Calculate maximum drawdown"""
-        equity_curve = self.generate_equity_curve(trades)
-        rolling_max = pd.Series(equity_curve).expanding().max()
-        drawdowns = equity_curve - rolling_max
-        return abs(min(drawdowns)) if drawdowns.any() else 0
+        return float(max_drawdown(self.generate_equity_curve(trades).to_numpy())[0])
     
     def calculate_sharpe_ratio(self, profits: List[float], risk_free_rate: float = 0.02) -> float:
         """Calculate Sharpe Ratio"""
-        if not profits:
-            return 0
-        returns = pd.Series(profits)
-        excess_returns = returns - (risk_free_rate / 252)  # Daily risk-free rate
-        if excess_returns.std() == 0:
-            return 0
-        return np.sqrt(252) * excess_returns.mean() / excess_returns.std()
+        return float(sharpe_ratio(np.asarray(profits, dtype=np.float64), risk_free_rate))
     
     def generate_equity_curve(self, trades: List[Dict]) -> pd.Series:
         """Generate equity curve from trades"""
@@ -82,92 +205,136 @@ class Backtester:
         equity_curve = [equity]
         
         for trade in trades:
-            equity += trade['profit']
+            equity += trade.get('profit', 0.0)
             equity_curve.append(equity)
             
         return pd.Series(equity_curve)
     
     async def run_backtest(self, start_date: Optional[datetime] = None, 
-                          end_date: Optional[datetime] = None) -> BacktestResult:
-        """Run backtest and return results"""
+                          end_date: Optional[datetime] = None,
+                          progress_callback: Optional[Callable[[int, int, int], None]] = None,
+                          progress_every: int = 10000) -> BacktestResult:
+        """Run backtest and return results
+
+        progress_callback, if given, is called as (bars_processed, total_bars, trades)
+        every `progress_every` bars and once at the end; it may raise to abort the run.
+        """
+        # Fetch historical data and signals
+        signals = await self.load_signals(start_date, end_date)
+        data = signals.data
+        bar_range = {}
+        if self.execution.uses_bar_range:
+            bar_range = {name: data[column].to_numpy(dtype=np.float64)
+                         for name, column in (('opens', 'Open'), ('highs', 'High'), ('lows', 'Low'))}
+        return self.simulate(self.closes(data), data.index, signals.buy, signals.sell,
+                             progress_callback, progress_every, **bar_range)
+    
+    def simulate(self, closes: np.ndarray, times, buy: np.ndarray, sell: np.ndarray,
+                 progress_callback: Optional[Callable[[int, int, int], None]] = None,
+                 progress_every: int = 10000, opens: Optional[np.ndarray] = None,
+                 highs: Optional[np.ndarray] = None, lows: Optional[np.ndarray] = None) -> BacktestResult:
+        """Simulate trading over precomputed signal arrays
+
+        Steps from trade to trade through the signal indices rather than bar by bar;
+        pending entry orders and bracket exits are found by scanning each trade's bars
+        as arrays. Without opens/highs/lows every bar is treated as its close.
+        """
         result = BacktestResult()
+        execution = self.execution
+        total_bars = len(closes)
+        opens = closes if opens is None else opens
+        highs = closes if highs is None else highs
+        lows = closes if lows is None else lows
+        # next_buy[i] / next_sell[i]: first signal bar at or after i (total_bars if none),
+        # as lists because the loop below only does scalar lookups
+        next_buy = _next_true(buy).tolist() + [total_bars]
+        next_sell = _next_true(sell).tolist() + [total_bars]
+        close_list = closes.tolist()
         
-        # Fetch historical data
-        data = await self.fetch_data(start_date, end_date)
-        
-        # Initialize variables for tracking positions and performance
-        position = 0
-        entry_price = 0
-        
-        # Simulate trading
-        for i in range(1, len(data)):
-            current_bar = data.iloc[i]
-            prev_bar = data.iloc[i-1]
+        i = 1
+        bars_held = 0
+        next_report = progress_every
+        while i < total_bars:
+            if progress_callback and i >= next_report:
+                progress_callback(i, total_bars, len(self.trades))
+                next_report = (i // progress_every + 1) * progress_every
             
-            # Execute strategy logic (simplified example)
-            if position == 0:  # No position
-                if self._check_buy_signal(current_bar, prev_bar):
-                    position = 1
-                    entry_price = current_bar['Close']
-                    self.trades.append({
-                        'type': 'buy',
-                        'entry_price': entry_price,
-                        'entry_time': current_bar.name,
-                        'size': self.position_size * self.capital / entry_price
-                    })
-                elif self._check_sell_signal(current_bar, prev_bar):
-                    position = -1
-                    entry_price = current_bar['Close']
-                    self.trades.append({
-                        'type': 'sell',
-                        'entry_price': entry_price,
-                        'entry_time': current_bar.name,
-                        'size': self.position_size * self.capital / entry_price
-                    })
+            # Entry: the next buy or sell signal while flat (buy wins ties)
+            signal_bar = min(next_buy[i], next_sell[i])
+            if signal_bar >= total_bars:
+                break
+            direction = 1 if next_buy[i] == signal_bar else -1
+            if execution.entry_order == 'market':
+                entry_bar, fill = signal_bar, close_list[signal_bar]
+            else:
+                trigger = execution.entry_trigger(direction, close_list[signal_bar])
+                lo = signal_bar + 1
+                hi = min(lo + execution.order_expiry_bars, total_bars)
+                found = execution.find_entry(direction, trigger, opens[lo:hi], highs[lo:hi], lows[lo:hi])
+                if found is None:
+                    # Order expired unfilled; look for the next signal
+                    i = signal_bar + 1
+                    continue
+                entry_bar, fill = lo + found[0], found[1]
             
-            elif position == 1:  # Long position
-                if self._check_sell_signal(current_bar, prev_bar):
-                    exit_price = current_bar['Close']
-                    trade = self.trades[-1]
-                    profit = (exit_price - trade['entry_price']) * trade['size']
-                    trade.update({
-                        'exit_price': exit_price,
-                        'exit_time': current_bar.name,
-                        'profit': profit
-                    })
-                    position = 0
-                    self.capital += profit
+            entry_price = execution.slippage.fill_price(fill, direction)
+            size = execution.position_units(self.capital, entry_price, self.position_size)
+            fees = execution.fees.cost(entry_price, size)
+            trade = {
+                'type': 'buy' if direction == 1 else 'sell',
+                'order_type': execution.entry_order,
+                'entry_price': entry_price,
+                'entry_time': entry_bar,
+                'size': size,
+                'fees': fees
+            }
+            self.trades.append(trade)
             
-            elif position == -1:  # Short position
-                if self._check_buy_signal(current_bar, prev_bar):
-                    exit_price = current_bar['Close']
-                    trade = self.trades[-1]
-                    profit = (trade['entry_price'] - exit_price) * trade['size']
-                    trade.update({
-                        'exit_price': exit_price,
-                        'exit_time': current_bar.name,
-                        'profit': profit
-                    })
-                    position = 0
-                    self.capital += profit
+            # Exit: the next opposite signal, unless a bracket level is hit first
+            exit_bar = (next_sell if direction == 1 else next_buy)[min(entry_bar + 1, total_bars)]
+            exit_reason = 'signal'
+            exit_fill = close_list[exit_bar] if exit_bar < total_bars else None
+            if execution.has_brackets:
+                lo, hi = entry_bar + 1, min(exit_bar + 1, total_bars)
+                bracket = execution.find_bracket_exit(direction, entry_price, opens[lo:hi], highs[lo:hi], lows[lo:hi])
+                if bracket is not None:
+                    exit_bar, exit_fill, exit_reason = lo + bracket[0], bracket[1], bracket[2]
+            if exit_fill is None:
+                # Still open at the end of the data
+                bars_held += total_bars - entry_bar
+                break
+            bars_held += exit_bar - entry_bar
+            
+            exit_price = execution.slippage.fill_price(exit_fill, -direction)
+            fees += execution.fees.cost(exit_price, size)
+            profit = direction * (exit_price - entry_price) * size - fees
+            trade.update({
+                'exit_price': exit_price,
+                'exit_time': exit_bar,
+                'exit_reason': exit_reason,
+                'fees': fees,
+                'profit': profit
+            })
+            self.capital += profit
+            i = exit_bar + 1
+        
+        if progress_callback:
+            progress_callback(total_bars, total_bars, len(self.trades))
+        
+        # Bar indices were recorded above; look the timestamps up in bulk
+        self._bars_to_times(times, 'entry_time')
+        self._bars_to_times(times, 'exit_time')
         
         # Calculate final metrics
         result.trades = self.trades
-        result.metrics = self.calculate_metrics(self.trades)
+        result.metrics = self.calculate_metrics(self.trades, bars_held / total_bars if total_bars else 0.0)
         result.equity_curve = self.generate_equity_curve(self.trades).tolist()
         
         return result
     
-    def _check_buy_signal(self, current_bar: pd.Series, prev_bar: pd.Series) -> bool:
-        """
-        Placeholder for buy signal logic.
-        This should be replaced with actual strategy logic parsed from Pine Script.
-        """
-        return current_bar['Close'] > prev_bar['Close']
-    
-    def _check_sell_signal(self, current_bar: pd.Series, prev_bar: pd.Series) -> bool:
-        """
-        Placeholder for sell signal logic.
-        This should be replaced with actual strategy logic parsed from Pine Script.
-        """
-        return current_bar['Close'] < prev_bar['Close']
+    def _bars_to_times(self, times, key: str) -> None:
+        trades = [t for t in self.trades if isinstance(t.get(key), int)]
+        if trades:
+            stamps = times[np.fromiter((t[key] for t in trades), dtype=np.int64, count=len(trades))]
+            for trade, stamp in zip(trades, list(stamps)):
+                trade[key] = stamp
@@ -0,0 +1,280 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+from services.bar_store import BAR_COLUMNS, empty_bars
+import numpy as np
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BAR_CACHE_SIZE = int(os.getenv("BAR_CACHE_SIZE", "64"))
+# Bars reaching into the last base bar are refetched at most this often
+BAR_REFRESH_SECONDS = float(os.getenv("BAR_REFRESH_SECONDS", "60"))
+
+MINUTE_MS = 60_000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+WEEK_MS = 7 * DAY_MS
+# Weekly buckets start on Monday; the epoch was a Thursday
+WEEK_ORIGIN_MS = 4 * DAY_MS
+
+_UNITS = {
+    'm': MINUTE_MS, 'min': MINUTE_MS, 'minute': MINUTE_MS, 't': MINUTE_MS,
+    'h': HOUR_MS, 'hour': HOUR_MS,
+    'd': DAY_MS, 'day': DAY_MS,
+    'w': WEEK_MS, 'wk': WEEK_MS, 'week': WEEK_MS,
+}
+_TIMEFRAME = re.compile(r'^\s*(\d+)\s*([a-z]+?)s?\s*$')
+
+Fetcher = Callable[[str, str, int, int], Dict[str, np.ndarray]]
+
+def parse_timeframe(timeframe: str) -> int:
+    """Bucket width in milliseconds for timeframes like 1Min, 5m, 3h, 1Hour, 2d, 1wk"""
+    match = _TIMEFRAME.match(timeframe.lower())
+    if not match or match.group(2) not in _UNITS or int(match.group(1)) <= 0:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+def bucket_origin(bucket_ms: int) -> int:
+    return WEEK_ORIGIN_MS if bucket_ms % WEEK_MS == 0 else 0
+
+def resample(bars: Dict[str, np.ndarray], bucket_ms: int, origin: int = 0) -> Dict[str, np.ndarray]:
+    """Aggregate time-sorted OHLCV arrays into `bucket_ms` buckets
+
+    Buckets are aligned to `origin` (epoch milliseconds) and stamped with their
+    open time; empty buckets are skipped and the last one may be partial.
+    """
+    ts = bars['ts']
+    if len(ts) == 0:
+        return empty_bars()
+    buckets = (ts - origin) // bucket_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return {
+        'ts': buckets[starts] * bucket_ms + origin,
+        'open': bars['open'][starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close': bars['close'][ends],
+        'volume': np.add.reduceat(bars['volume'], starts),
+    }
+
+def _slice(bars: Dict[str, np.ndarray], start_ms: int, end_ms: int) -> Dict[str, np.ndarray]:
+    lo, hi = np.searchsorted(bars['ts'], [start_ms, end_ms])
+    return {name: values[lo:hi] for name, values in bars.items()}
+
+def _merge(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Union of two bar sets by timestamp; `new` wins where both have a bar"""
+    if len(new['ts']) == 0:
+        return old
+    if len(old['ts']) == 0:
+        return new
+    combined = {name: np.concatenate([old[name], new[name]]) for name in BAR_COLUMNS}
+    order = np.argsort(combined['ts'], kind='stable')
+    ts = combined['ts'][order]
+    keep = order[np.r_[ts[1:] != ts[:-1], True]]
+    return {name: values[keep] for name, values in combined.items()}
+
+class _BaseSeries:
+    """Base-resolution bars held in memory with the disjoint ranges they are known to cover"""
+    def __init__(self, bars: Dict[str, np.ndarray]):
+        self.bars = bars
+        self.ranges: List[Tuple[int, int]] = []
+        # Never refreshed, so a range reaching the present is fetched again
+        self.refreshed = 0.0
+
+    @property
+    def end_ms(self) -> int:
+        return self.ranges[-1][1]
+
+    def missing(self, start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+        """Parts of [start_ms, end_ms) outside every covered range"""
+        gaps = []
+        for range_start, range_end in self.ranges:
+            if range_end <= start_ms:
+                continue
+            if range_start >= end_ms:
+                break
+            if range_start > start_ms:
+                gaps.append((start_ms, range_start))
+            start_ms = range_end
+        if start_ms < end_ms:
+            gaps.append((start_ms, end_ms))
+        return gaps
+
+    def add(self, start_ms: int, end_ms: int) -> None:
+        """Mark [start_ms, end_ms) covered, merging ranges it overlaps or touches"""
+        merged = []
+        for range_start, range_end in self.ranges:
+            if range_end < start_ms or range_start > end_ms:
+                merged.append((range_start, range_end))
+            else:
+                start_ms, end_ms = min(start_ms, range_start), max(end_ms, range_end)
+        merged.append((start_ms, end_ms))
+        self.ranges = sorted(merged)
+
+class BarResampler:
+    """Serve any timeframe from base-resolution bars, fetching upstream only for gaps
+
+    `bases` lists the upstream's native timeframes as (name, width in ms). A
+    request uses the finest base already held for its range, else the coarsest
+    base that divides it, so switching between timeframes of a chart is served
+    locally. Fetched base bars are written through to `store` (the bars table,
+    keyed "{source}:{base}") along with the ranges they cover (bar_coverage), so
+    after a restart only the uncovered parts of a request are fetched. Resampled
+    results are cached per (symbol, timeframe).
+    """
+    def __init__(self, fetch: Fetcher, source: str, bases: List[Tuple[str, int]], store=None,
+                 cache_size: int = BAR_CACHE_SIZE, refresh_seconds: float = BAR_REFRESH_SECONDS):
+        self.fetch = fetch
+        self.source = source
+        self.bases = sorted(bases, key=lambda base: base[1])
+        self.store = store
+        self.cache_size = cache_size
+        self.refresh_seconds = refresh_seconds
+        self._series: "OrderedDict[Tuple[str, str], _BaseSeries]" = OrderedDict()
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[int, int, float, Dict[str, np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._symbol_locks: Dict[str, threading.Lock] = {}
+
+    def _live(self, end_ms: int, width_ms: int) -> bool:
+        return end_ms > time.time() * 1000 - width_ms
+
+    def _choose_base(self, symbol: str, bucket_ms: int, start_ms: int, end_ms: int) -> Tuple[str, int]:
+        """Finest base held whose missing part costs no more bars to fetch than the coarsest base"""
+        candidates = [base for base in self.bases if bucket_ms % base[1] == 0]
+        if not candidates:
+            raise ValueError(f"Timeframe of {bucket_ms} ms is finer than any {self.source} base")
+        budget = (end_ms - start_ms) / candidates[-1][1]
+        for name, width in candidates:
+            with self._lock:
+                series = self._series.get((symbol, name))
+            if series is None:
+                continue
+            missing = sum(gap_end - gap_start for gap_start, gap_end in series.missing(start_ms, end_ms))
+            if missing / width <= budget:
+                return name, width
+        return candidates[-1]
+
+    def _store_key(self, base: str) -> str:
+        return f"{self.source}:{base}"
+
+    def _persist(self, symbol: str, base: str, width: int, start_ms: int, end_ms: int,
+                 bars: Dict[str, np.ndarray]) -> None:
+        """Write fetched bars through to the store and record the range they cover"""
+        if self.store is None:
+            return
+        # Only whole bars count as covered; a still-forming one is fetched again after a restart
+        complete_end = min(end_ms, int(time.time() * 1000) - width)
+        try:
+            self.store.upsert_arrays(symbol, self._store_key(base), *(bars[name] for name in BAR_COLUMNS))
+            self.store.add_coverage(symbol, self._store_key(base), start_ms, complete_end)
+        except Exception as e:
+            # Persistence is best effort (e.g. migrations not run); keep serving from memory
+            logger.error(f"Error storing {symbol} {base} bars, continuing without the bar store: {str(e)}")
+            self.store = None
+
+    def _restore(self, symbol: str, base: str, series: _BaseSeries, start_ms: int, end_ms: int) -> None:
+        """Add the stored ranges within [start_ms, end_ms) to the series"""
+        if self.store is None:
+            return
+        try:
+            for range_start, range_end in self.store.read_coverage(symbol, self._store_key(base), start_ms, end_ms):
+                range_start, range_end = max(range_start, start_ms), min(range_end, end_ms)
+                if range_start >= range_end:
+                    continue
+                stored = self.store.read_range(symbol, self._store_key(base), range_start, range_end)
+                series.bars = _merge(series.bars, stored)
+                series.add(range_start, range_end)
+        except Exception as e:
+            logger.error(f"Error reading stored {symbol} {base} bars: {str(e)}")
+
+    def _fill(self, symbol: str, base: str, width: int, start_ms: int, end_ms: int) -> _BaseSeries:
+        """Make the base series cover [start_ms, end_ms); called holding the symbol's lock"""
+        key = (symbol, base)
+        with self._lock:
+            series = self._series.get(key)
+        if series is None:
+            series = _BaseSeries(empty_bars())
+            with self._lock:
+                self._series[key] = series
+                while len(self._series) > self.cache_size:
+                    evicted, _ = self._series.popitem(last=False)
+                    self._invalidate(evicted[0])
+        with self._lock:
+            self._series.move_to_end(key)
+        # Ranges stored by earlier runs are read back before anything is fetched
+        for gap_start, gap_end in series.missing(start_ms, end_ms):
+            self._restore(symbol, base, series, gap_start, gap_end)
+        gaps = series.missing(start_ms, end_ms)
+        if series.ranges:
+            held_end = series.end_ms
+            tail_start = held_end
+            if len(series.bars['ts']) and series.bars['ts'][-1] >= series.ranges[-1][0]:
+                tail_start = min(tail_start, int(series.bars['ts'][-1]))
+            # A series reaching the present counts as current until it is refresh_seconds old
+            live = self._live(held_end, width + self.refresh_seconds * 1000)
+            fresh = time.monotonic() - series.refreshed <= self.refresh_seconds
+            if live and fresh:
+                gaps = [(gap_start, min(gap_end, held_end)) for gap_start, gap_end in gaps if gap_start < held_end]
+            elif end_ms > held_end or (live and end_ms > tail_start):
+                # From the last bar held, which may have been still forming
+                gaps = [(gap_start, min(gap_end, tail_start)) for gap_start, gap_end in gaps if gap_start < tail_start]
+                gaps.append((tail_start, max(end_ms, held_end)))
+        for gap_start, gap_end in gaps:
+            fetched = self.fetch(symbol, base, gap_start, gap_end)
+            self._persist(symbol, base, width, gap_start, gap_end, fetched)
+            series.bars = _merge(series.bars, fetched)
+            series.add(gap_start, gap_end)
+            series.refreshed = time.monotonic()
+            with self._lock:
+                self._invalidate(symbol)
+        return series
+
+    def _invalidate(self, symbol: str) -> None:
+        for key in [key for key in self._cache if key[0] == symbol]:
+            del self._cache[key]
+
+    def _cached(self, key: Tuple[str, int], start_ms: int, end_ms: int):
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                return None
+            cached_start, cached_end, expires, bars = cached
+            if cached_start <= start_ms and end_ms <= cached_end and time.monotonic() < expires:
+                self._cache.move_to_end(key)
+                return _slice(bars, start_ms, end_ms)
+            return None
+
+    def get_bars(self, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> Dict[str, np.ndarray]:
+        """Bars of `timeframe` whose buckets start in [start_ms, end_ms), as arrays keyed by column"""
+        bucket_ms = parse_timeframe(timeframe)
+        origin = bucket_origin(bucket_ms)
+        # Start at the first whole bucket so no bar is built from part of one
+        start_ms += -(start_ms - origin) % bucket_ms
+        key = (symbol, bucket_ms)
+        bars = self._cached(key, start_ms, end_ms)
+        if bars is not None:
+            return bars
+        with self._lock:
+            symbol_lock = self._symbol_locks.setdefault(symbol, threading.Lock())
+        # One fetch per symbol at a time; other symbols proceed in parallel
+        with symbol_lock:
+            bars = self._cached(key, start_ms, end_ms)
+            if bars is not None:
+                return bars
+            base, width = self._choose_base(symbol, bucket_ms, start_ms, end_ms)
+            series = self._fill(symbol, base, width, start_ms, end_ms)
+            bars = _slice(series.bars, start_ms, end_ms)
+            if width != bucket_ms:
+                bars = resample(bars, bucket_ms, origin)
+            expires = time.monotonic() + self.refresh_seconds if self._live(end_ms, width) else float('inf')
+            with self._lock:
+                self._cache[key] = (start_ms, end_ms, expires, bars)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return bars
@@ -0,0 +1,199 @@
+from database import engine as default_engine
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+BAR_COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+BAR_DTYPE = np.dtype([
+    ('ts', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+
+UPSERT_BATCH_SIZE = 50_000
+
+_PLACEHOLDERS = {
+    'qmark': '?',
+    'format': '%s',
+    'pyformat': '%s',
+}
+
+def to_epoch_ms(value: Union[datetime, pd.Timestamp, int, None]) -> Optional[int]:
+    """Convert a timestamp to epoch milliseconds (naive datetimes are treated as UTC)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(timezone.utc)
+    return ts.value // 1_000_000
+
+def empty_bars() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=BAR_DTYPE[name]) for name in BAR_COLUMNS}
+
+class BarStore:
+    """Bulk storage and range reads for OHLCV bars in the `bars` table"""
+
+    def __init__(self, engine=None):
+        self.engine = engine or default_engine
+        placeholder = _PLACEHOLDERS.get(self.engine.dialect.paramstyle, '?')
+        values = ", ".join([placeholder] * (len(BAR_COLUMNS) + 2))
+        self._upsert_sql = (
+            f"INSERT INTO bars (symbol, timeframe, {', '.join(BAR_COLUMNS)}) VALUES ({values}) "
+            "ON CONFLICT (symbol, timeframe, ts) DO UPDATE SET "
+            "open = excluded.open, high = excluded.high, low = excluded.low, "
+            "close = excluded.close, volume = excluded.volume"
+        )
+        self._select_sql = (
+            f"SELECT {', '.join(BAR_COLUMNS)} FROM bars "
+            f"WHERE symbol = {placeholder} AND timeframe = {placeholder} "
+            f"AND ts >= {placeholder} AND ts < {placeholder} ORDER BY ts"
+        )
+        series = f"symbol = {placeholder} AND timeframe = {placeholder}"
+        self._coverage_sql = (
+            f"SELECT start_ms, end_ms FROM bar_coverage WHERE {series} "
+            f"AND start_ms <= {placeholder} AND end_ms >= {placeholder} ORDER BY start_ms"
+        )
+        self._coverage_delete_sql = f"DELETE FROM bar_coverage WHERE {series} AND start_ms = {placeholder}"
+        self._coverage_insert_sql = (
+            f"INSERT INTO bar_coverage (symbol, timeframe, start_ms, end_ms) "
+            f"VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})"
+        )
+
+    def upsert_arrays(self, symbol: str, timeframe: str, ts: Iterable, open: Iterable, high: Iterable,
+                      low: Iterable, close: Iterable, volume: Iterable) -> int:
+        """Insert or overwrite bars from parallel column arrays; returns rows written"""
+        columns = [
+            np.asarray(ts, dtype='i8'),
+            np.asarray(open, dtype='f8'),
+            np.asarray(high, dtype='f8'),
+            np.asarray(low, dtype='f8'),
+            np.asarray(close, dtype='f8'),
+            np.asarray(volume, dtype='f8'),
+        ]
+        count = len(columns[0])
+        if any(len(col) != count for col in columns):
+            raise ValueError("Bar columns must all have the same length")
+        if count == 0:
+            return 0
+
+        symbols = [symbol] * min(count, UPSERT_BATCH_SIZE)
+        timeframes = [timeframe] * len(symbols)
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for start in range(0, count, UPSERT_BATCH_SIZE):
+                stop = min(start + UPSERT_BATCH_SIZE, count)
+                n = stop - start
+                rows = zip(symbols[:n], timeframes[:n], *(col[start:stop].tolist() for col in columns))
+                cursor.executemany(self._upsert_sql, list(rows))
+            raw.commit()
+            cursor.close()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+        return count
+
+    def add_coverage(self, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> None:
+        """Record that every bar in [start_ms, end_ms) is stored, merged with touching ranges"""
+        if end_ms <= start_ms:
+            return
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute(self._coverage_sql, (symbol, timeframe, end_ms, start_ms))
+            touching = cursor.fetchall()
+            for row_start, row_end in touching:
+                start_ms, end_ms = min(start_ms, row_start), max(end_ms, row_end)
+            cursor.executemany(self._coverage_delete_sql, [(symbol, timeframe, row[0]) for row in touching])
+            cursor.execute(self._coverage_insert_sql, (symbol, timeframe, start_ms, end_ms))
+            raw.commit()
+            cursor.close()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+    def read_coverage(self, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+        """Stored [start, end) ranges overlapping or touching [start_ms, end_ms), merged and sorted"""
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute(self._coverage_sql, (symbol, timeframe, end_ms, start_ms))
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            raw.close()
+        ranges: List[Tuple[int, int]] = []
+        for row_start, row_end in rows:
+            # Workers record coverage independently, so rows may overlap
+            if ranges and row_start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], row_end))
+            else:
+                ranges.append((row_start, row_end))
+        return ranges
+
+    def upsert_frame(self, symbol: str, timeframe: str, df: pd.DataFrame) -> int:
+        """Insert or overwrite bars from a DataFrame indexed (or keyed) by timestamp"""
+        if df is None or df.empty:
+            return 0
+        frame = df.rename(columns=str.lower)
+        if 'timestamp' in frame.columns:
+            index = pd.DatetimeIndex(frame['timestamp'])
+        else:
+            index = pd.DatetimeIndex(frame.index)
+        if index.tz is None:
+            index = index.tz_localize(timezone.utc)
+        ts = index.as_unit('ms').asi8
+        return self.upsert_arrays(
+            symbol, timeframe, ts,
+            frame['open'].to_numpy(), frame['high'].to_numpy(), frame['low'].to_numpy(),
+            frame['close'].to_numpy(), frame['volume'].to_numpy()
+        )
+
+    def read_range(self, symbol: str, timeframe: str, start=None, end=None) -> Dict[str, np.ndarray]:
+        """Read bars in [start, end) as contiguous NumPy arrays keyed by column"""
+        start_ms = to_epoch_ms(start)
+        end_ms = to_epoch_ms(end)
+        params = (
+            symbol, timeframe,
+            start_ms if start_ms is not None else np.iinfo('i8').min,
+            end_ms if end_ms is not None else np.iinfo('i8').max,
+        )
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute(self._select_sql, params)
+            records = np.fromiter(cursor, dtype=BAR_DTYPE)
+            cursor.close()
+        finally:
+            raw.close()
+        if len(records) == 0:
+            return empty_bars()
+        return {name: np.ascontiguousarray(records[name]) for name in BAR_COLUMNS}
+
+    def read_frame(self, symbol: str, timeframe: str, start=None, end=None) -> pd.DataFrame:
+        """Read bars in [start, end) as a DataFrame with a UTC DatetimeIndex"""
+        bars = self.read_range(symbol, timeframe, start, end)
+        index = pd.to_datetime(bars['ts'], unit='ms', utc=True)
+        return pd.DataFrame({name: bars[name] for name in BAR_COLUMNS[1:]}, index=index)
+
+    async def upsert_bars(self, symbol: str, timeframe: str, df: pd.DataFrame) -> int:
+        """Async wrapper around upsert_frame that runs off the event loop"""
+        return await asyncio.to_thread(self.upsert_frame, symbol, timeframe, df)
+
+    async def get_bars(self, symbol: str, timeframe: str, start=None, end=None) -> Dict[str, np.ndarray]:
+        """Async wrapper around read_range that runs off the event loop"""
+        return await asyncio.to_thread(self.read_range, symbol, timeframe, start, end)
@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+BASKET_CONCURRENCY = int(os.getenv("BASKET_CONCURRENCY", "20"))
+BASKET_MAX_LEGS = int(os.getenv("BASKET_MAX_LEGS", "200"))
+BASKET_RETRIES = int(os.getenv("BASKET_RETRIES", "2"))
+# Alpaca allows 200 trading API requests per minute per account; leave headroom for other calls
+ORDER_RATE_PER_MINUTE = float(os.getenv("ORDER_RATE_PER_MINUTE", "150"))
+ORDER_RATE_BURST = int(os.getenv("ORDER_RATE_BURST", "50"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# SDK calls block; the default executor is sized by CPU count and would cap a
+# basket at a handful of in-flight orders on small hosts
+_executor = ThreadPoolExecutor(max_workers=BASKET_CONCURRENCY, thread_name_prefix="basket")
+
+@dataclass
+class BasketLeg:
+    symbol: str
+    quantity: float
+    side: str
+    client_order_id: Optional[str] = None
+
+class RateBudget:
+    """Token bucket shared by every basket: `burst` submissions at once, refilled at `per_minute`"""
+    def __init__(self, per_minute: float = ORDER_RATE_PER_MINUTE, burst: int = ORDER_RATE_BURST):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def validate_legs(legs: List[BasketLeg], max_legs: int = BASKET_MAX_LEGS) -> None:
+    """Reject the whole basket before anything is sent if any leg is invalid"""
+    if not legs:
+        raise ValueError("Basket has no legs")
+    if len(legs) > max_legs:
+        raise ValueError(f"Basket has {len(legs)} legs; the limit is {max_legs}")
+    problems = []
+    for index, leg in enumerate(legs):
+        if not leg.symbol or not leg.symbol.strip():
+            problems.append(f"leg {index}: symbol is required")
+        if not leg.quantity or leg.quantity <= 0:
+            problems.append(f"leg {index}: quantity must be positive")
+        if leg.side.lower() not in ('buy', 'sell'):
+            problems.append(f"leg {index}: side must be buy or sell")
+    client_ids = [leg.client_order_id for leg in legs if leg.client_order_id]
+    if len(client_ids) != len(set(client_ids)):
+        problems.append("client_order_id values must be unique within the basket")
+    if problems:
+        raise ValueError("; ".join(problems))
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, 'status_code', None)
+
+def _is_duplicate(error: Exception) -> bool:
+    return _status_code(error) == 422 and 'client_order_id' in str(error)
+
+async def dispatch_basket(legs: List[BasketLeg], submit: Callable[[BasketLeg], Dict],
+                          lookup: Callable[[str], Dict], budget: RateBudget,
+                          basket_id: Optional[str] = None, concurrency: int = BASKET_CONCURRENCY,
+                          retries: int = BASKET_RETRIES) -> Dict:
+    """Submit every leg concurrently and return per-leg results
+
+    `submit` places one order (a blocking SDK call, run in a thread) and `lookup`
+    fetches an order by client order id. Each leg gets a deterministic client
+    order id (`{basket_id}-{index}` unless given), so failed submissions are
+    retried safely, and resubmitting a basket with the same basket_id returns the
+    orders that already went through instead of duplicating them.
+    """
+    validate_legs(legs)
+    basket_id = basket_id or uuid.uuid4().hex[:16]
+    semaphore = asyncio.Semaphore(min(concurrency, BASKET_CONCURRENCY))
+    loop = asyncio.get_running_loop()
+
+    async def place(index: int, leg: BasketLeg) -> Dict:
+        leg.client_order_id = leg.client_order_id or f"{basket_id}-{index}"
+        result = {
+            'index': index,
+            'client_order_id': leg.client_order_id,
+            'symbol': leg.symbol,
+            'quantity': leg.quantity,
+            'side': leg.side.lower(),
+            'attempts': 0,
+        }
+        async with semaphore:
+            for attempt in range(retries + 1):
+                await budget.acquire()
+                result['attempts'] = attempt + 1
+                try:
+                    order = await loop.run_in_executor(_executor, submit, leg)
+                    return {**result, 'status': 'submitted', 'order': order, 'error': None}
+                except Exception as e:
+                    if _is_duplicate(e):
+                        # An earlier attempt or an earlier request already placed this leg
+                        try:
+                            order = await loop.run_in_executor(_executor, lookup, leg.client_order_id)
+                            return {**result, 'status': 'submitted', 'order': order, 'error': None}
+                        except Exception as lookup_error:
+                            e = lookup_error
+                    status = _status_code(e)
+                    if attempt < retries and (status is None or status in RETRYABLE_STATUS):
+                        await asyncio.sleep(0.2 * 2 ** attempt)
+                        continue
+                    logger.error(f"Basket {basket_id} leg {index} failed: {str(e)}")
+                    return {**result, 'status': 'failed', 'order': None, 'error': str(e)}
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(place(i, leg) for i, leg in enumerate(legs)))
+    submitted = sum(1 for r in results if r['status'] == 'submitted')
+    return {
+        'basket_id': basket_id,
+        'submitted': submitted,
+        'failed': len(results) - submitted,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'legs': results,
+    }
@@ -0,0 +1,444 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from services.backplane import LocalBackplane
+from services.bar_resampler import bucket_origin, parse_timeframe
+from services.bar_store import BAR_COLUMNS, BAR_DTYPE, empty_bars
+from services.basket_orders import BasketLeg
+from services.broker_clients import DEFAULT_ACCOUNT
+from services.metrics import BOT_EVALUATION_SECONDS
+from services.strategy_dsl import CompiledStrategy, compile_strategy, evaluate, last_true
+import numpy as np
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bars kept per (symbol, timeframe); strategies needing more history are rejected
+BOT_HISTORY_BARS = int(os.getenv("BOT_HISTORY_BARS", "500"))
+# Bots evaluated between yields to the event loop
+BOT_BATCH_SIZE = int(os.getenv("BOT_BATCH_SIZE", "200"))
+BOT_MAX_PER_USER = int(os.getenv("BOT_MAX_PER_USER", "50"))
+
+HistorySource = Callable[[str, str, int, int], Awaitable[Dict[str, np.ndarray]]]
+OrderRouter = Callable[[str, List[BasketLeg], str, List[str]], Awaitable[Dict]]
+
+_TRADINGVIEW_UNITS = {'S': 's', 'D': 'd', 'W': 'w', 'M': None}
+
+def normalize_timeframe(timeframe: str) -> str:
+    """Accept TradingView resolutions ("5", "60", "D", "1W") as saved with strategies"""
+    value = timeframe.strip()
+    if value.isdigit():
+        return f"{value}m"
+    unit = value[-1:].upper()
+    count = value[:-1] or "1"
+    if count.isdigit() and unit in _TRADINGVIEW_UNITS and value[-1:].isupper():
+        if _TRADINGVIEW_UNITS[unit] is None:
+            raise ValueError(f"Unsupported timeframe: {timeframe}")
+        return f"{count}{_TRADINGVIEW_UNITS[unit]}"
+    return value
+
+@dataclass
+class BotStats:
+    evaluations: int = 0
+    cpu_ns: int = 0
+    max_cpu_ns: int = 0
+    signals: int = 0
+    orders: int = 0
+    failed_orders: int = 0
+
+    def record(self, cpu_ns: int) -> None:
+        self.evaluations += 1
+        self.cpu_ns += cpu_ns
+        self.max_cpu_ns = max(self.max_cpu_ns, cpu_ns)
+
+    def to_dict(self) -> Dict:
+        return {
+            'evaluations': self.evaluations,
+            'cpu_ms': round(self.cpu_ns / 1e6, 3),
+            'avg_cpu_us': round(self.cpu_ns / self.evaluations / 1e3, 1) if self.evaluations else 0.0,
+            'max_cpu_us': round(self.max_cpu_ns / 1e3, 1),
+            'signals': self.signals,
+            'orders': self.orders,
+            'failed_orders': self.failed_orders,
+        }
+
+@dataclass
+class Bot:
+    id: str
+    user_id: str
+    name: str
+    symbol: str
+    timeframe: str
+    quantity: float
+    source: str
+    account: str = DEFAULT_ACCOUNT
+    created_at: datetime = field(default_factory=datetime.now)
+    position: float = 0.0
+    last_signal: Optional[str] = None
+    last_signal_at: Optional[datetime] = None
+    error: Optional[str] = None
+    strategy: Optional[CompiledStrategy] = field(default=None, repr=False)
+    stats: BotStats = field(default_factory=BotStats)
+
+    def __post_init__(self):
+        self.timeframe = normalize_timeframe(self.timeframe)
+        parse_timeframe(self.timeframe)
+        if self.quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        if self.strategy is None:
+            self.strategy = compile_strategy(self.source)
+        if self.strategy.lookback > BOT_HISTORY_BARS:
+            raise ValueError(f"Strategy needs {self.strategy.lookback} bars; at most {BOT_HISTORY_BARS} are kept")
+
+    def spec(self) -> Dict:
+        """What other workers need to run the bot"""
+        return {
+            'id': self.id, 'user_id': self.user_id, 'name': self.name, 'symbol': self.symbol,
+            'timeframe': self.timeframe, 'quantity': self.quantity, 'source': self.source,
+            'account': self.account, 'created_at': self.created_at.isoformat(), 'position': self.position,
+        }
+
+    @classmethod
+    def from_spec(cls, spec: Dict) -> "Bot":
+        return cls(**{**spec, 'created_at': datetime.fromisoformat(spec['created_at'])})
+
+    def to_dict(self) -> Dict:
+        return {
+            **self.spec(),
+            'created_at': self.created_at,
+            'last_signal': self.last_signal,
+            'last_signal_at': self.last_signal_at,
+            'error': self.error,
+            'stats': self.stats.to_dict(),
+        }
+
+class BarSeries:
+    """Closed bars of one symbol and timeframe plus the bar being built from quotes
+
+    Quotes carry no traded size, so bars built here have zero volume; only
+    warm-up bars from history have real volume.
+    """
+    def __init__(self, bucket_ms: int, capacity: int = BOT_HISTORY_BARS):
+        self.bucket_ms = bucket_ms
+        self.origin = bucket_origin(bucket_ms)
+        self.capacity = capacity
+        self.bars = empty_bars()
+        self.forming: Optional[List[float]] = None  # [ts, open, high, low, close, volume]
+
+    def bucket(self, ts_ms: int) -> int:
+        return ts_ms - (ts_ms - self.origin) % self.bucket_ms
+
+    def prepend(self, history: Dict[str, np.ndarray]) -> None:
+        """Warm-up bars older than anything already held"""
+        first = self.bars['ts'][0] if len(self.bars['ts']) else self.forming[0] if self.forming else None
+        if first is not None:
+            keep = history['ts'] < first
+            history = {name: values[keep] for name, values in history.items()}
+        self.bars = {name: np.concatenate([history[name], self.bars[name]])[-self.capacity:]
+                     for name in BAR_COLUMNS}
+
+    def update(self, price: float, ts_ms: int) -> bool:
+        """Apply a trade price; True when it started a new bar, closing the previous one"""
+        bucket = self.bucket(ts_ms)
+        forming = self.forming
+        if forming is not None and bucket < forming[0]:
+            return False
+        if forming is not None and bucket == forming[0]:
+            forming[2] = max(forming[2], price)
+            forming[3] = min(forming[3], price)
+            forming[4] = price
+            return False
+        self.forming = [bucket, price, price, price, price, 0.0]
+        if forming is None:
+            return False
+        self.bars = {name: np.append(self.bars[name], value)[-self.capacity:]
+                     for name, value in zip(BAR_COLUMNS, forming)}
+        return True
+
+class BotGroup:
+    """Bots trading one symbol on one timeframe; they share bars and indicator values"""
+    def __init__(self, symbol: str, timeframe: str):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.series = BarSeries(parse_timeframe(timeframe))
+        self.bots: Dict[str, Bot] = {}
+        self.indicator_cpu_ns = 0
+        self.evaluations = 0
+        self.warm_up: Optional[asyncio.Task] = None
+
+    def indicators(self) -> Dict:
+        unique = {}
+        for bot in self.bots.values():
+            unique.update(bot.strategy.indicators)
+        return unique
+
+class BotRuntime:
+    """Runs every user's strategy bots on the server's event loop
+
+    Bots with the same symbol and timeframe form a group: quotes from the market
+    data stream build the group's bars, and on each bar close the indicators of
+    all its bots are computed once, then every bot's conditions are checked in
+    batches. CPU time is accounted per bot (conditions) and per group (shared
+    indicators). The resulting orders are sent as one basket per broker account,
+    with client order ids derived from the bar so a retried bar cannot trade twice.
+
+    Bots are replicated to every worker over the backplane's "bots" channel;
+    each worker evaluates the symbols the backplane assigns to it. With a
+    `store`, the worker making a change also saves it, and `load` restores the
+    saved bots on startup.
+    """
+    def __init__(self, history: Optional[HistorySource] = None, route_orders: Optional[OrderRouter] = None,
+                 backplane=None, batch_size: int = BOT_BATCH_SIZE, store=None):
+        self.history = history
+        self.route_orders = route_orders
+        self.store = store
+        self.backplane = backplane or LocalBackplane()
+        self.batch_size = batch_size
+        self.bots: Dict[str, Bot] = {}
+        self.groups: Dict[Tuple[str, str], BotGroup] = {}
+        self._listeners: List[Callable[[], Awaitable[None]]] = []
+        self._members: List[str] = []
+
+    async def attach(self, backplane) -> None:
+        """Share bots with other workers; call before backplane.start()"""
+        self.backplane = backplane
+        await backplane.subscribe("bots", self._on_bot_event)
+        backplane.on_members(self._on_members)
+
+    def add_listener(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Called whenever the set of symbols this worker evaluates may have changed"""
+        self._listeners.append(callback)
+
+    async def _symbols_changed(self) -> None:
+        for callback in list(self._listeners):
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"Error in bot runtime listener: {str(e)}")
+
+    async def load(self) -> None:
+        """Restore the stored bots, skipping any a snapshot already delivered"""
+        if self.store is None:
+            return
+        try:
+            specs = await self.store.load()
+        except Exception as e:
+            logger.error(f"Error loading stored bots: {str(e)}")
+            return
+        for spec in specs:
+            if spec['id'] in self.bots:
+                continue
+            try:
+                await self.add_bot(Bot.from_spec(spec), publish=False)
+            except Exception as e:
+                logger.error(f"Error restoring bot {spec['id']}: {str(e)}")
+
+    def owned_symbols(self) -> List[str]:
+        return sorted({symbol for symbol, _ in self.groups if self.backplane.owns(symbol)})
+
+    def user_bots(self, user_id: str) -> List[Bot]:
+        return [bot for bot in self.bots.values() if bot.user_id == user_id]
+
+    async def add_bot(self, bot: Bot, publish: bool = True) -> None:
+        if publish and len(self.user_bots(bot.user_id)) >= BOT_MAX_PER_USER:
+            raise ValueError(f"At most {BOT_MAX_PER_USER} bots per user")
+        previous = self.bots.get(bot.id)
+        if previous is not None:
+            self._group_of(previous).bots.pop(bot.id, None)
+        self.bots[bot.id] = bot
+        key = (bot.symbol, bot.timeframe)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = BotGroup(bot.symbol, bot.timeframe)
+            if self.history is not None:
+                group.warm_up = asyncio.create_task(self._warm_up(group))
+        group.bots[bot.id] = bot
+        if publish:
+            await self._publish('add', bot)
+            if self.store is not None:
+                await self.store.save(bot.spec())
+        await self._symbols_changed()
+
+    async def remove_bot(self, bot_id: str, publish: bool = True) -> Optional[Bot]:
+        bot = self.bots.pop(bot_id, None)
+        if bot is None:
+            return None
+        group = self._group_of(bot)
+        group.bots.pop(bot_id, None)
+        if not group.bots:
+            if group.warm_up is not None:
+                group.warm_up.cancel()
+            del self.groups[(group.symbol, group.timeframe)]
+        if publish:
+            await self._publish('remove', bot)
+            if self.store is not None:
+                await self.store.delete(bot.id)
+        await self._symbols_changed()
+        return bot
+
+    def _group_of(self, bot: Bot) -> BotGroup:
+        return self.groups[(bot.symbol, bot.timeframe)]
+
+    async def _warm_up(self, group: BotGroup) -> None:
+        series = group.series
+        end_ms = series.bucket(int(time.time() * 1000))
+        start_ms = end_ms - series.capacity * series.bucket_ms
+        try:
+            history = await self.history(group.symbol, group.timeframe, start_ms, end_ms)
+            series.prepend({name: np.asarray(history[name], dtype=BAR_DTYPE[name]) for name in BAR_COLUMNS})
+        except Exception as e:
+            logger.error(f"Error loading {group.symbol} {group.timeframe} history for bots: {str(e)}")
+
+    async def _publish(self, op: str, bot: Bot) -> None:
+        await self.backplane.publish("bots", {
+            'op': op, 'origin': self.backplane.worker_id, 'bot': bot.spec()
+        })
+
+    async def _on_bot_event(self, event: Dict) -> None:
+        if event.get('origin') == self.backplane.worker_id:
+            return
+        op = event['op']
+        if op == 'snapshot':
+            for spec in event['bots']:
+                if spec['id'] not in self.bots:
+                    await self.add_bot(Bot.from_spec(spec), publish=False)
+        elif op == 'add':
+            await self.add_bot(Bot.from_spec(event['bot']), publish=False)
+        elif op == 'update':
+            bot = self.bots.get(event['bot']['id'])
+            if bot is not None:
+                bot.position = event['bot']['position']
+        elif op == 'remove':
+            await self.remove_bot(event['bot']['id'], publish=False)
+
+    async def _on_members(self, members: List[str]) -> None:
+        previous, self._members = self._members, members
+        joined = set(members) - set(previous)
+        survivors = [m for m in previous if m in members] or [self.backplane.worker_id]
+        # One worker from the existing group brings newcomers up to date
+        if joined and min(survivors) == self.backplane.worker_id and self.bots:
+            await self.backplane.publish("bots", {
+                'op': 'snapshot', 'origin': self.backplane.worker_id,
+                'bots': [bot.spec() for bot in self.bots.values()]
+            })
+        await self._symbols_changed()
+
+    async def on_quote(self, quote) -> None:
+        """Market data listener: extend the bars and evaluate the groups whose bar closed"""
+        if not self.backplane.owns(quote.symbol):
+            return
+        ts_ms = int(quote.timestamp.timestamp() * 1000)
+        for (symbol, _), group in list(self.groups.items()):
+            if symbol == quote.symbol and group.series.update(quote.price, ts_ms):
+                await self.evaluate_group(group)
+
+    async def evaluate_group(self, group: BotGroup) -> List[Dict]:
+        """Check every bot of the group against the latest closed bar and route the orders"""
+        bars = group.series.bars
+        if len(bars['ts']) == 0:
+            return []
+        bar_ts = int(bars['ts'][-1])
+        started = time.perf_counter()
+        cache: Dict[str, np.ndarray] = {}
+        # One bot's broken indicator must not stop the others sharing the group
+        failed: Dict[str, str] = {}
+        cpu = time.thread_time_ns()
+        for key, node in group.indicators().items():
+            try:
+                evaluate(node, bars, cache)
+            except Exception as e:
+                failed[key] = f"{key}: {str(e)}"
+                logger.error(f"Error computing {key} for {group.symbol} {group.timeframe} bots: {str(e)}")
+        group.indicator_cpu_ns += time.thread_time_ns() - cpu
+        group.evaluations += 1
+
+        signals: List[Tuple[Bot, str]] = []
+        for index, bot in enumerate(list(group.bots.values())):
+            if index and index % self.batch_size == 0:
+                BOT_EVALUATION_SECONDS.observe(time.perf_counter() - started)
+                await asyncio.sleep(0)
+                started = time.perf_counter()
+            broken = next((failed[key] for key in bot.strategy.indicators if key in failed), None)
+            if broken is not None:
+                bot.error = broken
+                continue
+            cpu = time.thread_time_ns()
+            try:
+                # Long-only: look for an entry when flat and an exit when holding
+                if bot.position <= 0:
+                    signal = 'buy' if last_true(evaluate(bot.strategy.buy, bars, cache)) else None
+                else:
+                    signal = 'sell' if last_true(evaluate(bot.strategy.sell, bars, cache)) else None
+                bot.error = None
+            except Exception as e:
+                signal = None
+                bot.error = str(e)
+                logger.error(f"Error evaluating bot {bot.id}: {str(e)}")
+            bot.stats.record(time.thread_time_ns() - cpu)
+            if signal:
+                bot.stats.signals += 1
+                bot.last_signal = signal
+                bot.last_signal_at = datetime.now()
+                signals.append((bot, signal))
+        BOT_EVALUATION_SECONDS.observe(time.perf_counter() - started)
+        if signals and self.route_orders is not None:
+            return await self._route(group, bar_ts, signals)
+        return []
+
+    async def _route(self, group: BotGroup, bar_ts: int, signals: List[Tuple[Bot, str]]) -> List[Dict]:
+        by_account: Dict[str, List[Tuple[Bot, BasketLeg]]] = {}
+        for bot, side in signals:
+            quantity = bot.quantity if side == 'buy' else bot.position
+            leg = BasketLeg(symbol=bot.symbol, quantity=quantity, side=side, client_order_id=f"{bot.id}-{bar_ts}")
+            by_account.setdefault(bot.account, []).append((bot, leg))
+
+        async def send(account: str, entries: List[Tuple[Bot, BasketLeg]]) -> List[Dict]:
+            basket_id = f"bots-{group.symbol}-{group.timeframe}-{bar_ts}"
+            try:
+                result = await self.route_orders(
+                    account, [leg for _, leg in entries], basket_id, [bot.user_id for bot, _ in entries]
+                )
+                legs = result['legs']
+            except Exception as e:
+                logger.error(f"Error routing bot orders for {account}: {str(e)}")
+                legs = [{'status': 'failed', 'error': str(e)} for _ in entries]
+            for (bot, leg), placed in zip(entries, legs):
+                if placed['status'] == 'submitted':
+                    bot.stats.orders += 1
+                    bot.position = bot.position + leg.quantity if leg.side == 'buy' else 0.0
+                    await self._publish('update', bot)
+                    if self.store is not None:
+                        await self.store.save(bot.spec())
+                else:
+                    bot.stats.failed_orders += 1
+                    bot.error = placed.get('error')
+            return legs
+
+        results = await asyncio.gather(*(send(account, entries) for account, entries in by_account.items()))
+        return [leg for legs in results for leg in legs]
+
+    def stats(self, user_id: Optional[str] = None) -> Dict:
+        """Runtime statistics; with `user_id`, only that user's bots and the groups they are in"""
+        def counted(bots: Dict[str, Bot]) -> int:
+            return len(bots) if user_id is None else sum(bot.user_id == user_id for bot in bots.values())
+
+        return {
+            'bots': counted(self.bots),
+            'groups': [
+                {
+                    'symbol': group.symbol,
+                    'timeframe': group.timeframe,
+                    'bots': counted(group.bots),
+                    'bars': len(group.series.bars['ts']),
+                    'indicators': len(group.indicators()),
+                    'evaluations': group.evaluations,
+                    'indicator_cpu_ms': round(group.indicator_cpu_ns / 1e6, 3),
+                    'owned': self.backplane.owns(group.symbol),
+                }
+                for group in self.groups.values()
+                if counted(group.bots)
+            ],
+        }
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import delete, select
+from database import AsyncSessionLocal
+from models.database_models import TradingBot
+import logging
+
+logger = logging.getLogger(__name__)
+
+SPEC_COLUMNS = ('id', 'user_id', 'name', 'symbol', 'timeframe', 'quantity', 'source', 'account', 'position')
+
+class BotStore:
+    """Bot specs and positions in the `bots` table, written by the worker that changed them"""
+
+    async def save(self, spec: Dict) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.merge(TradingBot(
+                    **{column: spec[column] for column in SPEC_COLUMNS},
+                    created_at=datetime.fromisoformat(spec['created_at'])
+                ))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error saving bot {spec['id']}: {str(e)}")
+
+    async def delete(self, bot_id: str) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(delete(TradingBot).where(TradingBot.id == bot_id))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error deleting bot {bot_id}: {str(e)}")
+
+    async def load(self) -> List[Dict]:
+        async with AsyncSessionLocal() as db:
+            records = (await db.scalars(select(TradingBot).order_by(TradingBot.created_at))).all()
+        return [
+            {**{column: getattr(record, column) for column in SPEC_COLUMNS},
+             'created_at': record.created_at.isoformat()}
+            for record in records
+        ]
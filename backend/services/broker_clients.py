@@ -0,0 +1,199 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional
+from dotenv import load_dotenv
+import json
+import logging
+import os
+import threading
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACCOUNT = "default"
+# JSON object of named accounts: {"name": {"api_key": ..., "secret_key": ..., "paper": true, "users": [...]}}
+ALPACA_ACCOUNTS_FILE = os.getenv("ALPACA_ACCOUNTS_FILE")
+BROKER_CLIENT_IDLE_SECONDS = float(os.getenv("BROKER_CLIENT_IDLE_SECONDS", "900"))
+BROKER_POOL_SIZE = int(os.getenv("BROKER_POOL_SIZE", "32"))
+# Sends every account's trading calls to one host (benchmark stand-ins); unset, `paper` picks the host
+ALPACA_TRADING_URL_OVERRIDE = os.getenv("ALPACA_TRADING_URL_OVERRIDE") or None
+
+@dataclass(frozen=True)
+class BrokerCredentials:
+    api_key: Optional[str]
+    secret_key: Optional[str]
+    paper: bool = True
+
+def env_credentials() -> BrokerCredentials:
+    """Credentials of the default account from the environment
+
+    ALPACA_SECRET_KEY is the canonical name; ALPACA_API_SECRET is still read for
+    deployments configured before the two services shared a registry.
+    """
+    secret_key = os.getenv('ALPACA_SECRET_KEY')
+    if secret_key is None and os.getenv('ALPACA_API_SECRET') is not None:
+        logger.warning("ALPACA_API_SECRET is deprecated; set ALPACA_SECRET_KEY instead")
+        secret_key = os.getenv('ALPACA_API_SECRET')
+    return BrokerCredentials(
+        api_key=os.getenv('ALPACA_API_KEY'),
+        secret_key=secret_key,
+        paper=os.getenv('ALPACA_PAPER_TRADING', 'True').lower() == 'true'
+    )
+
+@dataclass(frozen=True)
+class AccountConfig:
+    name: str
+    credentials: BrokerCredentials
+    # Usernames allowed to trade the account; empty means unrestricted
+    users: FrozenSet[str] = frozenset()
+
+def load_accounts(path: Optional[str] = ALPACA_ACCOUNTS_FILE) -> Dict[str, AccountConfig]:
+    """The default account from the environment plus any named accounts in ALPACA_ACCOUNTS_FILE"""
+    accounts = {DEFAULT_ACCOUNT: AccountConfig(DEFAULT_ACCOUNT, env_credentials())}
+    if not path:
+        return accounts
+    with open(path) as f:
+        for name, entry in json.load(f).items():
+            accounts[name] = AccountConfig(
+                name=name,
+                credentials=BrokerCredentials(
+                    api_key=entry['api_key'],
+                    secret_key=entry['secret_key'],
+                    paper=bool(entry.get('paper', True))
+                ),
+                users=frozenset(entry.get('users', []))
+            )
+    return accounts
+
+@dataclass
+class BrokerClients:
+    """SDK clients for one credential set, each built on first use"""
+    credentials: BrokerCredentials
+    adapter: object
+    last_used: float = field(default_factory=time.monotonic)
+    _clients: Dict[str, object] = field(default_factory=dict)
+    _budget: object = None
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def _client(self, kind: str, factory):
+        client = self._clients.get(kind)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(kind)
+                if client is None:
+                    client = factory()
+                    # Connections are keyed by host and auth is sent per request, so
+                    # every account can draw on the same keep-alive pools
+                    client._session.mount('https://', self.adapter)
+                    client._session.mount('http://', self.adapter)
+                    self._clients[kind] = client
+        return client
+
+    @property
+    def trading(self):
+        from alpaca.trading.client import TradingClient
+        creds = self.credentials
+        return self._client('trading', lambda: TradingClient(
+            api_key=creds.api_key, secret_key=creds.secret_key, paper=creds.paper,
+            url_override=ALPACA_TRADING_URL_OVERRIDE
+        ))
+
+    @property
+    def crypto_data(self):
+        from alpaca.data.historical import CryptoHistoricalDataClient
+        creds = self.credentials
+        return self._client('crypto_data', lambda: CryptoHistoricalDataClient(
+            api_key=creds.api_key, secret_key=creds.secret_key,
+            url_override=os.getenv('ALPACA_DATA_URL')
+        ))
+
+    @property
+    def stock_data(self):
+        from alpaca.data.historical import StockHistoricalDataClient
+        creds = self.credentials
+        return self._client('stock_data', lambda: StockHistoricalDataClient(
+            api_key=creds.api_key, secret_key=creds.secret_key,
+            url_override=os.getenv('ALPACA_DATA_URL')
+        ))
+
+    @property
+    def order_budget(self):
+        """Order rate budget; Alpaca's request limit applies per account"""
+        if self._budget is None:
+            from services.basket_orders import RateBudget
+            self._budget = RateBudget()
+        return self._budget
+
+class BrokerClientRegistry:
+    """Process-wide broker clients, one set per credential set
+
+    Clients are created lazily, share one pooled HTTP adapter, and are dropped
+    once unused for BROKER_CLIENT_IDLE_SECONDS (the default account is kept).
+    """
+    def __init__(self, accounts: Optional[Dict[str, AccountConfig]] = None,
+                 idle_seconds: float = BROKER_CLIENT_IDLE_SECONDS, pool_size: int = BROKER_POOL_SIZE):
+        self._accounts = accounts
+        self.idle_seconds = idle_seconds
+        self.pool_size = pool_size
+        self._adapter = None
+        self._clients: Dict[BrokerCredentials, BrokerClients] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    @property
+    def accounts(self) -> Dict[str, AccountConfig]:
+        if self._accounts is None:
+            self._accounts = load_accounts()
+        return self._accounts
+
+    def _shared_adapter(self):
+        if self._adapter is None:
+            from requests.adapters import HTTPAdapter
+            self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        return self._adapter
+
+    def resolve(self, name: Optional[str] = None, username: Optional[str] = None) -> AccountConfig:
+        """The named account, else the first one assigned to `username`, else the default
+
+        Raises KeyError for unknown accounts and PermissionError when the account
+        is restricted to other users (or to signed-in users, when there is none).
+        """
+        if name is None:
+            if username is not None:
+                for account in self.accounts.values():
+                    if username in account.users:
+                        return account
+            name = DEFAULT_ACCOUNT
+        account = self.accounts.get(name)
+        if account is None:
+            raise KeyError(f"Unknown broker account: {name}")
+        if account.users and username not in account.users:
+            raise PermissionError(f"Not allowed to use broker account: {name}")
+        return account
+
+    def clients(self, account: Optional[AccountConfig] = None) -> BrokerClients:
+        credentials = (account or self.resolve()).credentials
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(credentials)
+            if entry is None:
+                entry = BrokerClients(credentials, self._shared_adapter())
+                self._clients[credentials] = entry
+            entry.last_used = now
+            if now - self._last_sweep > min(self.idle_seconds, 60):
+                self._evict_idle(now)
+        return entry
+
+    def _evict_idle(self, now: float) -> None:
+        # Sessions are left open: their pools belong to the shared adapter
+        self._last_sweep = now
+        default = self.accounts[DEFAULT_ACCOUNT].credentials
+        for credentials, entry in list(self._clients.items()):
+            if credentials != default and now - entry.last_used > self.idle_seconds:
+                del self._clients[credentials]
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+broker_clients = BrokerClientRegistry()
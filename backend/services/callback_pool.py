@@ -0,0 +1,140 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from services.metrics import CALLBACK_DEAD_LETTERS_TOTAL, CALLBACK_DURATION_SECONDS, CALLBACK_QUEUE_DEPTH
+import asyncio
+import inspect
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+ALERT_CALLBACK_WORKERS = int(os.getenv("ALERT_CALLBACK_WORKERS", "8"))
+ALERT_CALLBACK_THREADS = int(os.getenv("ALERT_CALLBACK_THREADS", "8"))
+ALERT_CALLBACK_QUEUE = int(os.getenv("ALERT_CALLBACK_QUEUE", "1000"))
+ALERT_CALLBACK_TIMEOUT = float(os.getenv("ALERT_CALLBACK_TIMEOUT", "10"))
+ALERT_CALLBACK_RETRIES = int(os.getenv("ALERT_CALLBACK_RETRIES", "2"))
+ALERT_CALLBACK_DEAD_LETTERS = int(os.getenv("ALERT_CALLBACK_DEAD_LETTERS", "500"))
+
+class CallbackPool:
+    """Run callbacks off the caller's path on a fixed number of worker tasks
+
+    `submit` only enqueues, so the caller never waits on a callback. Each run is
+    bounded by `timeout` and retried with backoff after an error; jobs that still
+    fail, or that find the queue full, are kept in a bounded dead-letter list for
+    inspection. A timed-out callback may still be running (or have done its side
+    effect), so it is only retried if it sets `retry_on_timeout = True`.
+    Callbacks are called on the pool's own `threads`-sized executor, so blocking
+    ones never stall the event loop; an awaitable they return (async callbacks)
+    is awaited on the loop within what is left of the timeout.
+    """
+    def __init__(self, name: str, workers: int = ALERT_CALLBACK_WORKERS, queue_size: int = ALERT_CALLBACK_QUEUE,
+                 timeout: float = ALERT_CALLBACK_TIMEOUT, retries: int = ALERT_CALLBACK_RETRIES,
+                 dead_letter_size: int = ALERT_CALLBACK_DEAD_LETTERS, threads: int = ALERT_CALLBACK_THREADS):
+        self.name = name
+        self.workers = workers
+        self.threads = threads
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retries = retries
+        self.dead_letters: deque = deque(maxlen=dead_letter_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._depth = CALLBACK_QUEUE_DEPTH.labels(name)
+
+    def _start(self) -> None:
+        # Created on first use so the queue belongs to the running event loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix=f"{self.name}-callback")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+        if self._executor is not None:
+            # Running callbacks finish in the background; queued ones are dropped
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._depth.set(0)
+
+    def submit(self, callback: Callable, *args, context: Optional[Dict] = None) -> bool:
+        """Queue `callback(*args)`; False (and a dead letter) if the queue is full"""
+        if self._queue is None:
+            self._start()
+        try:
+            self._queue.put_nowait((callback, args, context or {}))
+        except asyncio.QueueFull:
+            self._dead_letter(callback, context or {}, "queue full", 0, 'rejected')
+            return False
+        self._depth.set(self._queue.qsize())
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _call(self, callback: Callable, args) -> None:
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+
+        def run():
+            loop.call_soon_threadsafe(started.set)
+            return callback(*args)
+
+        future = loop.run_in_executor(self._executor, run)
+        # Time the callback itself, not the wait for a free thread, but bound that wait too
+        try:
+            await asyncio.wait_for(started.wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+        deadline = loop.time() + self.timeout
+        result = await asyncio.wait_for(future, timeout=self.timeout)
+        if inspect.isawaitable(result):
+            await asyncio.wait_for(result, timeout=max(deadline - loop.time(), 0.0))
+
+    async def _work(self) -> None:
+        while True:
+            callback, args, context = await self._queue.get()
+            self._depth.set(self._queue.qsize())
+            error, attempts = None, 0
+            for attempt in range(self.retries + 1):
+                attempts = attempt + 1
+                started = time.perf_counter()
+                try:
+                    await self._call(callback, args)
+                    CALLBACK_DURATION_SECONDS.labels(self.name, 'ok').observe(time.perf_counter() - started)
+                    error = None
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except asyncio.TimeoutError:
+                    CALLBACK_DURATION_SECONDS.labels(self.name, 'timeout').observe(time.perf_counter() - started)
+                    error, reason = f"timed out after {self.timeout}s", 'timeout'
+                    if not getattr(callback, 'retry_on_timeout', False):
+                        break
+                except Exception as e:
+                    CALLBACK_DURATION_SECONDS.labels(self.name, 'error').observe(time.perf_counter() - started)
+                    error, reason = str(e) or type(e).__name__, 'error'
+                if attempt < self.retries:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+            if error is not None:
+                self._dead_letter(callback, context, error, attempts, reason)
+            self._queue.task_done()
+
+    def _dead_letter(self, callback: Callable, context: Dict, error: str, attempts: int, reason: str) -> None:
+        name = getattr(callback, '__qualname__', repr(callback))
+        logger.error(f"{self.name} callback {name} failed after {attempts} attempts: {error}")
+        CALLBACK_DEAD_LETTERS_TOTAL.labels(self.name, reason).inc()
+        self.dead_letters.append({
+            'callback': name,
+            'context': context,
+            'error': error,
+            'reason': reason,
+            'attempts': attempts,
+            'failed_at': datetime.now(),
+        })
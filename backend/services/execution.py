@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional
+import numpy as np
+
+ORDER_TYPES = ('market', 'limit', 'stop')
+SIZING_MODES = ('percent_equity', 'fixed_notional', 'fixed_units', 'risk')
+
+@dataclass
+class FeeSchedule:
+    """Commission charged on every fill"""
+    per_share: float = 0.0
+    percent: float = 0.0  # fraction of notional, e.g. 0.001 for 10 bps
+    minimum: float = 0.0
+
+    def cost(self, price, units):
+        """Fee for filling `units` at `price`; works on scalars and arrays"""
+        fee = self.per_share * abs(units) + self.percent * abs(units * price)
+        return np.maximum(fee, self.minimum) if self.minimum else fee
+
+@dataclass
+class SlippageModel:
+    """Half the quoted spread plus fixed slippage, both in basis points, paid on every fill"""
+    spread_bps: float = 0.0
+    slippage_bps: float = 0.0
+
+    def fill_price(self, price, direction):
+        """Price actually paid (direction 1) or received (direction -1)"""
+        return price * (1 + direction * (self.spread_bps / 2 + self.slippage_bps) / 10000)
+
+@dataclass
+class ExecutionModel:
+    """How signals turn into fills; the defaults fill market orders at the close with no costs"""
+    fees: FeeSchedule = field(default_factory=FeeSchedule)
+    slippage: SlippageModel = field(default_factory=SlippageModel)
+    # Entry orders: 'limit' waits for a pullback of entry_offset from the signal close,
+    # 'stop' for a breakout of entry_offset; both expire after order_expiry_bars bars
+    entry_order: str = 'market'
+    entry_offset: float = 0.0
+    order_expiry_bars: int = 1
+    # Bracket exits as fractions of the entry price, filled intrabar against high/low
+    stop_loss: Optional[float] = None
+    take_profit: Optional[float] = None
+    # 'percent_equity' and 'risk' take a fraction of capital, the others an amount;
+    # None uses the backtester's position_size for the percentage modes
+    sizing: str = 'percent_equity'
+    sizing_value: Optional[float] = None
+
+    def __post_init__(self):
+        if self.entry_order not in ORDER_TYPES:
+            raise ValueError(f"Unsupported entry order type: {self.entry_order}")
+        if self.sizing not in SIZING_MODES:
+            raise ValueError(f"Unsupported sizing mode: {self.sizing}")
+        if self.sizing == 'risk' and not self.stop_loss:
+            raise ValueError("Risk-based sizing requires a stop_loss")
+        if self.sizing in ('fixed_notional', 'fixed_units') and not self.sizing_value:
+            raise ValueError(f"{self.sizing} sizing requires sizing_value")
+
+    @classmethod
+    def from_dict(cls, settings: Optional[Dict]) -> 'ExecutionModel':
+        settings = dict(settings or {})
+        fees = FeeSchedule(**(settings.pop('fees', None) or {}))
+        slippage = SlippageModel(**(settings.pop('slippage', None) or {}))
+        return cls(fees=fees, slippage=slippage, **settings)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @property
+    def has_brackets(self) -> bool:
+        return bool(self.stop_loss or self.take_profit)
+
+    @property
+    def uses_bar_range(self) -> bool:
+        return self.entry_order != 'market' or self.has_brackets
+
+    def position_units(self, capital: float, price: float, position_size: float) -> float:
+        if self.sizing == 'fixed_units':
+            return self.sizing_value
+        if self.sizing == 'fixed_notional':
+            return self.sizing_value / price
+        fraction = self.sizing_value if self.sizing_value is not None else position_size
+        if self.sizing == 'risk':
+            # Lose `fraction` of capital if the stop is hit
+            return fraction * capital / (price * self.stop_loss)
+        return fraction * capital / price
+
+    def entry_trigger(self, direction: int, signal_close: float) -> float:
+        """Limit or stop price for an entry order placed at the signal bar's close"""
+        if self.entry_order == 'limit':
+            return signal_close * (1 - direction * self.entry_offset)
+        return signal_close * (1 + direction * self.entry_offset)
+
+    def find_entry(self, direction: int, trigger: float, opens: np.ndarray,
+                   highs: np.ndarray, lows: np.ndarray):
+        """First bar of the window where the pending entry order fills, as (offset, price) or None"""
+        if self.entry_order == 'limit':
+            hit = lows <= trigger if direction == 1 else highs >= trigger
+        else:
+            hit = highs >= trigger if direction == 1 else lows <= trigger
+        if not hit.any():
+            return None
+        k = int(hit.argmax())
+        # A gap through the trigger fills at the open
+        if (self.entry_order == 'limit') == (direction == 1):
+            return k, min(opens[k], trigger)
+        return k, max(opens[k], trigger)
+
+    def find_bracket_exit(self, direction: int, entry_price: float, opens: np.ndarray,
+                          highs: np.ndarray, lows: np.ndarray):
+        """First bar of the window hitting the stop-loss or take-profit, as (offset, price, reason) or None"""
+        if not self.has_brackets:
+            return None
+        adverse = lows if direction == 1 else highs
+        favourable = highs if direction == 1 else lows
+        stop_hit = np.zeros(len(opens), dtype=bool)
+        target_hit = np.zeros(len(opens), dtype=bool)
+        if self.stop_loss:
+            stop = entry_price * (1 - direction * self.stop_loss)
+            stop_hit = (adverse - stop) * direction <= 0
+        if self.take_profit:
+            target = entry_price * (1 + direction * self.take_profit)
+            target_hit = (favourable - target) * direction >= 0
+        hit = stop_hit | target_hit
+        if not hit.any():
+            return None
+        k = int(hit.argmax())
+        # When both levels fall inside one bar, assume the stop was reached first
+        if stop_hit[k]:
+            gap = (opens[k] - stop) * direction < 0
+            return k, opens[k] if gap else stop, 'stop_loss'
+        gap = (opens[k] - target) * direction > 0
+        return k, opens[k] if gap else target, 'take_profit'
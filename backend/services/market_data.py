@@ -0,0 +1,410 @@
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from services.metrics import WEBSOCKET_CONNECTIONS, WEBSOCKET_QUEUE_DEPTH
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+MARKET_DATA_FEED = os.getenv("MARKET_DATA_FEED", "alpaca")  # alpaca, replay or off
+MARKET_DATA_REPLAY_FILE = os.getenv("MARKET_DATA_REPLAY_FILE")
+MARKET_DATA_REPLAY_INTERVAL = float(os.getenv("MARKET_DATA_REPLAY_INTERVAL", "0.5"))
+MARKET_DATA_STALE_SECONDS = float(os.getenv("MARKET_DATA_STALE_SECONDS", "30"))
+MARKET_DATA_IDLE_SECONDS = float(os.getenv("MARKET_DATA_IDLE_SECONDS", "300"))
+MARKET_DATA_POSITIONS_REFRESH = float(os.getenv("MARKET_DATA_POSITIONS_REFRESH", "60"))
+MARKET_DATA_VIEWER_QUEUE = int(os.getenv("MARKET_DATA_VIEWER_QUEUE", "256"))
+MARKET_DATA_VIEWER_MAX_SYMBOLS = int(os.getenv("MARKET_DATA_VIEWER_MAX_SYMBOLS", "50"))
+# Symbols kept subscribed for REST quote requests, per worker
+MARKET_DATA_REQUEST_MAX_SYMBOLS = int(os.getenv("MARKET_DATA_REQUEST_MAX_SYMBOLS", "100"))
+
+@dataclass
+class Quote:
+    symbol: str
+    price: float
+    bid: Optional[float]
+    ask: Optional[float]
+    timestamp: datetime
+    received_at: float  # time.monotonic() when the quote arrived
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['timestamp'] = self.timestamp.isoformat()
+        del data['received_at']
+        return data
+
+    def to_price_data(self) -> Dict:
+        """The price_data shape AlertManager.process_price_update expects"""
+        return {'close': self.price, 'bid': self.bid, 'ask': self.ask, 'timestamp': self.timestamp}
+
+QuoteHandler = Callable[[Quote], Awaitable[None]]
+
+class AlpacaQuoteFeed:
+    """Crypto quotes from Alpaca's market data websocket, one connection for all symbols"""
+    def __init__(self):
+        from alpaca.data.live import CryptoDataStream
+        from services.broker_clients import env_credentials
+        credentials = env_credentials()
+        self._stream = CryptoDataStream(
+            api_key=credentials.api_key,
+            secret_key=credentials.secret_key,
+            url_override=os.getenv('ALPACA_STREAM_URL')
+        )
+        self._on_quote: Optional[QuoteHandler] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, on_quote: QuoteHandler) -> None:
+        self._on_quote = on_quote
+        self._loop = asyncio.get_running_loop()
+
+    async def subscribe(self, symbols: Set[str]) -> None:
+        # Once running, the SDK blocks until its own loop has sent the subscription
+        await asyncio.to_thread(self._stream.subscribe_quotes, self._handle, *symbols)
+        if self._task is None:
+            # run() blocks with its own event loop and spins until something is subscribed
+            self._task = asyncio.create_task(asyncio.to_thread(self._stream.run))
+
+    async def unsubscribe(self, symbols: Set[str]) -> None:
+        await asyncio.to_thread(self._stream.unsubscribe_quotes, *symbols)
+
+    async def _handle(self, quote) -> None:
+        # Called on the stream's event loop; quotes are handled on the server's
+        bid, ask = float(quote.bid_price), float(quote.ask_price)
+        future = asyncio.run_coroutine_threadsafe(self._on_quote(Quote(
+            symbol=quote.symbol, price=(bid + ask) / 2, bid=bid, ask=ask,
+            timestamp=quote.timestamp, received_at=time.monotonic()
+        )), self._loop)
+        await asyncio.wrap_future(future)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            try:
+                await asyncio.to_thread(self._stream.stop)
+            except Exception as e:
+                logger.error(f"Error stopping quote stream: {str(e)}")
+            self._task.cancel()
+
+class ReplayQuoteFeed:
+    """Local stand-in for the upstream stream
+
+    Replays recorded quotes from a JSON-lines file ({"symbol", "price", "bid", "ask"}
+    per line), looping per symbol; subscribed symbols without recordings follow a
+    seeded random walk. One quote per subscribed symbol every `interval` seconds.
+    """
+    def __init__(self, path: Optional[str] = None, interval: float = MARKET_DATA_REPLAY_INTERVAL,
+                 seed: Optional[int] = None):
+        self.interval = interval
+        self._recorded: Dict[str, List[Dict]] = {}
+        if path:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._recorded.setdefault(record['symbol'], []).append(record)
+        self._random = random.Random(seed)
+        self._symbols: Set[str] = set()
+        self._position: Dict[str, int] = {}
+        self._walk: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, on_quote: QuoteHandler) -> None:
+        self._on_quote = on_quote
+        self._task = asyncio.create_task(self._run())
+
+    async def subscribe(self, symbols: Set[str]) -> None:
+        self._symbols |= symbols
+
+    async def unsubscribe(self, symbols: Set[str]) -> None:
+        self._symbols -= symbols
+
+    def next_quote(self, symbol: str) -> Quote:
+        records = self._recorded.get(symbol)
+        if records:
+            index = self._position.get(symbol, 0)
+            self._position[symbol] = (index + 1) % len(records)
+            record = records[index]
+            price, bid, ask = record['price'], record.get('bid'), record.get('ask')
+        else:
+            price = self._walk.get(symbol, 100.0) * (1 + self._random.gauss(0, 0.001))
+            self._walk[symbol] = price
+            bid, ask = price * 0.9999, price * 1.0001
+        return Quote(symbol=symbol, price=price, bid=bid, ask=ask,
+                     timestamp=datetime.now(timezone.utc), received_at=time.monotonic())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            for symbol in sorted(self._symbols):
+                try:
+                    await self._on_quote(self.next_quote(symbol))
+                except Exception as e:
+                    logger.error(f"Error replaying quote for {symbol}: {str(e)}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+class QuoteViewer:
+    """One websocket client's quote subscription with a bounded send queue"""
+    def __init__(self, websocket, maxsize: int = MARKET_DATA_VIEWER_QUEUE):
+        self.websocket = websocket
+        self.owner = f"viewer:{id(self)}"
+        self.symbols: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, quote: Quote) -> None:
+        if self.queue.full():
+            # A slow client gets the newest quotes rather than an ever-growing backlog
+            self.queue.get_nowait()
+            WEBSOCKET_QUEUE_DEPTH.labels("quotes").dec()
+            self.dropped += 1
+        self.queue.put_nowait(quote)
+        WEBSOCKET_QUEUE_DEPTH.labels("quotes").inc()
+
+    async def send_forever(self) -> None:
+        while True:
+            quote = await self.queue.get()
+            WEBSOCKET_QUEUE_DEPTH.labels("quotes").dec()
+            await self.websocket.send_text(json.dumps({'type': 'quote', **quote.to_dict()}))
+
+    def discard(self) -> None:
+        WEBSOCKET_QUEUE_DEPTH.labels("quotes").dec(self.queue.qsize())
+
+class MarketDataService:
+    """Single upstream quote subscription shared by alerts, positions and viewers
+
+    Each interested party ("owner") registers the symbols it needs; the feed is
+    subscribed to the union of them. Incoming quotes update the last-quote table,
+    run the registered listeners (alert evaluation) and are queued to viewers.
+
+    Once attached to a backplane, workers publish the symbols they need on the
+    "market_data" channel and only the worker owning that key runs the upstream
+    feed, for the union of them; it relays every quote to all workers.
+    """
+    def __init__(self):
+        self.quotes: Dict[str, Quote] = {}
+        self.feed = None
+        self.backplane = None
+        self._started = False
+        self._published: Optional[Set[str]] = None
+        self._worker_symbols: Dict[str, Set[str]] = {}  # worker -> symbols, with a backplane
+        self._owners: Dict[str, Set[str]] = {}        # symbol -> owners
+        self._owner_symbols: Dict[str, Set[str]] = {}  # owner -> symbols
+        self._subscribed: Set[str] = set()
+        self._listeners: List[QuoteHandler] = []
+        self._viewers: Dict[str, QuoteViewer] = {}
+        self._last_requested: Dict[str, float] = {}
+        self._sync_lock = asyncio.Lock()
+        self._feed_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._positions_source: Optional[Callable[[], Awaitable[List[str]]]] = None
+
+    def _create_feed(self):
+        if MARKET_DATA_FEED == 'replay':
+            return ReplayQuoteFeed(MARKET_DATA_REPLAY_FILE)
+        if MARKET_DATA_FEED == 'alpaca':
+            return AlpacaQuoteFeed()
+        return None
+
+    async def attach(self, backplane) -> None:
+        """Run one feed for all workers; call before backplane.start()"""
+        self.backplane = backplane
+        await backplane.subscribe("market_data", self._on_event)
+        backplane.on_members(self._on_members)
+
+    async def start(self, positions_source: Optional[Callable[[], Awaitable[List[str]]]] = None) -> None:
+        """Connect the feed (on the worker that runs it); `positions_source` returns the symbols of open positions"""
+        self._positions_source = positions_source
+        self._started = True
+        await self._update_feed()
+        if MARKET_DATA_FEED in ('alpaca', 'replay'):
+            await self._sync()
+            self._tasks.append(asyncio.create_task(self._housekeeping()))
+
+    async def _update_feed(self) -> None:
+        """Run the feed on this worker if and only if it is the feed's worker"""
+        async with self._feed_lock:
+            owns_feed = self.backplane is None or self.backplane.owns("market_data")
+            if owns_feed and self.feed is None:
+                await self._start_feed()
+            elif not owns_feed and self.feed is not None:
+                await self._stop_feed()
+
+    async def _start_feed(self) -> None:
+        try:
+            # Creating the Alpaca feed imports the SDK
+            feed = await asyncio.to_thread(self._create_feed)
+            if feed is None:
+                return
+            await feed.start(self._on_feed_quote)
+        except Exception as e:
+            logger.error(f"Error creating market data feed: {str(e)}")
+            return
+        self.feed = feed
+        await self._sync_feed()
+
+    async def _stop_feed(self) -> None:
+        feed, self.feed = self.feed, None
+        self._subscribed = set()
+        if feed is not None:
+            await feed.stop()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        async with self._feed_lock:
+            await self._stop_feed()
+
+    def add_listener(self, listener: QuoteHandler) -> None:
+        self._listeners.append(listener)
+
+    async def set_symbols(self, owner: str, symbols: Iterable[str]) -> None:
+        """Replace the set of symbols `owner` needs quotes for"""
+        new = set(symbols)
+        old = self._owner_symbols.get(owner, set())
+        for symbol in old - new:
+            self._owners[symbol].discard(owner)
+            if not self._owners[symbol]:
+                del self._owners[symbol]
+        for symbol in new - old:
+            self._owners.setdefault(symbol, set()).add(owner)
+        if new:
+            self._owner_symbols[owner] = new
+        else:
+            self._owner_symbols.pop(owner, None)
+        if new != old:
+            await self._sync()
+
+    async def touch(self, symbol: str) -> bool:
+        """Keep `symbol` subscribed while it is being requested over REST
+
+        False, without subscribing, for a new symbol once MARKET_DATA_REQUEST_MAX_SYMBOLS are kept.
+        """
+        if symbol not in self._last_requested and len(self._last_requested) >= MARKET_DATA_REQUEST_MAX_SYMBOLS:
+            return False
+        self._last_requested[symbol] = time.monotonic()
+        await self.set_symbols('requests', self._last_requested)
+        return True
+
+    def get_quote(self, symbol: str, max_age: float = MARKET_DATA_STALE_SECONDS) -> Optional[Quote]:
+        quote = self.quotes.get(symbol)
+        if quote is None or time.monotonic() - quote.received_at > max_age:
+            return None
+        return quote
+
+    async def _sync(self, force: bool = False) -> None:
+        """Bring the upstream subscription in line with the union of owners' symbols"""
+        wanted = set(self._owners)
+        for symbol in set(self.quotes) - wanted:
+            del self.quotes[symbol]
+        if not self._started:
+            return
+        if self.backplane is None:
+            await self._sync_feed()
+        elif force or wanted != self._published:
+            self._published = wanted
+            # The echo updates this worker's entry and, on the feed's worker, the subscription
+            await self.backplane.publish("market_data", {
+                'op': 'symbols', 'worker': self.backplane.worker_id, 'symbols': sorted(wanted)
+            })
+
+    async def _sync_feed(self) -> None:
+        if self.feed is None:
+            return
+        async with self._sync_lock:
+            if self.backplane is None:
+                wanted = set(self._owners)
+            else:
+                wanted = set().union(*self._worker_symbols.values())
+            added, removed = wanted - self._subscribed, self._subscribed - wanted
+            try:
+                if removed:
+                    await self.feed.unsubscribe(removed)
+                if added:
+                    await self.feed.subscribe(added)
+                self._subscribed = wanted
+            except Exception as e:
+                logger.error(f"Error updating market data subscription: {str(e)}")
+
+    async def _on_event(self, event: Dict) -> None:
+        if event['op'] == 'symbols':
+            self._worker_symbols[event['worker']] = set(event['symbols'])
+            await self._sync_feed()
+        elif event['op'] == 'quote':
+            if event['symbol'] in self._owners:
+                await self._on_quote(Quote(
+                    symbol=event['symbol'], price=event['price'], bid=event['bid'], ask=event['ask'],
+                    timestamp=datetime.fromisoformat(event['timestamp']), received_at=time.monotonic()
+                ))
+
+    async def _on_members(self, members: List[str]) -> None:
+        for worker in set(self._worker_symbols) - set(members):
+            del self._worker_symbols[worker]
+        if not self._started:
+            return
+        # The feed's worker may have changed, and new workers need every worker's symbols
+        await self._update_feed()
+        await self._sync(force=True)
+
+    async def _on_feed_quote(self, quote: Quote) -> None:
+        if self.backplane is None:
+            await self._on_quote(quote)
+            return
+        await self.backplane.publish("market_data", {'op': 'quote', **quote.to_dict()})
+
+    async def _on_quote(self, quote: Quote) -> None:
+        self.quotes[quote.symbol] = quote
+        for listener in self._listeners:
+            try:
+                await listener(quote)
+            except Exception as e:
+                logger.error(f"Error in market data listener: {str(e)}")
+        for viewer in self._viewers.values():
+            if quote.symbol in viewer.symbols:
+                viewer.push(quote)
+
+    async def _housekeeping(self) -> None:
+        """Refresh position symbols and drop symbols no longer requested over REST"""
+        while True:
+            if self._positions_source is not None:
+                try:
+                    await self.set_symbols('positions', await self._positions_source())
+                except Exception as e:
+                    logger.error(f"Error refreshing position symbols: {str(e)}")
+            cutoff = time.monotonic() - MARKET_DATA_IDLE_SECONDS
+            idle = [symbol for symbol, seen in self._last_requested.items() if seen < cutoff]
+            if idle:
+                for symbol in idle:
+                    del self._last_requested[symbol]
+                await self.set_symbols('requests', self._last_requested)
+            await asyncio.sleep(MARKET_DATA_POSITIONS_REFRESH)
+
+    async def add_viewer(self, websocket) -> QuoteViewer:
+        viewer = QuoteViewer(websocket)
+        self._viewers[viewer.owner] = viewer
+        WEBSOCKET_CONNECTIONS.labels("quotes").set(len(self._viewers))
+        return viewer
+
+    async def set_viewer_symbols(self, viewer: QuoteViewer, symbols: Iterable[str]) -> None:
+        """Replace what a viewer watches; ValueError beyond MARKET_DATA_VIEWER_MAX_SYMBOLS"""
+        symbols = set(symbols)
+        if len(symbols) > MARKET_DATA_VIEWER_MAX_SYMBOLS:
+            raise ValueError(f"At most {MARKET_DATA_VIEWER_MAX_SYMBOLS} symbols per connection")
+        viewer.symbols = symbols
+        await self.set_symbols(viewer.owner, viewer.symbols)
+        # Start the client off with the last known quotes
+        for symbol in viewer.symbols:
+            if symbol in self.quotes:
+                viewer.push(self.quotes[symbol])
+
+    async def remove_viewer(self, viewer: QuoteViewer) -> None:
+        self._viewers.pop(viewer.owner, None)
+        viewer.discard()
+        WEBSOCKET_CONNECTIONS.labels("quotes").set(len(self._viewers))
+        await self.set_symbols(viewer.owner, ())
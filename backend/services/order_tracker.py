@@ -0,0 +1,266 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from services.metrics import WEBSOCKET_CONNECTIONS
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+ORDER_UPDATES_FEED = os.getenv("ORDER_UPDATES_FEED", "alpaca")  # alpaca, fake or off
+ORDER_FAKE_FILL_DELAY = float(os.getenv("ORDER_FAKE_FILL_DELAY", "0.5"))
+ORDER_TRACKER_MAX_CLOSED = int(os.getenv("ORDER_TRACKER_MAX_CLOSED", "1000"))
+# The stream can miss events across a reconnect: open orders are read from the broker once
+# their state is this old, and the order list is reloaded on this interval
+ORDER_TRACKER_TTL_SECONDS = float(os.getenv("ORDER_TRACKER_TTL_SECONDS", "30"))
+ORDER_TRACKER_RESYNC_SECONDS = float(os.getenv("ORDER_TRACKER_RESYNC_SECONDS", "300"))
+
+CLOSED_STATUSES = {'filled', 'canceled', 'expired', 'rejected', 'replaced', 'done_for_day'}
+FILL_EVENTS = {'fill', 'partial_fill'}
+
+UpdateHandler = Callable[[str, Dict], Awaitable[None]]
+
+class AlpacaTradeUpdateFeed:
+    """Order events from Alpaca's trade_updates stream"""
+    def __init__(self):
+        from alpaca.trading.stream import TradingStream
+        from services.broker_clients import env_credentials
+        credentials = env_credentials()
+        self._stream = TradingStream(
+            api_key=credentials.api_key,
+            secret_key=credentials.secret_key,
+            paper=credentials.paper,
+            url_override=os.getenv('ALPACA_TRADE_STREAM_URL')
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, on_update: UpdateHandler) -> None:
+        from services.trading_service import order_to_dict
+        loop = asyncio.get_running_loop()
+
+        async def handle(update) -> None:
+            # Called on the stream's own event loop; the tracker lives on the server's
+            event = update.event.value if hasattr(update.event, 'value') else str(update.event)
+            future = asyncio.run_coroutine_threadsafe(on_update(event, order_to_dict(update.order)), loop)
+            await asyncio.wrap_future(future)
+
+        self._stream.subscribe_trade_updates(handle)
+        # run() blocks with its own event loop and reconnects by itself
+        self._task = asyncio.create_task(asyncio.to_thread(self._stream.run))
+
+    async def order_placed(self, order: Dict) -> None:
+        """The broker reports new orders itself"""
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            try:
+                await asyncio.to_thread(self._stream.stop)
+            except Exception as e:
+                logger.error(f"Error stopping trade updates stream: {str(e)}")
+            self._task.cancel()
+
+class FakeTradeUpdateFeed:
+    """Local stand-in for the trade_updates stream
+
+    Every placed order is reported as new, then filled in full after `fill_delay`
+    seconds at the price returned by `price_source` (the order's own average
+    fill price, if any, when that returns None).
+    """
+    def __init__(self, fill_delay: float = ORDER_FAKE_FILL_DELAY,
+                 price_source: Optional[Callable[[str], Optional[float]]] = None):
+        self.fill_delay = fill_delay
+        self.price_source = price_source
+        self._tasks = set()
+
+    async def start(self, on_update: UpdateHandler) -> None:
+        self._on_update = on_update
+
+    async def order_placed(self, order: Dict) -> None:
+        task = asyncio.create_task(self._lifecycle(dict(order)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _lifecycle(self, order: Dict) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        await self._on_update('new', {**order, 'status': 'new', 'updated_at': now})
+        await asyncio.sleep(self.fill_delay)
+        price = self.price_source(order['symbol']) if self.price_source else None
+        now = datetime.now(timezone.utc).isoformat()
+        await self._on_update('fill', {
+            **order, 'status': 'filled', 'filled_qty': order['quantity'],
+            'filled_avg_price': price if price is not None else order.get('filled_avg_price', 0),
+            'filled_at': now, 'updated_at': now
+        })
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+class OrderTracker:
+    """In-memory order state kept current by the broker's trade-update stream
+
+    Order reads are served from the table; orders the tracker has never seen, and
+    open ones not confirmed for ORDER_TRACKER_TTL_SECONDS, fall back to the
+    broker. Fill events are pushed to the order websockets of the user who placed
+    the order; fills of orders placed elsewhere go only to the users assigned to
+    the account by `account_users`. Closed orders beyond ORDER_TRACKER_MAX_CLOSED
+    are forgotten, oldest first.
+    """
+    def __init__(self, account_users: Optional[Callable[[], Iterable[str]]] = None):
+        self.orders: "OrderedDict[str, Dict]" = OrderedDict()
+        self.feed = None
+        self.synced = False
+        self.account_users = account_users
+        self.backplane = None
+        self._closed = 0
+        self._confirmed: Dict[str, float] = {}
+        self._owners: Dict[str, str] = {}
+        self._websockets: Dict[str, Set] = {}
+
+    def _create_feed(self, price_source):
+        if ORDER_UPDATES_FEED == 'fake':
+            return FakeTradeUpdateFeed(price_source=price_source)
+        if ORDER_UPDATES_FEED == 'alpaca':
+            return AlpacaTradeUpdateFeed()
+        return None
+
+    async def attach(self, backplane) -> None:
+        """Share who placed each order with the other workers; call before backplane.start()"""
+        self.backplane = backplane
+        await backplane.subscribe("orders", self._on_owner_event)
+
+    async def _on_owner_event(self, event: Dict) -> None:
+        self._owners[event['order_id']] = event['owner']
+
+    async def start(self, snapshot_source: Optional[Callable[[], Awaitable[List[Dict]]]] = None,
+                    price_source: Optional[Callable[[str], Optional[float]]] = None) -> None:
+        """Subscribe to order updates, then load existing orders once from `snapshot_source`"""
+        try:
+            self.feed = await asyncio.to_thread(self._create_feed, price_source)
+            if self.feed is None:
+                return
+            await self.feed.start(self._on_update)
+        except Exception as e:
+            logger.error(f"Error starting order updates feed: {str(e)}")
+            self.feed = None
+            return
+        if snapshot_source is None:
+            self.synced = True
+            return
+        if not await self._load(snapshot_source):
+            return
+        self.synced = True
+        while True:
+            await asyncio.sleep(ORDER_TRACKER_RESYNC_SECONDS)
+            await self._load(snapshot_source)
+
+    async def _load(self, snapshot_source: Callable[[], Awaitable[List[Dict]]]) -> bool:
+        """Merge the broker's order list into the table; False if it could not be read"""
+        try:
+            snapshot = await snapshot_source()
+        except Exception as e:
+            logger.error(f"Error loading orders: {str(e)}")
+            return False
+        # The broker lists newest first; store oldest first so eviction drops the oldest
+        for order in reversed(snapshot):
+            current = self.orders.get(order['order_id'])
+            # Updates that arrived while the snapshot loaded are newer
+            if current is None or (order.get('updated_at') or '') > (current.get('updated_at') or ''):
+                self._store(order)
+            else:
+                self._confirmed[order['order_id']] = time.monotonic()
+        return True
+
+    async def stop(self) -> None:
+        if self.feed is not None:
+            await self.feed.stop()
+
+    def _store(self, order: Dict) -> None:
+        order_id = order['order_id']
+        previous = self.orders.pop(order_id, None)
+        if previous is not None and previous['status'] in CLOSED_STATUSES:
+            self._closed -= 1
+        self.orders[order_id] = order
+        self._confirmed[order_id] = time.monotonic()
+        if order['status'] in CLOSED_STATUSES:
+            self._closed += 1
+        if self._closed > ORDER_TRACKER_MAX_CLOSED:
+            for stale_id in [oid for oid, o in self.orders.items() if o['status'] in CLOSED_STATUSES]:
+                if self._closed <= ORDER_TRACKER_MAX_CLOSED:
+                    break
+                del self.orders[stale_id]
+                self._confirmed.pop(stale_id, None)
+                self._owners.pop(stale_id, None)
+                self._closed -= 1
+
+    async def record(self, order: Dict, owner: Optional[str] = None) -> None:
+        """Track an order just placed through this server by `owner`"""
+        if owner is not None:
+            self._owners[order['order_id']] = owner
+            if self.backplane is not None:
+                await self.backplane.publish("orders", {'order_id': order['order_id'], 'owner': owner})
+        self._store(order)
+        if self.feed is not None:
+            await self.feed.order_placed(order)
+
+    def refresh(self, order: Dict) -> None:
+        """Store an order as just read from the broker"""
+        self._store(order)
+
+    def get(self, order_id: str) -> Optional[Dict]:
+        """The tracked order, unless it is open and its state may be stale"""
+        order = self.orders.get(order_id)
+        if order is None or order['status'] in CLOSED_STATUSES:
+            return order
+        if time.monotonic() - self._confirmed.get(order_id, 0.0) > ORDER_TRACKER_TTL_SECONDS:
+            return None
+        return order
+
+    def list(self, status: Optional[str] = None) -> List[Dict]:
+        """Most recently updated first; status is 'open' (default), 'closed', 'all' or an exact order status"""
+        orders = reversed(self.orders.values())
+        status = status or 'open'
+        if status == 'all':
+            return list(orders)
+        if status == 'open':
+            return [o for o in orders if o['status'] not in CLOSED_STATUSES]
+        if status == 'closed':
+            return [o for o in orders if o['status'] in CLOSED_STATUSES]
+        return [o for o in orders if o['status'] == status]
+
+    async def _on_update(self, event: str, order: Dict) -> None:
+        self._store(order)
+        if event in FILL_EVENTS:
+            owner = self._owners.get(order['order_id'])
+            if owner is not None:
+                recipients = [owner]
+            else:
+                recipients = list(self.account_users()) if self.account_users else []
+            await self._send(recipients, {'type': 'order_fill', 'event': event, **order})
+
+    def _count_websockets(self) -> None:
+        WEBSOCKET_CONNECTIONS.labels("orders").set(sum(len(s) for s in self._websockets.values()))
+
+    async def add_websocket(self, websocket, username: str) -> None:
+        self._websockets.setdefault(username, set()).add(websocket)
+        self._count_websockets()
+
+    async def remove_websocket(self, websocket, username: str) -> None:
+        sockets = self._websockets.get(username)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self._websockets[username]
+        self._count_websockets()
+
+    async def _send(self, usernames: List[str], message: Dict) -> None:
+        text = json.dumps(message)
+        for username in usernames:
+            for websocket in list(self._websockets.get(username, ())):
+                try:
+                    await websocket.send_text(text)
+                except Exception:
+                    await self.remove_websocket(websocket, username)
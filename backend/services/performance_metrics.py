@@ -0,0 +1,132 @@
+import numpy as np
+from typing import Dict, Optional
+
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.02
+
+# Every kernel works along the last axis, so a (paths x trades) matrix gives one
+# metric set per row in the same number of NumPy calls as a single trade list.
+
+def _ratio(numerator, denominator, default=0.0):
+    """Elementwise numerator / denominator, `default` where the denominator is zero"""
+    numerator, denominator = np.asarray(numerator, dtype=np.float64), np.asarray(denominator, dtype=np.float64)
+    out = np.full(np.broadcast(numerator, denominator).shape, default)
+    return np.divide(numerator, denominator, out=out, where=denominator != 0)
+
+def drawdowns(equity: np.ndarray) -> np.ndarray:
+    """Distance below the running peak at each point"""
+    return np.maximum.accumulate(equity, axis=-1) - equity
+
+def max_drawdown(equity: np.ndarray, start: Optional[float] = None):
+    """Largest absolute drawdown and the same as a fraction of its peak
+
+    `start`, if given, is an equity value preceding the curve that counts as a peak.
+    """
+    peak = np.maximum.accumulate(equity, axis=-1)
+    if start is not None:
+        peak = np.maximum(peak, start)
+    depth = peak - equity
+    return depth.max(axis=-1), _ratio(depth, peak).max(axis=-1)
+
+def longest_run(mask: np.ndarray) -> np.ndarray:
+    """Length of the longest run of True values"""
+    if mask.shape[-1] == 0:
+        return np.zeros(mask.shape[:-1], dtype=np.int64)
+    count = np.cumsum(mask, axis=-1)
+    reset = np.maximum.accumulate(np.where(mask, 0, count), axis=-1)
+    return (count - reset).max(axis=-1)
+
+def _risk_ratios(returns: np.ndarray, risk_free_rate: float, periods_per_year: int):
+    """Annualized (Sharpe, Sortino) from one pass over the excess returns"""
+    n = returns.shape[-1]
+    if n < 2:
+        zero = np.zeros(returns.shape[:-1])
+        return zero, zero
+    excess = returns - risk_free_rate / periods_per_year
+    mean = excess.sum(axis=-1) / n
+    deviation = excess - mean[..., None]
+    std = np.sqrt(np.einsum('...i,...i->...', deviation, deviation) / (n - 1))
+    downside = np.minimum(excess, 0.0)
+    downside = np.sqrt(np.einsum('...i,...i->...', downside, downside) / n)
+    scale = np.sqrt(periods_per_year)
+    return scale * _ratio(mean, std), scale * _ratio(mean, downside)
+
+def sharpe_ratio(returns: np.ndarray, risk_free_rate: float = RISK_FREE_RATE,
+                 periods_per_year: int = TRADING_DAYS):
+    return _risk_ratios(returns, risk_free_rate, periods_per_year)[0]
+
+def sortino_ratio(returns: np.ndarray, risk_free_rate: float = RISK_FREE_RATE,
+                  periods_per_year: int = TRADING_DAYS):
+    return _risk_ratios(returns, risk_free_rate, periods_per_year)[1]
+
+def trade_metrics_batch(profits: np.ndarray, initial_capital: float,
+                        risk_free_rate: float = RISK_FREE_RATE) -> Dict[str, np.ndarray]:
+    """Trade statistics for each row of a (sets x trades) profit matrix
+
+    Sharpe and Sortino treat each trade's profit as one period's return, as the
+    backtester always has; drawdowns come from the closed-trade equity curve.
+    """
+    profits = np.ascontiguousarray(profits, dtype=np.float64)
+    n = profits.shape[-1]
+    wins = profits > 0
+    losses = profits < 0
+    win_count = np.count_nonzero(wins, axis=-1)
+    loss_count = np.count_nonzero(losses, axis=-1)
+    win_sum = np.maximum(profits, 0.0).sum(axis=-1)
+    loss_sum = np.minimum(profits, 0.0).sum(axis=-1)
+    equity = initial_capital + np.cumsum(profits, axis=-1)
+    total = equity[..., -1] - initial_capital if n else np.zeros(profits.shape[:-1])
+    drawdown, drawdown_pct = max_drawdown(equity, initial_capital) if n else (total, total)
+    sharpe, sortino = _risk_ratios(profits, risk_free_rate, TRADING_DAYS)
+    return {
+        'total_trades': np.full(profits.shape[:-1], n),
+        'winning_trades': win_count,
+        'losing_trades': loss_count,
+        'win_rate': _ratio(win_count, n),
+        'average_win': _ratio(win_sum, win_count),
+        'average_loss': _ratio(loss_sum, loss_count),
+        'profit_factor': np.abs(_ratio(win_sum, loss_sum, -np.inf)),
+        'total_profit': total,
+        'expectancy': _ratio(total, n),
+        'max_drawdown': drawdown,
+        'max_drawdown_pct': drawdown_pct,
+        'sharpe_ratio': sharpe,
+        'sortino_ratio': sortino,
+        # Return on initial capital per unit of peak-relative drawdown
+        'calmar_ratio': _ratio(total / initial_capital, drawdown_pct),
+        'max_consecutive_wins': longest_run(wins),
+        'max_consecutive_losses': longest_run(losses),
+    }
+
+def trade_metrics(profits, initial_capital: float, risk_free_rate: float = RISK_FREE_RATE) -> Dict:
+    """Trade statistics for one list of closed-trade profits, as plain floats"""
+    batch = trade_metrics_batch(np.asarray(profits, dtype=np.float64)[None, :], initial_capital, risk_free_rate)
+    return {name: value[0].item() for name, value in batch.items()}
+
+def equity_metrics(equity, risk_free_rate: float = RISK_FREE_RATE, periods_per_year: int = TRADING_DAYS,
+                   exposure: Optional[float] = None) -> Dict:
+    """Return-based statistics for an equity curve sampled once per period"""
+    equity = np.ascontiguousarray(equity, dtype=np.float64)
+    if len(equity) < 2:
+        return {
+            'total_return': 0.0, 'annualized_return': 0.0, 'volatility': 0.0,
+            'sharpe_ratio': 0.0, 'sortino_ratio': 0.0, 'max_drawdown': 0.0,
+            'max_drawdown_pct': 0.0, 'calmar_ratio': 0.0, 'exposure': exposure or 0.0,
+        }
+    returns = np.diff(equity) / equity[:-1]
+    total_return = equity[-1] / equity[0] - 1
+    growth = max(equity[-1] / equity[0], 0.0)
+    annualized = growth ** (periods_per_year / len(returns)) - 1
+    drawdown, drawdown_pct = max_drawdown(equity)
+    sharpe, sortino = _risk_ratios(returns, risk_free_rate, periods_per_year)
+    return {
+        'total_return': float(total_return),
+        'annualized_return': float(annualized),
+        'volatility': float(returns.std(ddof=1) * np.sqrt(periods_per_year)),
+        'sharpe_ratio': float(sharpe),
+        'sortino_ratio': float(sortino),
+        'max_drawdown': float(drawdown),
+        'max_drawdown_pct': float(drawdown_pct),
+        'calmar_ratio': float(_ratio(annualized, drawdown_pct)),
+        'exposure': exposure if exposure is not None else 1.0,
+    }
@@ -0,0 +1,210 @@
+import pandas as pd
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+from services.backtester import BacktestResult, yfinance_bars, bars_to_frame
+from services.bar_store import to_epoch_ms
+from services.execution import ExecutionModel
+from services.performance_metrics import equity_metrics, trade_metrics
+import asyncio
+import os
+
+PORTFOLIO_FETCH_CONCURRENCY = int(os.getenv("PORTFOLIO_FETCH_CONCURRENCY", "8"))
+
+class PortfolioBacktester:
+    """Backtest one strategy over a basket of symbols sharing a single capital pool
+
+    Bars for every symbol are aligned onto a common time index as (bars x symbols)
+    arrays, so signals, exits, entries and marking to market are vectorized across
+    symbols and only the time axis is iterated.
+    """
+    def __init__(self, strategy_script: str, symbols: List[str], timeframe: str = "1d",
+                 initial_capital: float = 10000.0, position_size: float = 0.1,
+                 max_positions: Optional[int] = None, max_gross_exposure: float = 1.0,
+                 execution: Optional[ExecutionModel] = None):
+        self.execution = execution or ExecutionModel()
+        if self.execution.uses_bar_range or self.execution.sizing != 'percent_equity':
+            raise ValueError("Portfolio backtests support fees, slippage and percent_equity sizing only")
+        self.strategy_script = strategy_script
+        self.symbols = list(dict.fromkeys(symbols))
+        self.timeframe = timeframe
+        self.initial_capital = initial_capital
+        self.position_size = position_size
+        self.max_positions = max_positions or len(self.symbols)
+        self.max_gross_exposure = max_gross_exposure
+        self.capital = initial_capital
+        self.trades = []
+
+    def _history(self, symbol: str, start_date: datetime, end_date: datetime) -> pd.DataFrame:
+        return bars_to_frame(yfinance_bars.get_bars(symbol, self.timeframe,
+                                                    to_epoch_ms(start_date), to_epoch_ms(end_date)))
+
+    async def fetch_data(self, start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None) -> pd.DataFrame:
+        """Close prices for all symbols on their union time index (NaN where a symbol has no bar)"""
+        if not start_date:
+            start_date = datetime.now() - timedelta(days=365)
+        if not end_date:
+            end_date = datetime.now()
+        semaphore = asyncio.Semaphore(PORTFOLIO_FETCH_CONCURRENCY)
+
+        async def fetch(symbol: str) -> pd.Series:
+            async with semaphore:
+                df = await asyncio.to_thread(self._history, symbol, start_date, end_date)
+            return df['Close'] if not df.empty else pd.Series(dtype=np.float64)
+
+        closes = await asyncio.gather(*(fetch(symbol) for symbol in self.symbols))
+        return pd.concat(dict(zip(self.symbols, closes)), axis=1).sort_index()
+
+    def generate_signals(self, close: np.ndarray, prev_close: np.ndarray):
+        """
+        Placeholder signal logic as (buy, sell) boolean arrays shaped like `close`.
+        This should be replaced with actual strategy logic parsed from Pine Script.
+        """
+        with np.errstate(invalid='ignore'):
+            return close > prev_close, close < prev_close
+
+    async def run_backtest(self, start_date: Optional[datetime] = None,
+                           end_date: Optional[datetime] = None,
+                           progress_callback: Optional[Callable[[int, int, int], None]] = None,
+                           progress_every: int = 1000) -> BacktestResult:
+        """Run the portfolio backtest; the callback works as in Backtester.run_backtest"""
+        data = await self.fetch_data(start_date, end_date)
+        return self.simulate(data, progress_callback, progress_every)
+
+    def simulate(self, data: pd.DataFrame,
+                 progress_callback: Optional[Callable[[int, int, int], None]] = None,
+                 progress_every: int = 1000) -> BacktestResult:
+        """Simulate over aligned close prices (rows: bars, columns: self.symbols)"""
+        result = BacktestResult()
+        times = data.index
+        raw = data.reindex(columns=self.symbols).to_numpy(dtype=np.float64)
+        # Carry the last price forward for marking to market; signals only fire on real bars
+        filled = pd.DataFrame(raw).ffill().to_numpy()
+        prev = np.vstack([np.full((1, raw.shape[1]), np.nan), filled[:-1]])
+        buy, sell = self.generate_signals(raw, prev)
+        total_bars, n = raw.shape
+
+        fees, slippage = self.execution.fees, self.execution.slippage
+        fraction = self.execution.sizing_value or self.position_size
+        side = np.zeros(n, dtype=np.int8)       # 1 long, -1 short, 0 flat
+        units = np.zeros(n)
+        entry = np.zeros(n)
+        entry_fee = np.zeros(n)
+        open_trade = np.full(n, -1, dtype=np.int64)
+        equity = np.empty(total_bars)
+        gross_value = np.empty(total_bars)
+        symbol_profit = np.zeros(n)
+        symbol_wins = np.zeros(n, dtype=np.int64)
+        symbol_closed = np.zeros(n, dtype=np.int64)
+
+        for i in range(total_bars):
+            if progress_callback and i and i % progress_every == 0:
+                progress_callback(i, total_bars, len(self.trades))
+            price = raw[i]
+
+            # Exits: longs on a sell signal, shorts on a buy signal
+            exiting = ((side == 1) & sell[i]) | ((side == -1) & buy[i])
+            if exiting.any():
+                idx = np.flatnonzero(exiting)
+                exit_price = slippage.fill_price(price[idx], -side[idx])
+                exit_fee = fees.cost(exit_price, units[idx])
+                profit = (exit_price - entry[idx]) * units[idx] * side[idx] - entry_fee[idx] - exit_fee
+                self.capital += profit.sum()
+                symbol_profit[idx] += profit
+                symbol_wins[idx] += profit > 0
+                symbol_closed[idx] += 1
+                for j, p, x, f in zip(idx, profit, exit_price, exit_fee):
+                    self.trades[open_trade[j]].update({
+                        'exit_price': float(x),
+                        'exit_time': times[i],
+                        'fees': float(entry_fee[j] + f),
+                        'profit': float(p)
+                    })
+                side[idx] = 0
+                units[idx] = 0.0
+                entry_fee[idx] = 0.0
+                open_trade[idx] = -1
+
+            # Entries: flat symbols with a signal, strongest move first, within position limits;
+            # a symbol closed on this bar is not reopened on the same signal
+            wants = (side == 0) & ~exiting & (buy[i] | sell[i])
+            if wants.any():
+                mark = filled[i]
+                gross = np.nansum(np.abs(units * mark))
+                slots = self.max_positions - int(np.count_nonzero(side))
+                budget = self.max_gross_exposure * self.capital - gross
+                per_position = fraction * self.capital
+                slots = min(slots, int(budget // per_position)) if per_position > 0 else 0
+                if slots > 0:
+                    idx = np.flatnonzero(wants)
+                    strength = np.abs(price[idx] / prev[i, idx] - 1.0)
+                    idx = idx[np.argsort(-strength, kind='stable')][:slots]
+                    direction = np.where(buy[i, idx], 1, -1).astype(np.int8)
+                    side[idx] = direction
+                    entry[idx] = slippage.fill_price(price[idx], direction)
+                    units[idx] = per_position / entry[idx]
+                    entry_fee[idx] = fees.cost(entry[idx], units[idx])
+                    for j, d in zip(idx, direction):
+                        open_trade[j] = len(self.trades)
+                        self.trades.append({
+                            'symbol': self.symbols[j],
+                            'type': 'buy' if d == 1 else 'sell',
+                            'entry_price': float(entry[j]),
+                            'entry_time': times[i],
+                            'size': float(units[j]),
+                            'fees': float(entry_fee[j])
+                        })
+
+            unrealized = np.nansum((filled[i] - entry) * units * side - entry_fee)
+            equity[i] = self.capital + unrealized
+            gross_value[i] = np.nansum(np.abs(units * filled[i]))
+
+        if progress_callback:
+            progress_callback(total_bars, total_bars, len(self.trades))
+
+        result.trades = self.trades
+        result.equity_curve = equity.tolist()
+        running_max = np.maximum.accumulate(equity) if total_bars else equity
+        drawdowns = equity - running_max
+        result.drawdowns = drawdowns.tolist()
+        result.metrics = self.calculate_metrics(equity, gross_value)
+        result.symbol_metrics = {
+            symbol: {
+                'total_trades': int(symbol_closed[j]),
+                'winning_trades': int(symbol_wins[j]),
+                'win_rate': float(symbol_wins[j] / symbol_closed[j]) if symbol_closed[j] else 0,
+                'total_profit': float(symbol_profit[j]),
+                'open_position': int(side[j]),
+            }
+            for j, symbol in enumerate(self.symbols)
+        }
+        return result
+
+    def calculate_metrics(self, equity: np.ndarray, gross: np.ndarray,
+                          risk_free_rate: float = 0.02) -> Dict:
+        """Aggregate metrics from the marked-to-market equity curve and closed trades
+
+        Ratios come from per-bar equity returns; `gross` is the gross position value
+        per bar, averaged against equity as the exposure.
+        """
+        profits = [t['profit'] for t in self.trades if 'profit' in t]
+        metrics = trade_metrics(profits, self.initial_capital, risk_free_rate)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exposure = float(np.mean(gross / equity)) if len(equity) else 0.0
+        curve = equity_metrics(np.concatenate([[self.initial_capital], equity]), risk_free_rate,
+                               exposure=exposure)
+        metrics.update({
+            'symbols': len(self.symbols),
+            'final_equity': float(equity[-1]) if len(equity) else self.initial_capital,
+            'total_return': curve['total_return'],
+            'annualized_return': curve['annualized_return'],
+            'volatility': curve['volatility'],
+            'max_drawdown': curve['max_drawdown'],
+            'max_drawdown_pct': curve['max_drawdown_pct'],
+            'sharpe_ratio': curve['sharpe_ratio'],
+            'sortino_ratio': curve['sortino_ratio'],
+            'calmar_ratio': curve['calmar_ratio'],
+            'exposure': exposure,
+        })
+        return metrics
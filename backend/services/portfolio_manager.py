@@ -4,8 +4,11 @@ import pandas as pd
 import numpy as np
 from dataclasses import dataclass
 from pycoingecko import CoinGeckoAPI
+import asyncio
 import os
 from dotenv import load_dotenv
+from services.metrics import upstream_timer
+from services.performance_metrics import equity_metrics
 
 load_dotenv()
 
@@ -35,13 +38,20 @@ class PortfolioManager:
         self.positions: Dict[str, Position] = {}
         self.trades_history: List[Dict] = []
         self.cg = CoinGeckoAPI(api_key=os.getenv('COINGECKO_API_KEY'))
+        if os.getenv('COINGECKO_API_URL'):
+            self.cg.api_base_url = os.getenv('COINGECKO_API_URL')
         self.symbol_to_id_map = {}
-        self._init_coin_map()
+        
+    async def initialize(self) -> None:
+        """Load the coin map off the event loop; called from the app's startup task"""
+        if not self.symbol_to_id_map:
+            await asyncio.to_thread(self._init_coin_map)
         
     def _init_coin_map(self):
         """Initialize the symbol to CoinGecko ID mapping"""
         try:
-            coins_list = self.cg.get_coins_list()
+            with upstream_timer("coingecko", "get_coins_list"):
+                coins_list = self.cg.get_coins_list()
             self.symbol_to_id_map = {
                 coin['symbol'].upper(): coin['id'] 
                 for coin in coins_list
@@ -49,20 +59,21 @@ class PortfolioManager:
         except Exception as e:
             print(f"Error initializing coin map: {str(e)}")
             
-    def get_coin_id(self, symbol: str) -> str:
-        """Get CoinGecko ID for a symbol"""
+    async def get_coin_id(self, symbol: str) -> str:
+        """Get CoinGecko ID for a symbol, loading the coin map off the event loop if warm-up failed"""
         symbol = symbol.upper()
+        await self.initialize()
         if symbol not in self.symbol_to_id_map:
             raise ValueError(f"Unsupported cryptocurrency: {symbol}")
         return self.symbol_to_id_map[symbol]
         
-    async def add_position(self, symbol: str, quantity: float, price: float) -> None:
-        """Add a new position or update existing position"""
+    async def add_position(self, symbol: str, quantity: float, price: float, coin_id: Optional[str] = None) -> None:
+        """Add a new position or update existing position; `coin_id` is looked up when not given"""
         cost = quantity * price
         if self.cash < cost:
             raise ValueError("Insufficient funds")
             
-        coin_id = self.get_coin_id(symbol)
+        coin_id = coin_id or await self.get_coin_id(symbol)
         symbol = symbol.upper()
             
         if symbol in self.positions:
@@ -98,6 +109,7 @@ class PortfolioManager:
         self.trades_history.append({
             'type': 'buy',
             'symbol': symbol,
+            'coin_id': coin_id,
             'quantity': quantity,
             'price': price,
             'timestamp': datetime.now()
@@ -137,11 +149,12 @@ class PortfolioManager:
         try:
             # Get current prices for all coins in one API call
             coin_ids = [pos.coin_id for pos in self.positions.values()]
-            prices = self.cg.get_price(
-                ids=coin_ids,
-                vs_currencies='usd',
-                include_24hr_change=True
-            )
+            with upstream_timer("coingecko", "get_price"):
+                prices = self.cg.get_price(
+                    ids=coin_ids,
+                    vs_currencies='usd',
+                    include_24hr_change=True
+                )
             
             for symbol, position in self.positions.items():
                 if position.coin_id in prices:
@@ -209,12 +222,13 @@ class PortfolioManager:
             for symbol in symbols:
                 position = self.positions.get(symbol)
                 if position:
-                    historical_data = self.cg.get_coin_market_chart_by_id(
-                        id=position.coin_id,
-                        vs_currency='usd',
-                        days='max',
-                        interval='daily'
-                    )
+                    with upstream_timer("coingecko", "get_coin_market_chart_by_id"):
+                        historical_data = self.cg.get_coin_market_chart_by_id(
+                            id=position.coin_id,
+                            vs_currency='usd',
+                            days='max',
+                            interval='daily'
+                        )
                     prices = pd.DataFrame(historical_data['prices'], columns=['timestamp', 'price'])
                     prices['timestamp'] = pd.to_datetime(prices['timestamp'], unit='ms')
                     prices.set_index('timestamp', inplace=True)
@@ -254,26 +268,32 @@ class PortfolioManager:
                     
             daily_values.append(portfolio_value)
             
-        daily_returns = pd.Series(daily_values).pct_change().dropna()
-        
         # Calculate metrics
         total_return = (daily_values[-1] - self.initial_capital)
         total_return_percentage = (total_return / self.initial_capital) * 100
         
-        # Sharpe Ratio (assuming risk-free rate of 2%)
-        risk_free_rate = 0.02
-        excess_returns = daily_returns - risk_free_rate/252
-        sharpe_ratio = np.sqrt(252) * excess_returns.mean() / excess_returns.std() if len(excess_returns) > 0 else 0
-        
-        # Maximum Drawdown
-        cumulative_returns = (1 + daily_returns).cumprod()
-        rolling_max = cumulative_returns.expanding().max()
-        drawdowns = cumulative_returns - rolling_max
-        max_drawdown = abs(drawdowns.min()) * 100 if len(drawdowns) > 0 else 0
+        # Sharpe Ratio (assuming risk-free rate of 2%) and maximum drawdown from peak, in percent
+        curve = equity_metrics(np.array(daily_values, dtype=np.float64), risk_free_rate=0.02)
+        sharpe_ratio = curve['sharpe_ratio']
+        max_drawdown = curve['max_drawdown_pct'] * 100
         
-        # Win Rate
-        profitable_trades = sum(1 for trade in self.trades_history if trade['type'] == 'sell' and trade['price'] > trade['price'])
-        total_trades = sum(1 for trade in self.trades_history if trade['type'] == 'sell')
+        # Win Rate: sells above the average cost of the shares held
+        cost = {}
+        held = {}
+        profitable_trades = 0
+        total_trades = 0
+        for trade in self.trades_history:
+            symbol = trade['symbol']
+            if trade['type'] == 'buy':
+                cost[symbol] = cost.get(symbol, 0) + trade['quantity'] * trade['price']
+                held[symbol] = held.get(symbol, 0) + trade['quantity']
+            elif held.get(symbol):
+                average_cost = cost[symbol] / held[symbol]
+                profitable_trades += trade['price'] > average_cost
+                total_trades += 1
+                sold = min(trade['quantity'], held[symbol])
+                cost[symbol] -= sold * average_cost
+                held[symbol] -= sold
         win_rate = (profitable_trades / total_trades * 100) if total_trades > 0 else 0
         
         return {
@@ -0,0 +1,38 @@
+from typing import Any
+from starlette.responses import Response
+from decimal import Decimal
+import orjson
+
+# NumPy arrays and scalars and datetimes are encoded natively by orjson; dict keys
+# may be non-strings (e.g. dates) as with the standard encoder
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _default(value: Any):
+    """Types orjson does not know: pandas values, Decimals, pydantic models, sets"""
+    if hasattr(value, 'isoformat'):
+        # pd.Timestamp; NaT has no meaningful ISO form
+        return None if value != value else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(mode='json')
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes with orjson; NaN and infinity become null"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson
+
+    Return an instance from a route to skip FastAPI's jsonable_encoder pass, which
+    dominates the cost of large list and dict payloads.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
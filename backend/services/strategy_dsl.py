@@ -0,0 +1,323 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import ast
+import re
+
+SERIES = ('open', 'high', 'low', 'close', 'volume')
+
+def _window(values: np.ndarray, length: int) -> np.ndarray:
+    """Trailing windows of `length` as rows; NaN-padded so rows line up with `values`"""
+    length = int(length)
+    if length < 1:
+        raise ValueError("Indicator length must be positive")
+    padded = np.concatenate([np.full(length - 1, np.nan), values.astype(np.float64)])
+    return np.lib.stride_tricks.sliding_window_view(padded, length)
+
+def sma(values: np.ndarray, length: int) -> np.ndarray:
+    return _window(values, length).mean(axis=1)
+
+def ema(values: np.ndarray, length: int) -> np.ndarray:
+    alpha = 2.0 / (int(length) + 1)
+    out = np.empty(len(values))
+    level = np.nan
+    for i, value in enumerate(values.astype(np.float64)):
+        level = value if level != level else level + alpha * (value - level)
+        out[i] = level
+    return out
+
+def rma(values: np.ndarray, length: int) -> np.ndarray:
+    """Wilder's moving average, as Pine's ta.rma: seeded with the SMA of the first `length` values"""
+    length = int(length)
+    if length < 1:
+        raise ValueError("Indicator length must be positive")
+    values = values.astype(np.float64)
+    out = np.full(len(values), np.nan)
+    start = int(np.argmax(~np.isnan(values))) if len(values) else 0
+    if len(values) - start < length:
+        return out
+    level = values[start:start + length].mean()
+    out[start + length - 1] = level
+    alpha = 1.0 / length
+    for i in range(start + length, len(values)):
+        level += alpha * (values[i] - level)
+        out[i] = level
+    return out
+
+def rsi(values: np.ndarray, length: int) -> np.ndarray:
+    """Pine's ta.rsi: Wilder-smoothed average gain over average loss"""
+    delta = np.diff(values.astype(np.float64), prepend=np.nan)
+    gains = rma(np.maximum(delta, 0.0), length)
+    losses = rma(np.maximum(-delta, 0.0), length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(losses == 0, 100.0, 100.0 - 100.0 / (1.0 + gains / losses))
+
+def highest(values: np.ndarray, length: int) -> np.ndarray:
+    return _window(values, length).max(axis=1)
+
+def lowest(values: np.ndarray, length: int) -> np.ndarray:
+    return _window(values, length).min(axis=1)
+
+def stdev(values: np.ndarray, length: int) -> np.ndarray:
+    return _window(values, length).std(axis=1)
+
+def change(values: np.ndarray, length: int = 1) -> np.ndarray:
+    return values - shift(values, length)
+
+def shift(values, bars: int):
+    """values[bars] in Pine terms: the value `bars` bars ago"""
+    if np.isscalar(values):
+        return values
+    bars = int(bars)
+    return np.concatenate([np.full(bars, np.nan), values[:len(values) - bars]]) if bars else values
+
+def crossover(a, b) -> np.ndarray:
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    return (a > b) & (shift(a, 1) <= shift(b, 1))
+
+def crossunder(a, b) -> np.ndarray:
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    return (a < b) & (shift(a, 1) >= shift(b, 1))
+
+FUNCTIONS: Dict[str, Callable] = {
+    'sma': sma, 'ema': ema, 'rsi': rsi, 'highest': highest, 'lowest': lowest, 'stdev': stdev,
+    'change': change, 'crossover': crossover, 'crossunder': crossunder,
+    'abs': np.abs, 'max': np.maximum, 'min': np.minimum,
+}
+
+# Positional arguments per function; indicator lengths must be positive integer literals
+_ARITY = {'sma': 2, 'ema': 2, 'rsi': 2, 'highest': 2, 'lowest': 2, 'stdev': 2, 'change': (1, 2),
+          'crossover': 2, 'crossunder': 2, 'abs': 1, 'max': 2, 'min': 2}
+_LENGTH_FUNCTIONS = ('sma', 'ema', 'rsi', 'highest', 'lowest', 'stdev', 'change')
+
+_BINARY = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_COMPARE = {ast.Gt: np.greater, ast.Lt: np.less, ast.GtE: np.greater_equal, ast.LtE: np.less_equal,
+            ast.Eq: np.equal, ast.NotEq: np.not_equal}
+
+@dataclass
+class CompiledStrategy:
+    """Buy and sell conditions as expression trees over the bar series
+
+    Named intermediate values are inlined, so equal indicator calls in
+    different strategies produce the same key and are computed once per bar.
+    """
+    buy: ast.expr
+    sell: ast.expr
+    indicators: Dict[str, ast.expr] = field(default_factory=dict)
+    lookback: int = 1
+
+def _key(node: ast.AST) -> str:
+    # Memoized on the node: evaluation looks keys up on every bar
+    key = getattr(node, '_key', None)
+    if key is None:
+        key = node._key = ast.unparse(node)
+    return key
+
+def _is_count(node: ast.AST) -> bool:
+    """A non-negative integer literal (bools are ints to Python, not here)"""
+    return isinstance(node, ast.Constant) and type(node.value) is int and node.value >= 0
+
+def _check(node: ast.AST) -> None:
+    """Only arithmetic, comparisons, boolean logic, known functions and history references"""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            if not isinstance(child.func, ast.Name) or child.func.id not in FUNCTIONS or child.keywords:
+                raise ValueError(f"Unsupported function call: {_key(child)}")
+            arity = _ARITY[child.func.id]
+            if len(child.args) not in (arity if isinstance(arity, tuple) else (arity,)):
+                raise ValueError(f"Wrong number of arguments: {_key(child)}")
+            if child.func.id in _LENGTH_FUNCTIONS and len(child.args) == 2:
+                length = child.args[1]
+                if not _is_count(length) or length.value == 0:
+                    raise ValueError(f"Length must be a positive whole number: {_key(child)}")
+        elif isinstance(child, ast.Name):
+            if child.id not in SERIES and child.id not in FUNCTIONS:
+                raise ValueError(f"Unknown name: {child.id}")
+        elif isinstance(child, ast.Constant):
+            if not isinstance(child.value, (int, float, bool)):
+                raise ValueError(f"Unsupported constant: {child.value!r}")
+        elif isinstance(child, ast.Subscript):
+            if not _is_count(child.slice):
+                raise ValueError(f"History references need a constant offset: {_key(child)}")
+        elif isinstance(child, (ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare)):
+            op = getattr(child, 'op', None)
+            if isinstance(child, ast.BinOp) and type(op) not in _BINARY:
+                raise ValueError(f"Unsupported operator in {_key(child)}")
+            if isinstance(child, ast.Compare) and any(type(o) not in _COMPARE for o in child.ops):
+                raise ValueError(f"Unsupported comparison in {_key(child)}")
+        elif not isinstance(child, (ast.Load, ast.expr_context, ast.operator, ast.boolop, ast.unaryop,
+                                    ast.cmpop, ast.Expression)):
+            raise ValueError(f"Unsupported syntax: {type(child).__name__}")
+
+class _Inline(ast.NodeTransformer):
+    def __init__(self, names: Dict[str, ast.expr]):
+        self.names = names
+
+    def visit_Name(self, node: ast.Name):
+        return self.names.get(node.id, node)
+
+def _parse(expression: str, names: Dict[str, ast.expr]) -> ast.expr:
+    try:
+        tree = ast.parse(expression.strip(), mode='eval').body
+    except SyntaxError:
+        raise ValueError(f"Cannot parse expression: {expression.strip()}")
+    tree = _Inline(names).visit(tree)
+    _check(tree)
+    return tree
+
+def _lookback(node: ast.AST) -> int:
+    """Bars of history the expression needs to be defined on the last bar
+
+    Nested windows add up, e.g. sma(change(close, 5), 20) needs 26 bars. _check
+    has made every length and offset a non-negative integer literal, so this
+    bounds the work and memory of evaluating the expression.
+    """
+    needed = max((_lookback(child) for child in ast.iter_child_nodes(node)), default=1)
+    if isinstance(node, ast.Call) and node.func.id in _LENGTH_FUNCTIONS and len(node.args) == 2:
+        # ema and rsi (Wilder's RMA) are recursive: 4x the length leaves the seed ~2% of the weight or less
+        return needed + node.args[1].value * (4 if node.func.id in ('ema', 'rsi') else 1)
+    if isinstance(node, ast.Subscript):
+        return needed + node.slice.value
+    return needed
+
+def _finish(buy: List[ast.expr], sell: List[ast.expr]) -> CompiledStrategy:
+    if not buy or not sell:
+        raise ValueError("A strategy needs both a buy and a sell condition")
+    combine = lambda conditions: conditions[0] if len(conditions) == 1 else ast.BoolOp(ast.Or(), conditions)
+    strategy = CompiledStrategy(buy=combine(buy), sell=combine(sell))
+    for condition in (strategy.buy, strategy.sell):
+        for node in ast.walk(condition):
+            if isinstance(node, (ast.Call, ast.Subscript)):
+                strategy.indicators.setdefault(_key(node), node)
+        strategy.lookback = max(strategy.lookback, _lookback(condition))
+    return strategy
+
+_ASSIGNMENT = re.compile(r'^(?:var\s+)?(?:(?:float|int|bool|series)\s+)?([A-Za-z_]\w*)\s*:?=(?!=)\s*(.+)$')
+_INPUT = re.compile(r'\binput(?:\.\w+)?\s*\(\s*(?:defval\s*=\s*)?([^,)]+)[^)]*\)')
+_ENTRY = re.compile(r'^strategy\.(entry|close|close_all|order)\s*\((.*)\)\s*$')
+_IGNORED = re.compile(r'^(strategy|indicator|study|plot\w*|bgcolor|fill|alertcondition|alert|hline|'
+                      r'strategy\.exit|strategy\.cancel\w*|label\.\w+|line\.\w+)\s*\(')
+
+def _pine_expression(text: str) -> str:
+    text = _INPUT.sub(lambda m: m.group(1).strip(), text)
+    text = re.sub(r'\b(?:ta|math)\.', '', text)
+    text = re.sub(r'\btrue\b', 'True', text)
+    return re.sub(r'\bfalse\b', 'False', text)
+
+def _when(arguments: str) -> Optional[str]:
+    match = re.search(r'\bwhen\s*=\s*(.+)$', arguments)
+    return match.group(1) if match else None
+
+def compile_pine(source: str) -> CompiledStrategy:
+    """Compile the subset of Pine Script v5 strategies made of assignments and entries
+
+    Supported: `x = expr` / `x := expr`, inputs (their default is used),
+    ta.* indicators listed in FUNCTIONS, `if cond` blocks and `when=` arguments
+    around strategy.entry / strategy.close. Long entries buy; short entries and
+    closes sell (bots are long-only). Plots, alerts and strategy.exit are ignored.
+    """
+    names: Dict[str, ast.expr] = {}
+    buy: List[ast.expr] = []
+    sell: List[ast.expr] = []
+    condition: Optional[ast.expr] = None
+    for raw in source.splitlines():
+        line = raw.split('//', 1)[0].rstrip()
+        if not line.strip():
+            continue
+        indented = line[0] in ' \t'
+        line = line.strip()
+        if not indented:
+            condition = None
+        if _IGNORED.match(line):
+            continue
+        if line.startswith('if '):
+            condition = _parse(_pine_expression(line[3:]), names)
+            continue
+        entry = _ENTRY.match(line)
+        if entry:
+            kind, arguments = entry.groups()
+            when = _when(arguments)
+            guard = _parse(_pine_expression(when), names) if when else condition
+            if guard is None:
+                raise ValueError(f"strategy.{kind} without a condition: {line}")
+            is_long = kind in ('entry', 'order') and 'strategy.long' in arguments
+            (buy if is_long else sell).append(guard)
+            continue
+        assignment = _ASSIGNMENT.match(line)
+        if assignment:
+            name, expression = assignment.groups()
+            names[name] = _parse(_pine_expression(expression), names)
+            continue
+        raise ValueError(f"Unsupported Pine Script line: {line}")
+    return _finish(buy, sell)
+
+def compile_dsl(source: str) -> CompiledStrategy:
+    """Compile Python-syntax rules: `name = expr` lines plus `buy = ...` and `sell = ...`"""
+    names: Dict[str, ast.expr] = {}
+    for raw in source.splitlines():
+        line = raw.split('#', 1)[0].strip()
+        if not line:
+            continue
+        name, sep, expression = line.partition('=')
+        if not sep or not name.strip().isidentifier():
+            raise ValueError(f"Expected `name = expression`: {line}")
+        names[name.strip()] = _parse(expression, names)
+    return _finish([names['buy']] if 'buy' in names else [], [names['sell']] if 'sell' in names else [])
+
+def compile_strategy(source: str) -> CompiledStrategy:
+    """Compile a saved Pine Script strategy or Python-syntax rules"""
+    if re.search(r'//@version|\bstrategy\.', source):
+        return compile_pine(source)
+    return compile_dsl(source)
+
+def _compute(node: ast.AST, bars: Dict[str, np.ndarray], cache: Dict[str, np.ndarray]):
+    if isinstance(node, ast.Subscript):
+        return shift(evaluate(node.value, bars, cache), node.slice.value)
+    if isinstance(node, ast.Call):
+        return FUNCTIONS[node.func.id](*(evaluate(arg, bars, cache) for arg in node.args))
+    if isinstance(node, ast.BinOp):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return _BINARY[type(node.op)](evaluate(node.left, bars, cache), evaluate(node.right, bars, cache))
+    if isinstance(node, ast.UnaryOp):
+        operand = evaluate(node.operand, bars, cache)
+        if isinstance(node.op, ast.Not):
+            return np.logical_not(operand)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BoolOp):
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        result = evaluate(node.values[0], bars, cache)
+        for value in node.values[1:]:
+            result = combine(result, evaluate(value, bars, cache))
+        return result
+    if isinstance(node, ast.Compare):
+        left = evaluate(node.left, bars, cache)
+        result = True
+        for op, comparator in zip(node.ops, node.comparators):
+            right = evaluate(comparator, bars, cache)
+            with np.errstate(invalid='ignore'):
+                result = np.logical_and(result, _COMPARE[type(op)](left, right))
+            left = right
+        return result
+    raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+def evaluate(node: ast.AST, bars: Dict[str, np.ndarray], cache: Dict[str, np.ndarray]):
+    """Evaluate an expression over the bar window
+
+    Every sub-expression is looked up in (and added to) `cache` by its source
+    text, so strategies sharing indicators or whole conditions compute them once.
+    """
+    if isinstance(node, ast.Name):
+        return bars[node.id]
+    if isinstance(node, ast.Constant):
+        return node.value
+    key = _key(node)
+    value = cache.get(key)
+    if value is None:
+        value = cache[key] = _compute(node, bars, cache)
+    return value
+
+def last_true(value) -> bool:
+    """Whether a condition holds on the most recent bar"""
+    if np.isscalar(value):
+        return bool(value)
+    return bool(len(value)) and bool(value[-1])
@@ -0,0 +1,110 @@
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from models.database_models import Strategy as StrategyModel, User as UserModel
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(updated_at: datetime, strategy_id: int) -> str:
+    """Encode the keyset position of a strategy as an opaque cursor"""
+    raw = f"{updated_at.isoformat()}|{strategy_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, strategy_id = raw.split("|")
+        return datetime.fromisoformat(updated_at), int(strategy_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+class StrategyService:
+    async def _get_user_id(self, db: AsyncSession, username: str, create: bool = False) -> Optional[int]:
+        """Resolve a username to its users.id, optionally creating the row"""
+        user_id = await db.scalar(select(UserModel.id).where(UserModel.username == username))
+        if user_id is None and create:
+            user = UserModel(username=username, email=f"{username}@example.com", hashed_password="")
+            db.add(user)
+            await db.flush()
+            user_id = user.id
+        return user_id
+
+    async def list_strategies(self, db: AsyncSession, username: str, limit: int = DEFAULT_PAGE_SIZE,
+                              cursor: Optional[str] = None) -> Dict:
+        """List a user's strategies, newest first, without loading pine_script"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        user_id = await self._get_user_id(db, username)
+        if user_id is None:
+            return {'items': [], 'next_cursor': None}
+
+        query = (
+            select(StrategyModel)
+            .options(defer(StrategyModel.pine_script, raiseload=True))
+            .where(StrategyModel.user_id == user_id)
+            .order_by(StrategyModel.updated_at.desc(), StrategyModel.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            updated_at, strategy_id = decode_cursor(cursor)
+            query = query.where(or_(
+                StrategyModel.updated_at < updated_at,
+                and_(StrategyModel.updated_at == updated_at, StrategyModel.id < strategy_id)
+            ))
+
+        rows = (await db.scalars(query)).all()
+        items = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last.updated_at, last.id)
+        return {'items': items, 'next_cursor': next_cursor}
+
+    async def get_strategy(self, db: AsyncSession, username: str, strategy_id: int) -> Optional[StrategyModel]:
+        """Get a single strategy, including its script, owned by the user"""
+        user_id = await self._get_user_id(db, username)
+        if user_id is None:
+            return None
+        return await db.scalar(
+            select(StrategyModel).where(
+                StrategyModel.id == strategy_id,
+                StrategyModel.user_id == user_id
+            )
+        )
+
+    async def create_strategy(self, db: AsyncSession, username: str, data: Dict) -> StrategyModel:
+        """Create a strategy for the user"""
+        user_id = await self._get_user_id(db, username, create=True)
+        strategy = StrategyModel(user_id=user_id, **data)
+        db.add(strategy)
+        await db.commit()
+        await db.refresh(strategy)
+        return strategy
+
+    async def update_strategy(self, db: AsyncSession, username: str, strategy_id: int,
+                              data: Dict) -> Optional[StrategyModel]:
+        """Update fields of a user's strategy"""
+        strategy = await self.get_strategy(db, username, strategy_id)
+        if strategy is None:
+            return None
+        for field, value in data.items():
+            setattr(strategy, field, value)
+        await db.commit()
+        await db.refresh(strategy)
+        return strategy
+
+    async def delete_strategy(self, db: AsyncSession, username: str, strategy_id: int) -> bool:
+        """Delete a user's strategy"""
+        strategy = await self.get_strategy(db, username, strategy_id)
+        if strategy is None:
+            return False
+        await db.delete(strategy)
+        await db.commit()
+        return True
@@ -1,30 +1,164 @@
-from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import MarketOrderRequest, GetOrdersRequest
 from alpaca.trading.enums import OrderSide, TimeInForce, OrderStatus
-from alpaca.data.historical import CryptoHistoricalDataClient
 from alpaca.data.requests import CryptoBarsRequest
-from alpaca.data.timeframe import TimeFrame
-from datetime import datetime, timedelta
-import os
-from dotenv import load_dotenv
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
-import pandas as pd
+from services.metrics import upstream_timer
+from services.basket_orders import BasketLeg, dispatch_basket
+from services.broker_clients import BrokerClients, broker_clients
+from services.bar_resampler import BarResampler, MINUTE_MS, HOUR_MS, DAY_MS, bucket_origin, parse_timeframe
+from services.bar_store import BarStore, to_epoch_ms
+import numpy as np
+import asyncio
+import base64
+import json
+import os
+
+BAR_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+HISTORY_DEFAULT_LIMIT = int(os.getenv("HISTORY_DEFAULT_LIMIT", "500"))
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "5000"))
+
+# Timeframes Alpaca serves natively; others (3Hour, 2Day, 1Week, ...) are resampled locally
+ALPACA_BASES = {
+    '1Min': (MINUTE_MS, TimeFrame.Minute),
+    '5Min': (5 * MINUTE_MS, TimeFrame(5, TimeFrameUnit.Minute)),
+    '15Min': (15 * MINUTE_MS, TimeFrame(15, TimeFrameUnit.Minute)),
+    '1Hour': (HOUR_MS, TimeFrame.Hour),
+    '1Day': (DAY_MS, TimeFrame.Day),
+}
+
+def fetch_crypto_bars(symbol: str, timeframe: str, start_ms: int, end_ms: int):
+    """OHLCV arrays for [start_ms, end_ms) at a native Alpaca timeframe"""
+    request = CryptoBarsRequest(
+        symbol_or_symbols=symbol,
+        timeframe=ALPACA_BASES[timeframe][1],
+        start=datetime.fromtimestamp(start_ms / 1000, timezone.utc),
+        end=datetime.fromtimestamp(end_ms / 1000, timezone.utc)
+    )
+    with upstream_timer("alpaca", "get_crypto_bars"):
+        bars = broker_clients.clients().crypto_data.get_crypto_bars(request).data.get(symbol, [])
+    return {
+        'ts': np.array([to_epoch_ms(bar.timestamp) for bar in bars], dtype='i8'),
+        'open': np.array([bar.open for bar in bars], dtype='f8'),
+        'high': np.array([bar.high for bar in bars], dtype='f8'),
+        'low': np.array([bar.low for bar in bars], dtype='f8'),
+        'close': np.array([bar.close for bar in bars], dtype='f8'),
+        'volume': np.array([bar.volume for bar in bars], dtype='f8'),
+    }
+
+def encode_history_cursor(direction: str, ts_ms: int, symbol: str, timeframe: str,
+                          end_ms: Optional[int] = None) -> str:
+    """Opaque cursor for the next page: 'after' pages forward from ts_ms up to end_ms (None: now),
+    'before' pages back"""
+    return base64.urlsafe_b64encode(json.dumps([direction, ts_ms, end_ms, symbol, timeframe]).encode()).decode()
+
+def decode_history_cursor(cursor: str, symbol: str, timeframe: str):
+    """Decode a cursor produced by encode_history_cursor for the same symbol and timeframe
 
-load_dotenv()
+    Returns (direction, ts_ms, end_ms).
+    """
+    try:
+        direction, ts_ms, end_ms, cursor_symbol, cursor_timeframe = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if direction not in ('after', 'before'):
+            raise ValueError
+        ts_ms, end_ms = int(ts_ms), int(end_ms) if end_ms is not None else None
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if (cursor_symbol, cursor_timeframe) != (symbol, timeframe):
+        raise ValueError("Cursor is for another symbol or timeframe")
+    return direction, ts_ms, end_ms
+
+def history_window(symbol: str, timeframe: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   limit: int = HISTORY_DEFAULT_LIMIT, cursor: Optional[str] = None) -> Dict:
+    """Resolve a history request to its page's range and fetch window, without fetching
+
+    `requested_end` is the end the client asked for (None: now), which forward
+    cursors carry along. Raises ValueError for bad timeframes, ranges and cursors.
+    """
+    bucket_ms = parse_timeframe(timeframe)
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    now_ms = to_epoch_ms(datetime.now(timezone.utc))
+    start_ms = to_epoch_ms(start) if start else None
+    requested_end = to_epoch_ms(end) if end else None
+    if cursor:
+        direction, position, cursor_end = decode_history_cursor(cursor, symbol, timeframe)
+        if direction == 'after':
+            if requested_end is not None and requested_end != cursor_end:
+                raise ValueError("Cursor is for another end")
+            start_ms, requested_end = position, cursor_end
+        else:
+            start_ms, requested_end = None, position
+    end_ms = min(requested_end, now_ms) if requested_end is not None else now_ms
+    if start_ms is not None and start_ms >= end_ms:
+        raise ValueError("start must be before end")
+    # Fetch one bucket past the page to learn whether another page follows
+    if start_ms is not None:
+        window = (start_ms, min(end_ms, start_ms + (limit + 1) * bucket_ms))
+    else:
+        window = (end_ms - (limit + 1) * bucket_ms, end_ms)
+    return {
+        'bucket_ms': bucket_ms, 'limit': limit, 'start_ms': start_ms, 'end_ms': end_ms,
+        'requested_end': requested_end, 'window': window,
+        # Bars of the bucket in progress still change
+        'forming': now_ms - (now_ms - bucket_origin(bucket_ms)) % bucket_ms,
+    }
+
+def immutable_history_key(symbol: str, timeframe: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None, limit: int = HISTORY_DEFAULT_LIMIT,
+                          cursor: Optional[str] = None, columnar: bool = False) -> Optional[str]:
+    """Identity of the page a history request gets, if its whole window is already closed
+
+    Such a page never changes, so the key can stand in for its content (e.g. for an
+    ETag) before anything is fetched. None when the page may still change.
+    """
+    w = history_window(symbol, timeframe, start, end, limit, cursor)
+    if w['window'][1] > w['forming']:
+        return None
+    return json.dumps([symbol, timeframe, w['start_ms'], w['requested_end'], w['window'], w['limit'], columnar])
+
+crypto_bars = BarResampler(fetch_crypto_bars, 'alpaca',
+                           [(name, width) for name, (width, _) in ALPACA_BASES.items()], store=BarStore())
+
+def order_to_dict(order) -> Dict:
+    """Order fields served by the order endpoints, from an Alpaca Order model"""
+    return {
+        'order_id': str(order.id),
+        'client_order_id': order.client_order_id,
+        'symbol': order.symbol,
+        'quantity': float(order.qty) if order.qty else 0,
+        'side': order.side.value,
+        'status': order.status.value,
+        'filled_qty': float(order.filled_qty) if order.filled_qty else 0,
+        'filled_avg_price': float(order.filled_avg_price) if order.filled_avg_price else 0,
+        'submitted_at': order.submitted_at.isoformat() if order.submitted_at else None,
+        'filled_at': order.filled_at.isoformat() if order.filled_at else None,
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None
+    }
 
 class TradingService:
-    def __init__(self):
-        self.trading_client = TradingClient(
-            api_key=os.getenv('ALPACA_API_KEY'),
-            secret_key=os.getenv('ALPACA_SECRET_KEY'),
-            paper=os.getenv('ALPACA_PAPER_TRADING', 'True').lower() == 'true'
-        )
-        self.data_client = CryptoHistoricalDataClient()
+    """Trading calls for one broker account; clients come from the shared registry"""
+    def __init__(self, clients: Optional[BrokerClients] = None):
+        self.clients = clients or broker_clients.clients()
+    
+    @property
+    def trading_client(self):
+        return self.clients.trading
+    
+    @property
+    def data_client(self):
+        return self.clients.crypto_data
+    
+    @property
+    def order_budget(self):
+        return self.clients.order_budget
         
     async def get_account(self):
         """Get account information"""
         try:
-            account = self.trading_client.get_account()
+            with upstream_timer("alpaca", "get_account"):
+                account = self.trading_client.get_account()
             return {
                 'cash': float(account.cash),
                 'portfolio_value': float(account.portfolio_value),
@@ -40,7 +174,8 @@ class TradingService:
     async def get_positions(self):
         """Get current positions"""
         try:
-            positions = self.trading_client.get_all_positions()
+            with upstream_timer("alpaca", "get_all_positions"):
+                positions = self.trading_client.get_all_positions()
             return [{
                 'symbol': pos.symbol,
                 'quantity': float(pos.qty),
@@ -64,28 +199,40 @@ class TradingService:
                 time_in_force=TimeInForce.GTC
             )
             
-            order = self.trading_client.submit_order(order_data)
-            return {
-                'order_id': order.id,
-                'client_order_id': order.client_order_id,
-                'symbol': order.symbol,
-                'quantity': float(order.qty),
-                'side': order.side.value,
-                'status': order.status.value
-            }
+            with upstream_timer("alpaca", "submit_order"):
+                order = self.trading_client.submit_order(order_data)
+            return order_to_dict(order)
         except Exception as e:
             raise Exception(f"Failed to place order: {str(e)}")
             
+    def _submit_leg(self, leg: BasketLeg) -> Dict:
+        order_data = MarketOrderRequest(
+            symbol=leg.symbol,
+            qty=leg.quantity,
+            side=OrderSide.BUY if leg.side.lower() == 'buy' else OrderSide.SELL,
+            time_in_force=TimeInForce.GTC,
+            client_order_id=leg.client_order_id
+        )
+        with upstream_timer("alpaca", "submit_order"):
+            return order_to_dict(self.trading_client.submit_order(order_data))
+    
+    def _order_by_client_id(self, client_order_id: str) -> Dict:
+        with upstream_timer("alpaca", "get_order_by_client_id"):
+            return order_to_dict(self.trading_client.get_order_by_client_id(client_order_id))
+    
+    async def place_basket_order(self, legs: List[BasketLeg], basket_id: Optional[str] = None,
+                                 concurrency: Optional[int] = None):
+        """Place market orders for every leg concurrently; see dispatch_basket"""
+        options = {'concurrency': concurrency} if concurrency else {}
+        return await dispatch_basket(legs, self._submit_leg, self._order_by_client_id,
+                                     self.order_budget, basket_id, **options)
+    
     async def get_order_status(self, order_id: str):
         """Get status of an order"""
         try:
-            order = self.trading_client.get_order_by_id(order_id)
-            return {
-                'order_id': order.id,
-                'status': order.status.value,
-                'filled_qty': float(order.filled_qty) if order.filled_qty else 0,
-                'filled_avg_price': float(order.filled_avg_price) if order.filled_avg_price else 0
-            }
+            with upstream_timer("alpaca", "get_order_by_id"):
+                order = self.trading_client.get_order_by_id(order_id)
+            return order_to_dict(order)
         except Exception as e:
             raise Exception(f"Failed to get order status: {str(e)}")
             
@@ -93,49 +240,54 @@ class TradingService:
         """Get orders with optional status filter"""
         try:
             request = GetOrdersRequest(status=status) if status else None
-            orders = self.trading_client.get_orders(filter=request)
-            return [{
-                'order_id': order.id,
-                'symbol': order.symbol,
-                'quantity': float(order.qty),
-                'side': order.side.value,
-                'status': order.status.value,
-                'submitted_at': order.submitted_at.isoformat(),
-                'filled_at': order.filled_at.isoformat() if order.filled_at else None
-            } for order in orders]
+            with upstream_timer("alpaca", "get_orders"):
+                orders = self.trading_client.get_orders(filter=request)
+            return [order_to_dict(order) for order in orders]
         except Exception as e:
             raise Exception(f"Failed to get orders: {str(e)}")
             
-    async def get_historical_data(self, symbol: str, timeframe: str = '1Day', limit: int = 100):
-        """Get historical price data"""
+    async def get_historical_data(self, symbol: str, timeframe: str = '1Day',
+                                  start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                  limit: int = HISTORY_DEFAULT_LIMIT, cursor: Optional[str] = None,
+                                  columnar: bool = False):
+        """Get one page of bars in [start, end), as a list of bars or parallel per-field lists
+
+        With `start`, pages run forward from it; without, the page holds the `limit`
+        bars before `end` (default now) and the cursor pages further back. The
+        page is `immutable` once every bar in it, and the window, is closed.
+        Raises ValueError for bad timeframes, ranges and cursors.
+        """
+        w = history_window(symbol, timeframe, start, end, limit, cursor)
+        limit, start_ms, end_ms, window = w['limit'], w['start_ms'], w['end_ms'], w['window']
         try:
-            timeframe_map = {
-                '1Min': TimeFrame.Minute,
-                '5Min': TimeFrame.Minute * 5,
-                '15Min': TimeFrame.Minute * 15,
-                '1Hour': TimeFrame.Hour,
-                '1Day': TimeFrame.Day
-            }
-            
-            request = CryptoBarsRequest(
-                symbol_or_symbols=symbol,
-                timeframe=timeframe_map.get(timeframe, TimeFrame.Day),
-                start=datetime.now() - timedelta(days=limit)
-            )
-            
-            bars = self.data_client.get_crypto_bars(request)
-            df = pd.DataFrame([{
-                'timestamp': bar.timestamp,
-                'open': float(bar.open),
-                'high': float(bar.high),
-                'low': float(bar.low),
-                'close': float(bar.close),
-                'volume': float(bar.volume)
-            } for bar in bars])
-            
-            return df.to_dict('records')
+            bars = await asyncio.to_thread(crypto_bars.get_bars, symbol, timeframe, *window)
         except Exception as e:
             raise Exception(f"Failed to get historical data: {str(e)}")
+        count = len(bars['ts'])
+        next_cursor = None
+        if start_ms is not None:
+            page = slice(0, limit)
+            if count > limit:
+                next_cursor = encode_history_cursor('after', int(bars['ts'][limit]), symbol, timeframe, w['requested_end'])
+            elif window[1] < end_ms:
+                next_cursor = encode_history_cursor('after', window[1], symbol, timeframe, w['requested_end'])
+            page_end = int(bars['ts'][limit]) if count > limit else window[1]
+        else:
+            page = slice(max(count - limit, 0), count)
+            if count:
+                # Until a page comes back empty: there may be gaps in the history
+                next_cursor = encode_history_cursor('before', int(bars['ts'][page.start]), symbol, timeframe)
+            page_end = window[1]
+        ts = bars['ts'][page].tolist()
+        timestamps = [datetime.fromtimestamp(t / 1000, timezone.utc) for t in ts]
+        columns = [timestamps] + [bars[name][page].tolist() for name in BAR_FIELDS[1:]]
+        return {
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'bars': dict(zip(BAR_FIELDS, columns)) if columnar else [dict(zip(BAR_FIELDS, row)) for row in zip(*columns)],
+            'next_cursor': next_cursor,
+            'immutable': page_end <= w['forming'],
+        }
             
     async def get_latest_quote(self, symbol: str):
         """Get latest quote for a symbol"""
@@ -146,8 +298,10 @@ class TradingService:
                 start=datetime.now() - timedelta(minutes=1)
             )
             
-            bars = self.data_client.get_crypto_bars(request)
-            latest = list(bars)[-1] if bars else None
+            with upstream_timer("alpaca", "get_crypto_bars"):
+                bars = self.data_client.get_crypto_bars(request)
+            symbol_bars = bars.data.get(symbol)
+            latest = symbol_bars[-1] if symbol_bars else None
             
             if not latest:
                 raise Exception("No recent data available")
@@ -171,11 +325,12 @@ class TradingService:
                 '1Y': 365
             }.get(period, 30)
             
-            history = self.trading_client.get_portfolio_history(
-                period=period,
-                timeframe='1D',
-                extended_hours=True
-            )
+            with upstream_timer("alpaca", "get_portfolio_history"):
+                history = self.trading_client.get_portfolio_history(
+                    period=period,
+                    timeframe='1D',
+                    extended_hours=True
+                )
             
             return {
                 'timestamp': history.timestamp,
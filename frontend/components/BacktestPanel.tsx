@@ -51,7 +51,7 @@ export default function BacktestPanel() {
   const runBacktest = async () => {
     setLoading(true)
     try {
-      const response = await fetch('http://localhost:8000/api/v1/backtest', {
+      const response = await fetch('http://localhost:8000/api/v1/backtest?wait=true', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
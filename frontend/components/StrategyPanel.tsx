@@ -47,7 +47,7 @@ export default function StrategyPanel({ coinId, symbol }: StrategyPanelProps) {
   const handleBacktest = async () => {
     try {
       setLoading(true)
-      const response = await axios.post('/api/backtest', {
+      const response = await axios.post('/api/backtest?wait=true', {
         strategy_id: strategy.id,
         symbol: symbol?.toUpperCase() + 'USD',
         timeframe: '1d',